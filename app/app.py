@@ -12,22 +12,65 @@ from app.screens.email_interface_screen import EmailInterfaceScreen
 from app.screens.loading_screen import LoadingScreen
 
 from app.utils.worker import Worker
-from app.utils.api import get_ttl, script_path
+from app.utils.ttl_watcher import TTLWatcher
+from app.utils.api import script_path
 from app.utils.tunnel import (create_tunnel, delete_tunnel,
                              save_certificate, save_token, load_secrets,
-                             save_developer_token, add_tunnel_to_rathole, Rathole,
+                             save_developer_token, add_tunnel_to_rathole,
                              save_ca_choice)
+from app.utils.rathole import Rathole, rathole_signals
+from app.utils.rathole_client import InProcessTunnel
 from app.utils.logger import setup_logger
+from app.utils.mailbox import Mailbox
+from app.utils.blob_store import get_blob_store
+from app.utils.mail_spool import get_mail_spool
 
 import app.utils.mail_server_tls as mailserv
-from app.utils.cert_manager import get_certificate
+from app.utils.cert_manager import get_certificate, load_cached_certificate, prepare_acme_client
+from app.utils.pipeline import Pipeline, Stage, StageError
+from app.utils.tracing import tracer
+from app.utils.key_pool import key_pool
 
 from requests.exceptions import ConnectionError
-from app.config.constants import BASE_DOMAIN
+from app.config.constants import (BASE_DOMAIN, TUNNEL_TRANSPORT, MAILBOX_RETENTION_DAYS,
+                                  CERT_KEY_TYPE, ACC_KEY_TYPE)
 import os.path
 
 
+class LazyScreen:
+    # экран создается и добавляется в стек при первом обращении
+    def __init__(self, screen_class):
+        self.screen_class = screen_class
+
+    def __set_name__(self, owner, name):
+        self.attr = f"_{name}"
+
+    def __get__(self, app, owner=None):
+        if app is None:
+            return self
+
+        screen = getattr(app, self.attr, None)
+        if screen is None:
+            screen = self.screen_class(app)
+            app.stacked_widget.addWidget(screen)
+            setattr(app, self.attr, screen)
+            app.logger.debug(f"Создан экран {self.screen_class.__name__}")
+
+        return screen
+
+    def is_built(self, app):
+        return getattr(app, self.attr, None) is not None
+
+
 class EmailTunnelApp(QtWidgets.QMainWindow):
+    # экраны строятся при первом переходе на них, а не при запуске
+    welcome_screen = LazyScreen(WelcomeScreen)
+    auth_screen = LazyScreen(AuthScreen)
+    dev_token_screen = LazyScreen(DevTokenScreen)
+    email_main_screen = LazyScreen(EmailMainScreen)
+    email_interface_screen = LazyScreen(EmailInterfaceScreen)
+    loading_screen = LazyScreen(LoadingScreen)
+
     def __init__(self):
         super().__init__()
     
@@ -37,8 +80,10 @@ class EmailTunnelApp(QtWidgets.QMainWindow):
         self.token = None
         self.tunnel_id = None
         self.subdomain = None
+        # все открытые ящики: поддомен -> tunnel_id и секрет; subdomain - выбранный
+        self.tunnels = {}
         self.tunnel_setup_failed = False
-        self.emails = []
+        self.mailbox = Mailbox()
 
         self.use_zerossl = False # по умолчанию используется Let's Encrypt
         self.dev_token = None
@@ -46,6 +91,17 @@ class EmailTunnelApp(QtWidgets.QMainWindow):
         try:
             self.initUI()
             self.loadToken()
+            
+            # новые письма приходят пачками; подключаемся один раз,
+            # а не при каждом создании туннеля
+            mailserv.email_signals.new_emails_received.connect(self.handle_new_emails)
+            rathole_signals.state_changed.connect(self.updateTunnelState)
+            rathole_signals.reconnected.connect(self.showReconnectLatency)
+            
+            # ключи для сертификата генерируются заранее, когда окно уже показано
+            QtCore.QTimer.singleShot(1000, self.startKeyPool)
+            # старые письма и вложения удаляются в фоне, не задерживая запуск
+            threading.Thread(target=self.purgeMailbox, daemon=True).start()
             self.logger.info("Приложение успешно инициализировано")
         except Exception as e:
             self.logger.critical(f"Критическая ошибка при инициализации приложения: {str(e)}", exc_info=True)
@@ -65,27 +121,38 @@ class EmailTunnelApp(QtWidgets.QMainWindow):
             self.stacked_widget = QtWidgets.QStackedWidget()
             self.setCentralWidget(self.stacked_widget)
             
-
-            self.welcome_screen = WelcomeScreen(self)
-            self.auth_screen = AuthScreen(self)
-            self.dev_token_screen = DevTokenScreen(self)
-            self.email_main_screen = EmailMainScreen(self)
-            self.email_interface_screen = EmailInterfaceScreen(self)
-            self.loading_screen = LoadingScreen(self)
-            
-            self.stacked_widget.addWidget(self.welcome_screen)
-            self.stacked_widget.addWidget(self.auth_screen)
-            self.stacked_widget.addWidget(self.dev_token_screen)
-            self.stacked_widget.addWidget(self.email_main_screen)
-            self.stacked_widget.addWidget(self.email_interface_screen)
-            self.stacked_widget.addWidget(self.loading_screen)
-            
             self.logger.debug("Интерфейс успешно настроен")
         except Exception as e:
             self.logger.error(f"Ошибка при инициализации интерфейса: {str(e)}", exc_info=True)
             raise
 
 
+    def updateTunnelState(self, connected):
+        # состояние приходит и до первого показа экрана почты
+        if EmailTunnelApp.email_interface_screen.is_built(self):
+            self.email_interface_screen.update_tunnel_state(connected)
+
+    def showReconnectLatency(self, latency):
+        if EmailTunnelApp.email_interface_screen.is_built(self):
+            self.email_interface_screen.show_reconnect_latency(latency)
+
+
+    def startKeyPool(self):
+        try:
+            key_pool.start(list(dict.fromkeys([CERT_KEY_TYPE, ACC_KEY_TYPE])))
+        except Exception as e:
+            self.logger.warning(f"Не удалось запустить пул ключей: {str(e)}")
+
+
+    def purgeMailbox(self):
+        try:
+            self.mailbox.purge(time.time() - MAILBOX_RETENTION_DAYS * 24 * 3600)
+            # вложения удаленных писем, а также оставшиеся от прежних запусков
+            get_blob_store().collect(self.mailbox.blob_digests())
+        except Exception as e:
+            self.logger.warning(f"Ошибка при очистке старых писем: {str(e)}", exc_info=True)
+
+
     def loadToken(self):
         self.logger.debug("Загрузка сохраненных токенов")
         try:
@@ -188,11 +255,16 @@ class EmailTunnelApp(QtWidgets.QMainWindow):
         try:
             self.logger.info("Запуск процесса создания туннеля")
 
+            # предыдущий туннель удаляется вместе со всеми ящиками
+            self.tunnels = {}
+
             # показ экрана загрузки
+            self.loading_screen.show_stage("")
             self.stacked_widget.setCurrentWidget(self.loading_screen)
             
             # создание туннеля в отдельном потоке
             self.tunnel_worker = Worker(self.setupTunnel)
+            self.tunnel_worker.progress.connect(self.loading_screen.show_stage)
             self.tunnel_worker.finished.connect(self.tunnelCreated)
             self.tunnel_worker.error.connect(self.showError)
             self.tunnel_worker.start()
@@ -224,6 +296,13 @@ class EmailTunnelApp(QtWidgets.QMainWindow):
                 except Exception as timer_error:
                     self.logger.warning(f"Ошибка при остановке TTL таймера: {str(timer_error)}")
 
+            if hasattr(self, 'ttl_watcher'):
+                try:
+                    self.logger.debug("Остановка отслеживания TTL")
+                    self.ttl_watcher.stop()
+                except Exception as watcher_error:
+                    self.logger.warning(f"Ошибка при остановке отслеживания TTL: {str(watcher_error)}")
+
             # останавливаем rathole
             if hasattr(self, 'rathole'): # если сущ-т
                 try:
@@ -233,6 +312,22 @@ class EmailTunnelApp(QtWidgets.QMainWindow):
                 except Exception as rh_error:
                     self.logger.warning(f"Ошибка при остановке rathole: {str(rh_error)}")
 
+            # пользователь подтвердил, что письма ему больше не нужны
+            for subdomain in list(self.tunnels) or [self.subdomain]:
+                if not subdomain:
+                    continue
+                try:
+                    self.mailbox.clear(subdomain)
+                except Exception as mailbox_error:
+                    self.logger.warning(f"Ошибка при очистке хранилища писем: {str(mailbox_error)}")
+            self.tunnels = {}
+
+            # вложения, на которые больше не ссылается ни одно письмо
+            try:
+                get_blob_store().collect(self.mailbox.blob_digests())
+            except Exception as blob_error:
+                self.logger.warning(f"Ошибка при очистке вложений: {str(blob_error)}")
+
             self.stacked_widget.setCurrentWidget(self.email_main_screen)
             self.logger.info("Туннель успешно удален")
         except Exception as e:
@@ -244,66 +339,154 @@ class EmailTunnelApp(QtWidgets.QMainWindow):
 
 
     def setupTunnel(self, should_stop):
+        # встроенному клиенту нужен уже запущенный почтовый сервер
+        rathole_deps = ["create_tunnel"]
+        if TUNNEL_TRANSPORT == "inprocess":
+            rathole_deps.append("smtp_bind")
+
+        # этапы создания туннеля; независимые выполняются параллельно
+        pipeline = Pipeline([
+            Stage("delete_tunnel", self._stage_delete_tunnel,
+                  title="Удаление предыдущего туннеля"),
+            Stage("acme_client", self._stage_acme_client,
+                  title="Подготовка ACME аккаунта"),
+            Stage("smtp_bind", self._stage_smtp_bind,
+                  title="Запуск почтового сервера"),
+            Stage("create_tunnel", self._stage_create_tunnel, deps=["delete_tunnel"],
+                  title="Создание туннеля"),
+            Stage("certificate", self._stage_certificate, deps=["create_tunnel", "acme_client"],
+                  title="Получение сертификата"),
+            Stage("rathole", self._stage_rathole, deps=rathole_deps,
+                  title="Подключение к серверу"),
+            Stage("smtp_cert", self._stage_smtp_cert, deps=["certificate", "smtp_bind"],
+                  title="Загрузка сертификата"),
+        ], on_progress=lambda active: self.tunnel_worker.progress.emit(", ".join(active)))
+
+        self.new_tunnel = None
+
         try:
-            try:
-                delete_tunnel(self.token)
-                self.logger.debug("Успешно удален туннель")
-            except ConnectionError:
+            with tracer.span("tunnel.setup") as self.tunnel_span:
+                pipeline.parent_span = self.tunnel_span
+                results = pipeline.run()
+
+                # в self.tunnels туннель попадет в tunnelCreated, в потоке интерфейса
+                self.new_tunnel = results["create_tunnel"]
+                self.subdomain = self.new_tunnel["subdomain"]
+                self.tunnel_id = self.new_tunnel["tunnel_id"]
+                self.tunnel_span.set("subdomain", self.subdomain)
+
+            self.logger.info(f"Трасса создания туннеля: {tracer.summary(self.tunnel_span)}")
+            self.first_email_traced = False
+            self.tunnel_setup_failed = False
+        except StageError as e:
+            self.tunnel_setup_failed = True
+            self._cleanupFailedSetup()
+
+            if isinstance(e.error, ConnectionError):
                 self.logger.debug("Невозможно подключиться к серверу")
                 self.tunnel_worker.error.emit("Сервер временно недоступен")
-                self.tunnel_setup_failed = True
-                return
-            except Exception as delete_error:
-                self.logger.error(f"Ошибка при удалении предыдущего туннеля: {str(delete_error)}")
+            elif e.stage == "delete_tunnel":
+                self.logger.error(f"Ошибка при удалении предыдущего туннеля: {str(e.error)}")
                 self.tunnel_worker.error.emit("Что-то пошло не так при удалении предыдущего туннеля...")
-                self.tunnel_setup_failed = True
-                return
-                
-            
-            # создание нового туннеля
+            else:
+                self.logger.error(f"Ошибка в setupTunnel на этапе {e.stage}: {str(e.error)}", exc_info=e.error)
+                self.tunnel_worker.error.emit(f"Ошибка при настройке туннеля: {str(e.error)}")
+        except Exception as e:
+            self.logger.error(f"Ошибка в setupTunnel: {str(e)}", exc_info=True)
+            self.tunnel_setup_failed = True
+            self._cleanupFailedSetup()
+            self.tunnel_worker.error.emit(f"Ошибка при настройке туннеля: {str(e)}")
 
-            self.subdomain, self.tunnel_id, tunnel_secret = create_tunnel(self.token)
-            self.logger.info(f"Туннель создан: {self.subdomain}")
-            
-            self.logger.debug("Запрос сертификата")
+    def _stage_delete_tunnel(self, results):
+        delete_tunnel(self.token)
+        self.logger.debug("Успешно удален туннель")
+
+    def _stage_acme_client(self, results):
+        # каталог и аккаунт ACME не зависят от поддомена
+        if self.dev_token and self.use_zerossl:
+            return prepare_acme_client("zerossl", self.dev_token)
+        return prepare_acme_client("le")
+
+    def _stage_smtp_bind(self, results):
+        # сервер слушает порт еще до получения сертификата
+        self.mail_controller, self.email_signals = mailserv.start()
+
+    def _stage_create_tunnel(self, results):
+        subdomain, tunnel_id, tunnel_secret = create_tunnel(self.token)
+        self.logger.info(f"Туннель создан: {subdomain}")
+
+        # self.tunnels меняется только в потоке интерфейса
+        return {"subdomain": subdomain, "tunnel_id": tunnel_id, "tunnel_secret": tunnel_secret}
+
+    def _stage_certificate(self, results):
+        subdomain = results["create_tunnel"]["subdomain"]
+
+        # сервер мог выдать уже использованный поддомен - тогда ACME не нужен
+        if load_cached_certificate(subdomain):
+            self.logger.debug("Используется сохраненный сертификат")
+            return
+
+        self.logger.debug("Запрос сертификата")
+        acme = results["acme_client"]
+        fullchain, privkey = get_certificate(self.token, subdomain,
+                                             self.dev_token, acme.ca, acme=acme)
+
+        self.logger.debug("Сертификат получен, сохранение")
+        save_certificate(subdomain, fullchain, privkey)
+
+    def _rathole_services(self, tunnels):
+        return {tunnel["tunnel_id"]: tunnel["tunnel_secret"] for tunnel in tunnels}
+
+    def _stage_rathole(self, results):
+        if TUNNEL_TRANSPORT == "inprocess":
+            # соединения передаются aiosmtpd напрямую, без процесса и конфига
+            self.logger.debug("Запуск встроенного клиента туннеля")
+            self.rathole = InProcessTunnel(self.mail_controller,
+                                           self._rathole_services([results["create_tunnel"]]),
+                                           trace_parent=self.tunnel_span)
+            threading.Thread(target=self.rathole.run, daemon=True).start()
+            return
 
-            if self.dev_token and self.use_zerossl:
-                fullchain, privkey = get_certificate(self.token, self.subdomain,
-                                                     self.dev_token, "zerossl")
-            else:
-                fullchain, privkey = get_certificate(self.token, self.subdomain)
+        try:
+            self.logger.debug("Создание конфига для rathole")
+            add_tunnel_to_rathole(self._rathole_services([results["create_tunnel"]]))
+        except Exception as config_error:
+            self.logger.error(f"Ошибка при создании конфигурационного файла: {str(config_error)}")
+            raise config_error
+        
+        # запуск rathole в отдельном потоке
+        self.logger.debug("Запуск rathole в фоновом режиме")
 
+        # процесс перезапускается при падении, состояние связи приходит в интерфейс
+        self.rathole = Rathole(trace_parent=self.tunnel_span)
 
-            self.logger.debug("Сертификат получен, сохранение")
-            save_certificate(self.subdomain, fullchain, privkey)
-            
-            try:
-                self.logger.debug("Создание конфига для rathole")
-                add_tunnel_to_rathole(self.tunnel_id, tunnel_secret)
-            except Exception as config_error:
-                self.logger.error(f"Ошибка при создании конфигурационного файла: {str(config_error)}")
-                raise config_error
-            
-            # запуск rathole в отдельном потоке
-            self.logger.debug("Запуск rathole в фоновом режиме")
+        threading.Thread(target=self.rathole.run, daemon=True).start()
 
-            self.rathole = Rathole()
+    def _stage_smtp_cert(self, results):
+        subdomain = results["create_tunnel"]["subdomain"]
+        self.logger.debug(f"Загрузка сертификата для {subdomain} в почтовый сервер")
 
-            threading.Thread(target=self.rathole.run, daemon=True).start()
-            
-            # запуск почтового сервера и получение сигналов
-            self.logger.debug(f"Запуск почтового сервера с сертификатами для {self.subdomain}")
+        # у каждого ящика свой сертификат, выбирается по SNI
+        certs_path = os.path.join(script_path(".certs"), subdomain)
+        mailserv.load_certificate(self.mail_controller, certs_path, hostname=subdomain)
+        # прежние ящики удалены вместе с туннелем в createTunnel, self.tunnels здесь не читается
+        mailserv.set_domains(self.mail_controller, [subdomain])
 
-            certs_path = os.path.join(script_path(".certs"), self.subdomain)
-            self.mail_controller, self.email_signals = mailserv.start(certs_path)
-            
-            # подключаем сигнал о новых письмах к обработчику
-            self.email_signals.new_email_received.connect(self.handle_new_email)
-            self.tunnel_setup_failed = False
-        except Exception as e:
-            self.logger.error(f"Ошибка в setupTunnel: {str(e)}", exc_info=True)
-            self.tunnel_setup_failed = True
-            self.tunnel_worker.error.emit(f"Ошибка при настройке туннеля: {str(e)}")
+    def _cleanupFailedSetup(self):
+        # освобождаем порт и процесс, чтобы следующая попытка могла их занять
+        if hasattr(self, "mail_controller"):
+            try:
+                self.mail_controller.stop()
+            except Exception as mail_error:
+                self.logger.warning(f"Ошибка при остановке почтового сервера: {str(mail_error)}")
+            del self.mail_controller
+
+        if hasattr(self, "rathole"):
+            try:
+                self.rathole.stop()
+            except Exception as rh_error:
+                self.logger.warning(f"Ошибка при остановке rathole: {str(rh_error)}")
+            del self.rathole
 
 
     def closeEvent(self, event):
@@ -326,6 +509,15 @@ class EmailTunnelApp(QtWidgets.QMainWindow):
                 except Exception as timer_error:
                     self.logger.warning(f"Ошибка при остановке таймера: {str(timer_error)}")
 
+            # остановка отслеживания TTL
+            if hasattr(self, 'ttl_watcher'): # если сущ-т
+                try:
+                    self.logger.debug("Остановка отслеживания TTL")
+
+                    self.ttl_watcher.stop()
+                except Exception as watcher_error:
+                    self.logger.warning(f"Ошибка при остановке отслеживания TTL: {str(watcher_error)}")
+
             # останавливаем почтовый сервер
             if hasattr(self, 'mail_controller'): # если сущ-т
                 try:
@@ -343,6 +535,15 @@ class EmailTunnelApp(QtWidgets.QMainWindow):
                     self.rathole.stop()
                 except Exception as rh_error:
                     self.logger.warning(f"Ошибка при остановке rathole: {str(rh_error)}")
+
+            # письма остаются на диске до следующего запуска
+            try:
+                if EmailTunnelApp.email_interface_screen.is_built(self):
+                    # фоновая подготовка писем не должна читать закрытое хранилище
+                    self.email_interface_screen.render_cache.close()
+                self.mailbox.close()
+            except Exception as mailbox_error:
+                self.logger.warning(f"Ошибка при закрытии хранилища писем: {str(mailbox_error)}")
         except Exception as e:
             self.logger.error(f"Неожиданная ошибка при закрытии приложения: {str(e)}", exc_info=True)
         
@@ -355,18 +556,18 @@ class EmailTunnelApp(QtWidgets.QMainWindow):
             if self.tunnel_setup_failed:
                 return
             self.logger.info("Туннель создан успешно")
+            self.tunnels = {self.new_tunnel["subdomain"]: self.new_tunnel}
+
             # настройка экрана интерфейса почты
             self.email_interface_screen.setup_with_data(self.subdomain)
+            self.email_interface_screen.update_tunnel_state(self.rathole.connected)
             
             # экран почтового интерфейса
             self.stacked_widget.setCurrentWidget(self.email_interface_screen)
             
-            self.current_ttl = 0  
-            self.seconds_counter = 0 
-            
-            self.updateTTL()
+            self.startTTLWatcher()
             
-            # таймер
+            # таймер для локального обратного отсчета между обновлениями
             self.ttl_timer = QtCore.QTimer()
             self.ttl_timer.timeout.connect(self.decrementTTL)
             self.ttl_timer.start(1000)
@@ -376,31 +577,31 @@ class EmailTunnelApp(QtWidgets.QMainWindow):
             self.showError(f"Туннель создан, но произошла ошибка при настройке интерфейса: {str(e)}")
 
 
-    def updateTTL(self):
-        # получение актуального ttl
+    def startTTLWatcher(self):
+        # TTL показывается для выбранного ящика
+        if hasattr(self, 'ttl_watcher'):
+            self.ttl_watcher.stop()
+
+        self.current_ttl = 0
+
+        # актуальный TTL приходит из фонового потока
+        self.ttl_watcher = TTLWatcher(self.tunnel_id)
+        self.ttl_watcher.ttl_updated.connect(self.updateTTL)
+        self.ttl_watcher.ttl_error.connect(self.email_interface_screen.show_ttl_error)
+        self.ttl_watcher.start()
+
+
+    def updateTTL(self, ttl):
+        # актуальный ttl от сервера
         try:
-            self.logger.debug(f"Запрос текущего TTL для туннеля {self.tunnel_id}")
-            self.current_ttl = get_ttl(self.tunnel_id)
+            self.current_ttl = ttl
             self.email_interface_screen.update_ttl_display(self.current_ttl)
-            self.seconds_counter = 0  # Сбрасываем счетчик секунд
-            self.logger.debug(f"Текущий TTL: {self.current_ttl} секунд")
-        except ConnectionError:
-            self.logger.warning(f"Невозможно подключиться к серверу при updateTTL")
-            self.email_interface_screen.show_ttl_error("сервер временно недоступен")
         except Exception as e:
-            self.logger.warning(f"Ошибка при получении TTL: {str(e)}")
-            self.email_interface_screen.show_ttl_error(str(e))
+            self.logger.warning(f"Ошибка при обновлении TTL: {str(e)}")
 
 
     def decrementTTL(self):
         try:
-            self.seconds_counter += 1
-            
-            # синхронизация с сервером
-            if self.seconds_counter >= 60:
-                self.updateTTL()
-                return
-
             if self.current_ttl > 0:
                 self.current_ttl -= 1
                 self.email_interface_screen.update_ttl_display(self.current_ttl)
@@ -410,38 +611,65 @@ class EmailTunnelApp(QtWidgets.QMainWindow):
             self.logger.error(f"Ошибка при decrementTTL: {error_msg}")
     
 
-    def addEmail(self, sender, subject, body, html_content=None):
+    def addEmails(self, emails):
         try:
-            email = {
-                "sender": sender,
-                "subject": subject,
-                "body": body,
-                "html_content": html_content,  # м.б. None
-                "timestamp": time.strftime("%d.%m.%Y %H:%M")
-            }
+            timestamp = time.strftime("%d.%m.%Y %H:%M")
+            for email in emails:
+                email["timestamp"] = timestamp
             
-            self.emails.append(email)
-            
-            self.email_interface_screen.add_email_to_list(email, len(self.emails) - 1)
-            self.logger.debug(f"Письмо добавлено успешно, всего писем: {len(self.emails)}")
+            # письмо попадает в ящики всех доменов из RCPT
+            by_mailbox = {}
+            for email in emails:
+                for name in email.get("mailboxes") or [self.subdomain]:
+                    by_mailbox.setdefault(name, []).append(email)
+
+            for name, group in by_mailbox.items():
+                # тела писем уходят в хранилище одной транзакцией,
+                # в интерфейсе остаются только заголовки
+                email_ids = self.mailbox.add_many(name, group)
+
+                if name == self.subdomain:
+                    self.email_interface_screen.add_emails_to_list(list(zip(email_ids, group)))
+                self.logger.debug(f"Добавлено писем в {name}: {len(email_ids)}")
+
+            # письма в хранилище - из очереди на диске их можно убрать
+            get_mail_spool().remove([email["spool_id"] for email in emails if email.get("spool_id")])
         except Exception as e:
-            self.logger.error(f"Ошибка при добавлении письма: {str(e)}", exc_info=True)
+            self.logger.error(f"Ошибка при добавлении писем: {str(e)}", exc_info=True)
 
-    def handle_new_email(self, email_data):
-        # обработчик нового письма
-        try:
-            self.logger.info(f"Получено новое письмо от: {email_data.get('sender', 'unknown')}")
-            # добавляем письмо в интерфейс
-            self.addEmail(
-                email_data["sender"],
-                email_data["subject"],
-                email_data["body"],
-                email_data.get("html_content", None)
-            )
-        except KeyError as ke:
-            self.logger.error(f"Ошибка в структуре данных письма - отсутствует поле {str(ke)}", exc_info=True)
-        except Exception as e:
-            self.logger.error(f"Ошибка при обработке нового письма: {str(e)}", exc_info=True)
+    def handle_new_emails(self, batch):
+        # обработчик пачки новых писем
+        emails = []
+        for email_data in batch:
+            try:
+                self.logger.info(f"Получено новое письмо от: {email_data.get('sender', 'unknown')}")
+                emails.append({
+                    "sender": email_data["sender"],
+                    "sender_name": email_data.get("sender_name", None),
+                    "subject": email_data["subject"],
+                    "body": email_data["body"],
+                    "html_content": email_data.get("html_content", None),  # м.б. None
+                    "plain_content": email_data.get("plain_content", None),
+                    "attachments": email_data.get("attachments", []),
+                    "spool_id": email_data.get("spool_id"),
+                    "mailboxes": email_data.get("mailboxes", None)
+                })
+            except KeyError as ke:
+                self.logger.error(f"Ошибка в структуре данных письма - отсутствует поле {str(ke)}", exc_info=True)
+            except Exception as e:
+                self.logger.error(f"Ошибка при обработке нового письма: {str(e)}", exc_info=True)
+
+        if emails:
+            if not getattr(self, "first_email_traced", True):
+                # время от начала создания туннеля до первого письма
+                self.first_email_traced = True
+                since_setup = time.monotonic() - self.tunnel_span.start
+                tracer.event("first_email_received", parent=self.tunnel_span,
+                             since_setup=round(since_setup, 3))
+                self.logger.info(f"Первое письмо получено через {since_setup:.2f}с после начала создания туннеля")
+
+            # добавляем письма в интерфейс
+            self.addEmails(emails)
 
     
     def showError(self, error_msg):
@@ -9,8 +9,99 @@ ZEROSSL_EAB_URL = "https://api.zerossl.com/acme/eab-credentials"
 
 TOKEN_LENGTH = 40
 
+# сохраненный сертификат переиспользуется, пока до истечения больше этого срока
+CERT_RENEW_BEFORE_DAYS = 7
+
+# тип ключей сертификата и ACME аккаунта: "rsa", "ec-p256" или "ec-p384"
+ACC_KEY_TYPE = "ec-p256"
+CERT_KEY_TYPE = "ec-p256"
+
+# сколько готовых ключей каждого типа держать в памяти
+KEY_POOL_SIZE = 2
+# какие ключи генерируются заранее: ECDSA создается за доли миллисекунды, RSA - за десятки
+KEY_POOL_TYPES = ("rsa",)
+# пауза перед повтором после ошибки генерации, удваивается до максимума (секунды)
+KEY_POOL_RETRY_DELAY = 5
+KEY_POOL_RETRY_MAX = 300
+
+# спаны этапов туннеля в .logs/trace.jsonl (OTLP JSON)
+TRACING_ENABLED = True
+# размер файла спанов до ротации и число старых файлов
+TRACE_LOG_MAX_BYTES = 1024 * 1024
+TRACE_LOG_BACKUPS = 2
+
+USER_AGENT = 'mailtunnel'
+
+# таймауты (connect, read) в секундах для запросов к API
+API_TIMEOUTS = {
+    "default": (5, 15),
+    "create_tunnel": (5, 30),
+    "delete_tunnel": (5, 15),
+    "tunnel_status": (5, 10),
+    "verify_subdomain": (5, 30),
+    "zerossl_eab": (5, 30),
+    "crt_sh": (5, 60),
+}
+API_RETRIES = 3
+API_RETRY_BACKOFF = 0.5
+
+# опрос TTL: интервал ~ TTL / 10 в этих пределах (секунды)
+TTL_POLL_MIN = 10
+TTL_POLL_MAX = 120
+TTL_ERROR_BACKOFF_MAX = 60
+# сколько ждать события в подписке на TTL, прежде чем переподключиться
+TTL_STREAM_READ_TIMEOUT = 90
+
+# проверка сертификатов через crt.sh (секунды)
+CT_CHECK_TIMEOUT = 45
+CT_CACHE_TTL = 600
+
 SMTPD_LOGGING=False
 
+# разбор писем вне цикла aiosmtpd: "thread" или "process"
+MAIL_PARSER_EXECUTOR = "thread"
+MAIL_PARSER_WORKERS = 2
+# сколько писем может ждать разбора, прежде чем сервер начнет отвечать 451
+MAIL_PARSER_MAX_PENDING = 256
+# как часто новые письма передаются в интерфейс пачкой
+EMAIL_BATCH_INTERVAL_MS = 30
+# сколько подготовленных к показу писем держать в памяти
+RENDER_CACHE_SIZE = 64
+# сколько соседних писем с каждой стороны готовить заранее
+RENDER_PREFETCH_NEIGHBORS = 2
+# задержка поиска после последнего нажатия клавиши (мс)
+SEARCH_DEBOUNCE_MS = 150
+# сколько старых писем индексировать для поиска за одну транзакцию
+FTS_BACKFILL_BATCH = 20
+# вложения и встроенные картинки: размер блока при декодировании и записи на диск
+BLOB_CHUNK_SIZE = 64 * 1024
+# сколько секунд файл без ссылок из хранилища писем не удаляется (письмо может быть еще в разборе)
+BLOB_GC_GRACE = 600
+# сколько дней хранить письма: более старые удаляются при запуске вместе с их вложениями
+MAILBOX_RETENTION_DAYS = 30
+# как часто проверять, не обновились ли файлы сертификатов (секунды)
+TLS_RELOAD_INTERVAL = 5
+# возобновление TLS-сессий: число тикетов на соединение и период смены ключей тикетов (секунды)
+TLS_NUM_TICKETS = 2
+TLS_TICKET_ROTATE = 3600
+
+# перезапуск rathole (секунды): задержка растет от MIN до MAX
+RATHOLE_RESTART_MIN = 1
+RATHOLE_RESTART_MAX = 60
+# сколько процесс должен проработать, чтобы счетчик падений сбросился
+RATHOLE_STABLE_AFTER = 30
+# сколько ждать восстановления control channel, прежде чем перезапустить процесс
+RATHOLE_DOWN_RESTART = 45
+# вывод rathole: размер файла лога до ротации, число старых файлов и событий в памяти
+RATHOLE_LOG_MAX_BYTES = 1024 * 1024
+RATHOLE_LOG_BACKUPS = 2
+RATHOLE_EVENTS_KEEP = 200
+# без heartbeat от сервера дольше этого control channel считается потерянным
+RATHOLE_HEARTBEAT_TIMEOUT = 40
+
+# транспорт туннеля: "rathole" - внешний бинарник, "inprocess" - клиент протокола внутри приложения
+TUNNEL_TRANSPORT = "rathole"
+
 FUNNY_EMAILS = [
     "lolninjapro",
     "tacodancer1",
@@ -0,0 +1,57 @@
+import os
+
+from PySide6.QtCore import QFile, QIODevice, QUrl, QUrlQuery
+from PySide6.QtWebEngineCore import QWebEngineUrlScheme, QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob
+
+from app.utils.blob_store import get_blob_store
+from app.utils.email_renderer import BLOB_SCHEME
+from app.utils.logger import setup_logger
+
+
+SCHEME = BLOB_SCHEME.encode()
+
+
+def register_scheme():
+    # Qt принимает регистрацию схемы, пока не создан ни один профиль или view
+    # WebEngine (иначе "Too late to register scheme"); Chromium при этом не запускается
+    scheme = QWebEngineUrlScheme(SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Path)
+    # без LocalScheme: письмо загружается через setHtml и иначе не увидит картинки
+    scheme.setFlags(QWebEngineUrlScheme.Flag.SecureScheme)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+
+# отдает встроенные картинки письма из хранилища вложений
+class BlobSchemeHandler(QWebEngineUrlSchemeHandler):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.logger = setup_logger(f"{self.__class__.__name__}")
+
+    def requestStarted(self, job):
+        url = job.requestUrl()
+
+        try:
+            path = get_blob_store().path(url.path())
+        except ValueError:
+            job.fail(QWebEngineUrlRequestJob.Error.UrlInvalid)
+            return
+
+        if not os.path.exists(path):
+            self.logger.warning(f"Вложение не найдено: {url.path()}")
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            return
+
+        content_type = QUrlQuery(url).queryItemValue("type", QUrl.ComponentFormattingOption.FullyDecoded)
+
+        # файл читается движком по частям и закрывается вместе с запросом
+        blob = QFile(path, job)
+        if not blob.open(QIODevice.OpenModeFlag.ReadOnly):
+            job.fail(QWebEngineUrlRequestJob.Error.RequestFailed)
+            return
+
+        job.reply((content_type or "application/octet-stream").encode(), blob)
+
+
+def install_handler(profile):
+    if profile.urlSchemeHandler(SCHEME) is None:
+        profile.installUrlSchemeHandler(SCHEME, BlobSchemeHandler(profile))
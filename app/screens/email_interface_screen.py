@@ -1,40 +1,30 @@
 from Qt import QtWidgets, QtCore, QtGui
 
-from PySide6.QtWebEngineWidgets import QWebEngineView
-from PySide6.QtWebEngineCore import QWebEnginePage, QWebEngineSettings
-
-import webbrowser
 import html
+import os
+import shutil
 import time
 import random
 from app.screens.settings_screen import SettingsScreen
-from app.config.constants import FUNNY_EMAILS
+from app.screens.email_list_model import EmailListModel, EmailItemDelegate
+from app.config.constants import FUNNY_EMAILS, RENDER_PREFETCH_NEIGHBORS, SEARCH_DEBOUNCE_MS
 from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+from app.utils import email_renderer
+from app.utils.render_cache import RenderCache, prepare_email
+from app.utils.blob_store import get_blob_store
 
 
-# перехват ссылок, чтобы можно было открывать ссылки в пользовательском браузере
-class ExternalBrowserPage(QWebEnginePage):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.logger = setup_logger(f"{self.__class__.__name__}")
-        
-    def acceptNavigationRequest(self, url, _type, isMainFrame):
-        try:
-            if _type == QWebEnginePage.NavigationType.NavigationTypeLinkClicked:  
-                url_str = url.toString()
-                # открываем ссылку в системном браузере
-                webbrowser.open(url_str)
-                return False
-        except Exception as e:
-            self.logger.error(f"Ошибка при обработке внешней ссылки: {str(e)}", exc_info=True)
-            
-        return True
+# встроенные картинки писем читаются из хранилища вложений, удаленные не загружаются
+class EmailTextBrowser(QtWidgets.QTextBrowser):
+    def loadResource(self, resource_type, url):
+        if resource_type == QtGui.QTextDocument.ImageResource and url.scheme() == email_renderer.BLOB_SCHEME:
+            try:
+                return QtGui.QImage(get_blob_store().path(url.path()))
+            except ValueError:
+                return None
 
-    def createWindow(self, _type):
-        # для ссылок, открывающихся в новом окне
-        dummy_page = ExternalBrowserPage(self)
-        dummy_page.urlChanged.connect(lambda url: webbrowser.open(url.toString()))
-        return dummy_page
+        return super().loadResource(resource_type, url)
 
 
 class EmailInterfaceScreen(QtWidgets.QWidget):
@@ -44,6 +34,8 @@ class EmailInterfaceScreen(QtWidgets.QWidget):
         
         self.parent = parent
         self.subdomain = None
+        self.current_email = None
+        self.shown_email = None
         
         try:
             self.setup_ui()
@@ -158,7 +150,7 @@ class EmailInterfaceScreen(QtWidgets.QWidget):
             email_layout.addStretch()
 
             self.top_bar.addWidget(self.email_container)
-            
+
             self.top_bar.addStretch()
             
             # TTL indicator
@@ -169,6 +161,14 @@ class EmailInterfaceScreen(QtWidgets.QWidget):
 
             self.top_bar.addWidget(self.ttl_label)
 
+            # состояние связи с сервером туннеля
+            self.tunnel_state_label = QtWidgets.QLabel("● подключение...")
+            self.tunnel_state_label.setFont(QtGui.QFont('Arial', 10))
+            self.tunnel_state_label.setStyleSheet("color: #808080;")
+            self.tunnel_state_label.setAlignment(QtCore.Qt.AlignVCenter)
+
+            self.top_bar.addWidget(self.tunnel_state_label)
+
             # "Удалить почту"
             self.delete_button = QtWidgets.QPushButton("Удалить почту")
             self.delete_button.setStyleSheet("""
@@ -204,30 +204,54 @@ class EmailInterfaceScreen(QtWidgets.QWidget):
             email_list_layout.setContentsMargins(0, 0, 0, 0)
             email_list_layout.setSpacing(0)
             
-            # Список писем
-            self.email_list = QtWidgets.QListWidget()
+            # поиск по отправителю, теме и тексту писем
+            self.search_input = QtWidgets.QLineEdit()
+            self.search_input.setPlaceholderText("Поиск по письмам...")
+            self.search_input.setClearButtonEnabled(True)
+            self.search_input.setStyleSheet("""
+                QLineEdit {
+                    background-color: #333333;
+                    color: #e0e0e0;
+                    border: 1px solid #444444;
+                    border-radius: 3px;
+                    padding: 4px 6px;
+                }
+                QLineEdit:focus {
+                    border: 1px solid #3498db;
+                }
+            """)
+
+            # запрос уходит в индекс, когда пользователь перестал печатать
+            self.search_timer = QtCore.QTimer(self)
+            self.search_timer.setSingleShot(True)
+            self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+            self.search_timer.timeout.connect(self.apply_search)
+            self.search_input.textChanged.connect(self.search_timer.start)
+
+            email_list_layout.addWidget(self.search_input)
+            email_list_layout.addSpacing(6)
+
+            # Список писем: строки рисует делегат, виджетов на каждое письмо нет
+            self.email_model = EmailListModel(self.parent.mailbox, self)
+            # подготовленные к показу письма, включая заранее прочитанных соседей
+            self.render_cache = RenderCache(self.parent.mailbox.get_email)
+            
+            self.email_list = QtWidgets.QListView()
             self.email_list.setMinimumWidth(350)
+            self.email_list.setModel(self.email_model)
+            self.email_list.setItemDelegate(EmailItemDelegate(self.email_list))
+            self.email_list.setUniformItemSizes(True)
+            self.email_list.setMouseTracking(True)
             self.email_list.setStyleSheet("""
-                QListWidget {
+                QListView {
                     background-color: #1e1e1e;
                     color: #e0e0e0;
                     border: 1px solid #3d3d3d;
                     border-radius: 6px;
                     padding: 5px;
                 }
-                QListWidget::item {
-                    border-bottom: 1px solid #3d3d3d;
-                    padding: 5px;
-                }
-                QListWidget::item:selected {
-                    background-color: #2c3e50;
-                    color: #ffffff;
-                }
-                QListWidget::item:hover {
-                    background-color: #232323;
-                }
             """)
-            self.email_list.currentItemChanged.connect(self.display_email)
+            self.email_list.selectionModel().currentChanged.connect(self.display_email)
             
             # "Тут пока пусто..."
             self.empty_list_label = QtWidgets.QLabel("Тут пока пусто...")
@@ -291,39 +315,61 @@ class EmailInterfaceScreen(QtWidgets.QWidget):
             self.email_header_layout.addWidget(self.email_sender_label)
             self.email_header_layout.addWidget(self.email_date_label)
 
+            # каким способом показано письмо
+            render_row = QtWidgets.QHBoxLayout()
+            self.render_mode_label = QtWidgets.QLabel()
+            self.render_mode_label.setStyleSheet("color: #777777; font-size: 11px;")
+
+            self.full_view_button = QtWidgets.QPushButton("Полная версия")
+            self.full_view_button.setToolTip("Показать письмо в браузерном движке, с картинками")
+            self.full_view_button.setStyleSheet("""
+                QPushButton {
+                    background-color: #333333;
+                    color: #e0e0e0;
+                    border: none;
+                    border-radius: 4px;
+                    padding: 3px 8px;
+                }
+                QPushButton:hover {
+                    background-color: #444444;
+                }
+            """)
+            self.full_view_button.clicked.connect(self.show_full_version)
+            self.full_view_button.hide()
+
+            render_row.addWidget(self.render_mode_label)
+            render_row.addStretch()
+            render_row.addWidget(self.full_view_button)
+            self.email_header_layout.addLayout(render_row)
+
+            # вложения письма, по ссылке - сохранение на диск
+            self.attachments_label = QtWidgets.QLabel()
+            self.attachments_label.setWordWrap(True)
+            self.attachments_label.setTextFormat(QtCore.Qt.RichText)
+            self.attachments_label.setStyleSheet("color: #ababab;")
+            self.attachments_label.linkActivated.connect(self.save_attachment)
+            self.attachments_label.hide()
+            self.email_header_layout.addWidget(self.attachments_label)
+
             self.email_subject_label.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
             self.email_sender_label.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
             self.email_date_label.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
             
-            # webview для содержимого письма
-            self.email_content = QWebEngineView()
-            self.email_content.setMinimumHeight(300)
-            
-            # перехват ссылок
-            try:
-                custom_page = ExternalBrowserPage(self.email_content)
-                self.email_content.setPage(custom_page)
-            except Exception as e:
-                self.logger.error(f"Ошибка при установке обработчика ссылок: {str(e)}", exc_info=True)
-            
-            # безопасный рендеринг html и css
-            try:
-                # Fix settings.setAttribute calls
-                settings = self.email_content.settings()
-                settings.setAttribute(QWebEngineSettings.AutoLoadImages, True)
-                settings.setAttribute(QWebEngineSettings.JavascriptEnabled, False)
-                settings.setAttribute(QWebEngineSettings.LocalContentCanAccessFileUrls, False)
-                settings.setAttribute(QWebEngineSettings.PluginsEnabled, False)
-                self.logger.debug("Настроены параметры безопасности WebEngine")
-            except Exception as e:
-                self.logger.error(f"Ошибка при настройке параметров WebEngine: {str(e)}", exc_info=True)
-            
-            # темный фон
-            self.email_content.setStyleSheet("background-color: #1e1e1e;")
+            # содержимое письма: текст и простой html показывает легкий QTextBrowser,
+            # QWebEngineView создается при первом письме со сложной версткой
+            self.content_stack = QtWidgets.QStackedWidget()
+            self.content_stack.setMinimumHeight(300)
+
+            self.text_view = EmailTextBrowser()
+            self.text_view.setOpenExternalLinks(True)
+            self.text_view.setStyleSheet("background-color: #1a1a1a; color: #e0e0e0; border: none;")
+            self.content_stack.addWidget(self.text_view)
+
+            self._web_view = None
             
             # добавляем все элементы в правую панель
             right_layout.addWidget(self.email_header_widget)
-            right_layout.addWidget(self.email_content, 1)  # webview, растяжимое пространство
+            right_layout.addWidget(self.content_stack, 1)  # растяжимое пространство
             
             # скрываем заголовок
             self.email_header_widget.hide()
@@ -344,6 +390,19 @@ class EmailInterfaceScreen(QtWidgets.QWidget):
             raise
 
 
+    @property
+    def email_content(self):
+        # QtWebEngine импортируется и запускается только здесь
+        if self._web_view is None:
+            from app.screens.web_view import create_web_view
+
+            start = time.monotonic()
+            self._web_view = create_web_view()
+            self.content_stack.addWidget(self._web_view)
+            self.logger.debug(f"WebEngine инициализирован за {time.monotonic() - start:.2f}с")
+
+        return self._web_view
+
     def initial_webview_message(self):
         try:
             initial_html = """
@@ -393,7 +452,10 @@ class EmailInterfaceScreen(QtWidgets.QWidget):
             </body>
             </html>
             """
-            self.email_content.setHtml(initial_html)
+            self.current_email = None
+            self.shown_email = None
+            self.text_view.setHtml(initial_html)
+            self.content_stack.setCurrentWidget(self.text_view)
         except Exception as e:
             self.logger.error(f"Ошибка при установке начального сообщения в WebView: {str(e)}", exc_info=True)
 
@@ -436,6 +498,7 @@ class EmailInterfaceScreen(QtWidgets.QWidget):
         try:
             self.subdomain = subdomain
             self.domain_label.setText(f"@{self.subdomain}")
+            self.load_stored_emails()
         except Exception as e:
             self.logger.error(f"Ошибка при настройке данных поддомена: {str(e)}", exc_info=True)
     
@@ -462,6 +525,23 @@ class EmailInterfaceScreen(QtWidgets.QWidget):
         except Exception as e:
             self.logger.error(f"Ошибка при обновлении отображения TTL: {str(e)}", exc_info=True)
     
+    def update_tunnel_state(self, connected):
+        try:
+            if connected:
+                self.tunnel_state_label.setText("● на связи")
+                self.tunnel_state_label.setStyleSheet("color: #2ecc71;")
+            else:
+                self.tunnel_state_label.setText("● нет связи")
+                self.tunnel_state_label.setStyleSheet("color: #ff5252;")
+        except Exception as e:
+            self.logger.error(f"Ошибка при обновлении состояния туннеля: {str(e)}", exc_info=True)
+
+    def show_reconnect_latency(self, latency):
+        try:
+            self.tunnel_state_label.setToolTip(f"Последнее подключение заняло {latency:.1f} с")
+        except Exception as e:
+            self.logger.error(f"Ошибка при отображении времени подключения: {str(e)}", exc_info=True)
+
     def show_ttl_error(self, error_msg):
         try:
             error_msg = error_msg[:20] + "..."
@@ -471,117 +551,181 @@ class EmailInterfaceScreen(QtWidgets.QWidget):
         except Exception as e:
             self.logger.error(f"Ошибка при отображении сообщения об ошибке TTL: {str(e)}", exc_info=True)
     
-    def add_email_to_list(self, email, index):
+    def load_stored_emails(self):
+        # письма, сохраненные для этого поддомена в прошлых сессиях
+        self.email_model.set_mailbox(self.subdomain)
+        self.update_empty_state()
+
+        if self.email_model.total():
+            self.logger.debug(f"В хранилище найдено писем: {self.email_model.total()}")
+
+    def update_empty_state(self):
+        # только один виджет виден: список или метка
+        if self.email_model.total():
+            self.empty_list_label.hide()
+            self.email_list.show()
+        else:
+            self.email_list.hide()
+            self.empty_list_label.setText("Ничего не найдено" if self.email_model.query else "Тут пока пусто...")
+            self.empty_list_label.show()
+
+    def apply_search(self):
         try:
-            # нужно ли скрывать метку пустого списка?
-            if self.email_list.count() == 0:
-                self.empty_list_label.hide()
-                self.email_list.show()
-                self.logger.debug("Первое письмо в списке, замена пустого сообщения на список")
-            
-            # добавление письма
-            item = QtWidgets.QListWidgetItem()
-            item_widget = QtWidgets.QWidget()
+            query = self.search_input.text().strip()
+            if len(query) < 2:
+                # одна буква совпадает почти со всем - показываем весь ящик
+                query = ""
 
-            item_widget.setStyleSheet("background-color: transparent;")
-            item_layout = QtWidgets.QVBoxLayout(item_widget)
-            item_layout.setContentsMargins(5, 8, 5, 15)
-            
-            sender_label = QtWidgets.QLabel(email["sender"])
-            sender_label.setFont(QtGui.QFont('Arial', 10, QtGui.QFont.Bold))
-            sender_label.setStyleSheet("color: #e0e0e0;")
-            
-            subject_label = QtWidgets.QLabel(email["subject"])
-            subject_label.setFont(QtGui.QFont('Arial', 9))
-            subject_label.setStyleSheet("color: #cccccc;")
-            
-            timestamp_label = QtWidgets.QLabel(email["timestamp"])
-            timestamp_label.setFont(QtGui.QFont('Arial', 8))
-            timestamp_label.setStyleSheet("color: #808080;")
-            
-            item_layout.addWidget(sender_label)
-            item_layout.addWidget(subject_label)
-            item_layout.addWidget(timestamp_label)
-            
-            item_widget.setFixedHeight(80)
-            
-            item.setSizeHint(item_widget.sizeHint())
-            self.email_list.addItem(item)
-            self.email_list.setItemWidget(item, item_widget)
+            if query == (self.email_model.query or ""):
+                return
+
+            start = time.monotonic()
+            self.email_model.set_filter(query)
+            elapsed = time.monotonic() - start
+
+            metrics.observe("search.query", elapsed)
+            self.update_empty_state()
+            self.logger.debug(f"Поиск '{query}': {self.email_model.total()} писем за {elapsed * 1000:.1f}мс")
+        except Exception as e:
+            self.logger.error(f"Ошибка при поиске писем: {str(e)}", exc_info=True)
+
+    def add_emails_to_list(self, emails):
+        try:
+            if not emails:
+                return
+
+            # нужно ли скрывать метку пустого списка?
+            was_empty = self.email_model.total() == 0
             
-            item.setData(QtCore.Qt.UserRole, index)
-            self.logger.debug(f"Письмо добавлено в список с индексом {index}")
+            # вся пачка вставляется одним изменением модели
+            self.email_model.append_emails(emails)
+            self.logger.debug(f"В список добавлено писем: {len(emails)}")
             
-            # автоматически выбираем первое письмо
-            if self.email_list.count() == 1:
-                self.email_list.setCurrentItem(item)
+            if was_empty and self.email_model.total():
+                self.update_empty_state()
+                self.logger.debug("Первые письма в списке, замена пустого сообщения на список")
+
+                # автоматически выбираем первое письмо
+                self.email_list.setCurrentIndex(self.email_model.index(0))
         except Exception as e:
-            self.logger.error(f"Ошибка при добавлении письма в список: {str(e)}", exc_info=True)
+            self.logger.error(f"Ошибка при добавлении писем в список: {str(e)}", exc_info=True)
     
     def display_email(self, current, previous):
         try:
-            if current:
-                # получение индекса письма из данных элемента
-                email_idx = current.data(QtCore.Qt.UserRole)
+            if current.isValid():
+                start = time.monotonic()
+
+                # получение id письма из модели
+                email_id = current.data(EmailListModel.IdRole)
+                
+                # тело письма читается из хранилища только при просмотре,
+                # если его еще нет в кэше
+                prepared = self.render_cache.get(email_id)
                 
-                if not hasattr(self.parent, 'emails') or email_idx >= len(self.parent.emails):
-                    self.logger.error(f"Индекс письма {email_idx} вне диапазона или список писем не существует")
+                if prepared is None:
+                    self.logger.error(f"Письмо {email_id} не найдено в хранилище")
                     return
-                    
-                email = self.parent.emails[email_idx]
                 
+                email = prepared.email
+
                 # обновляем pyqt виджеты заголовка письма
                 self.email_subject_label.setText(f"Тема: {email['subject']}")
                 self.email_sender_label.setText(f"От: {email['sender']}")
                 self.email_date_label.setText(f"Дата: {email['timestamp']}")
                 self.email_header_widget.show()  # Показываем заголовок письма
                 
-                # есть ли html контент в письме?
-                html_body = email.get('html_content', None)
-                
-                # нет html контента => используем простой текст, экранируя его
-                if not html_body:
-                    body_content = self.text_to_html(email['body'])
-                    self.logger.debug("Использование простого текста для отображения")
-                else:
-                    body_content = html_body
-                    self.logger.debug("Использование HTML контента для отображения")
-                
-                # упрощенный html шаблон
-                full_html = f"""
-                <!DOCTYPE html>
-                <html>
-                <head>
-                    <meta charset="UTF-8">
-                    <style>
-                        body {{
-                            background-color: #1e1e1e;
-                            color: #e0e0e0;
-                            font-family: Arial, sans-serif;
-                        }}
-
-                    </style>
-                </head>
-                <body>
-                    {body_content}
-                </body>
-                </html>
-                """
-                
-                # отображение html в webview
-                self.email_content.setHtml(full_html)
+                self.current_email = email
+                self.show_prepared(prepared)
+                metrics.observe("render.switch", time.monotonic() - start)
+
+                self.prefetch_neighbors(current.row())
         except Exception as e:
             self.logger.error(f"Ошибка при отображении письма: {str(e)}", exc_info=True)
-    
-    def text_to_html(self, text):
+
+    def prefetch_neighbors(self, row):
+        # письма рядом с выбранным, ближайшие - первыми
+        email_ids = []
+        for distance in range(1, RENDER_PREFETCH_NEIGHBORS + 1):
+            for neighbor in (row + distance, row - distance):
+                email_id = self.email_model.index(neighbor).data(EmailListModel.IdRole)
+                if email_id is not None:
+                    email_ids.append(email_id)
+
+        self.render_cache.prefetch(email_ids)
+
+    def show_prepared(self, prepared):
+        if prepared is self.shown_email:
+            # то же письмо уже на экране, повторная загрузка во view не нужна
+            return
+
+        start = time.monotonic()
+        tier = prepared.tier
+
+        if tier == email_renderer.TIER_COMPLEX:
+            # отображение html в webview
+            self.email_content.setHtml(prepared.document)
+            self.content_stack.setCurrentWidget(self.email_content)
+            self.render_mode_label.setText("Полная версия")
+        else:
+            self.text_view.setHtml(prepared.document)
+            self.content_stack.setCurrentWidget(self.text_view)
+            self.render_mode_label.setText(
+                "Упрощенный просмотр: картинки не загружаются" if tier == email_renderer.TIER_SIMPLE else ""
+            )
+
+        self.full_view_button.setVisible(tier == email_renderer.TIER_SIMPLE)
+        self.show_attachments(prepared.email.get('attachments') or [])
+        self.shown_email = prepared
+
+        elapsed = time.monotonic() - start
+        metrics.increment(f"render.{tier}")
+        metrics.observe(f"render.{tier}", elapsed)
+        self.logger.debug(f"Письмо {prepared.email.get('id')} показано ({tier}) за {elapsed * 1000:.1f}мс")
+
+    def show_attachments(self, attachments):
+        links = []
+        for index, attachment in enumerate(attachments):
+            if attachment.get('inline'):
+                # встроенные картинки показываются в тексте письма
+                continue
+            name = html.escape(attachment.get('filename') or "без имени")
+            size = attachment.get('size', 0)
+            size_str = f"{size / 1024 / 1024:.1f} МБ" if size >= 1024 * 1024 else f"{max(1, size // 1024)} КБ"
+            links.append(f'<a href="{index}" style="color: #3498db;">{name}</a> ({size_str})')
+
+        if not links:
+            self.attachments_label.hide()
+            return
+
+        self.attachments_label.setText("Вложения: " + ", ".join(links))
+        self.attachments_label.show()
+
+    def save_attachment(self, link):
         try:
-            escaped_text = html.escape(text)
-            html_text = escaped_text.replace('\n', '<br>')
-            return html_text
+            attachment = self.current_email['attachments'][int(link)]
+            filename = os.path.basename(attachment.get('filename') or "attachment")
+
+            path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Сохранить вложение", filename)
+            if not path:
+                return
+
+            shutil.copyfile(get_blob_store().path(attachment['digest']), path)
+            self.logger.info(f"Вложение сохранено: {path}")
         except Exception as e:
-            self.logger.error(f"Ошибка при конвертации текста в HTML: {str(e)}", exc_info=True)
-            return "<p>Ошибка отображения содержимого письма</p>"
-        
+            self.logger.error(f"Ошибка при сохранении вложения: {str(e)}", exc_info=True)
+            QtWidgets.QMessageBox.warning(
+                self,
+                "Ошибка сохранения",
+                f"Не удалось сохранить вложение: {str(e)}"
+            )
+
+    def show_full_version(self):
+        try:
+            if self.current_email is not None:
+                self.show_prepared(prepare_email(self.current_email, force_full=True))
+        except Exception as e:
+            self.logger.error(f"Ошибка при показе полной версии письма: {str(e)}", exc_info=True)
+
     def confirm_delete_mail(self):
         try:
             self.logger.debug("Запрос подтверждения на удаление почты")
@@ -600,15 +744,20 @@ class EmailInterfaceScreen(QtWidgets.QWidget):
             if result == QtWidgets.QMessageBox.Yes:
                 self.logger.debug("Пользователь подтвердил удаление почты")
                 try:
-                    self.email_list.clear()
+                    self.email_model.clear()
+                    # поиск сбрасывается вместе с ящиком, без повторного запроса
+                    self.search_input.blockSignals(True)
+                    self.search_input.clear()
+                    self.search_input.blockSignals(False)
                     self.email_header_widget.hide()
                     self.initial_webview_message()
                     # после очистки списка показываем метку тут пусто
-                    self.email_list.hide()
-                    self.empty_list_label.show()
+                    self.update_empty_state()
 
                     # удаляем туннель
                     self.parent.deleteTunnel()
+                    # после очистки хранилища: до нее фоновая подготовка могла вернуть письма в кэш
+                    self.render_cache.clear()
 
                     self.logger.info("Почта успешно удалена")
                 except Exception as e:
@@ -0,0 +1,201 @@
+from Qt import QtWidgets, QtCore, QtGui
+
+from app.utils.logger import setup_logger
+
+
+class EmailListModel(QtCore.QAbstractListModel):
+    """
+    Модель списка писем поверх хранилища.
+
+    Заголовки подгружаются страницами через fetchMore, тела писем
+    в модели не хранятся вовсе. С поисковым запросом страницы берутся
+    из полнотекстового индекса, общее число найденных не считается.
+    """
+    IdRole = QtCore.Qt.UserRole
+    SenderRole = QtCore.Qt.UserRole + 1
+    SubjectRole = QtCore.Qt.UserRole + 2
+    TimestampRole = QtCore.Qt.UserRole + 3
+
+    def __init__(self, mailbox, parent=None, page_size=200):
+        super().__init__(parent)
+        self.logger = setup_logger(f"{self.__class__.__name__}")
+
+        self.mailbox = mailbox
+        self.mailbox_name = None
+        self.page_size = page_size
+        self.query = None
+
+        # (id, sender, subject, timestamp) для уже загруженных строк
+        self._headers = []
+        self._total = 0
+        # все найденные по запросу уже загружены
+        self._search_done = False
+
+    def set_mailbox(self, mailbox_name):
+        self._reset(mailbox_name, self.query)
+
+    def set_filter(self, query):
+        self._reset(self.mailbox_name, query)
+
+    def _reset(self, mailbox_name, query):
+        self.beginResetModel()
+        self.mailbox_name = mailbox_name
+        self.query = query or None
+        self._headers = []
+        self._search_done = False
+        self._total = self.mailbox.count(mailbox_name) if mailbox_name and not self.query else 0
+        self.endResetModel()
+
+        if self.query:
+            # первая страница нужна сразу, чтобы знать, найдено ли что-нибудь
+            self.fetchMore()
+
+    def clear(self):
+        self.beginResetModel()
+        self.query = None
+        self._headers = []
+        self._total = 0
+        self._search_done = True
+        self.endResetModel()
+
+    def total(self):
+        # всего писем в ящике, включая еще не загруженные;
+        # при поиске - сколько найдено на данный момент
+        if self.query:
+            return len(self._headers)
+        return self._total
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._headers)
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return False
+        if self.query:
+            return not self._search_done
+        return len(self._headers) < self._total
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or not self.mailbox_name:
+            return
+
+        if self.query:
+            page = self.mailbox.search(self.mailbox_name, self.query, len(self._headers), self.page_size)
+            self._search_done = len(page) < self.page_size
+        else:
+            page = self.mailbox.headers(self.mailbox_name, len(self._headers), self.page_size)
+
+        if not page:
+            # в хранилище меньше писем, чем ожидалось
+            self._total = len(self._headers)
+            return
+
+        first = len(self._headers)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(page) - 1)
+        self._headers.extend((h["id"], h["sender"], h["subject"], h["timestamp"]) for h in page)
+        self.endInsertRows()
+
+    def append_emails(self, emails):
+        # emails - список (id, письмо); строки вставляются одним блоком
+        if self.query:
+            if not self._search_done or not emails:
+                # новые письма придут со следующими страницами поиска
+                return
+
+            # подходят ли новые письма под запрос, знает только индекс; проверяются
+            # только они, чтобы не сбрасывать выделение и прокрутку
+            found = self.mailbox.search(self.mailbox_name, self.query, limit=len(emails),
+                                        email_ids=[email_id for email_id, _ in emails])
+            if found:
+                first = len(self._headers)
+                self.beginInsertRows(QtCore.QModelIndex(), first, first + len(found) - 1)
+                self._headers.extend((h["id"], h["sender"], h["subject"], h["timestamp"]) for h in found)
+                self.endInsertRows()
+            return
+
+        loaded_all = len(self._headers) == self._total
+        self._total += len(emails)
+
+        if not loaded_all or not emails:
+            # хвост списка еще не загружен - письма придут вместе со страницей
+            return
+
+        first = len(self._headers)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(emails) - 1)
+        self._headers.extend((email_id, email["sender"], email["subject"], email["timestamp"])
+                             for email_id, email in emails)
+        self.endInsertRows()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._headers):
+            return None
+
+        email_id, sender, subject, timestamp = self._headers[index.row()]
+
+        if role == self.IdRole:
+            return email_id
+        elif role == self.SenderRole:
+            return sender
+        elif role in (self.SubjectRole, QtCore.Qt.DisplayRole):
+            return subject
+        elif role == self.TimestampRole:
+            return timestamp
+
+        return None
+
+
+class EmailItemDelegate(QtWidgets.QStyledItemDelegate):
+    # рисует отправителя, тему и время без отдельных виджетов на каждую строку
+    ROW_HEIGHT = 80
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.sender_font = QtGui.QFont('Arial', 10, QtGui.QFont.Bold)
+        self.subject_font = QtGui.QFont('Arial', 9)
+        self.timestamp_font = QtGui.QFont('Arial', 8)
+
+        self.sender_color = QtGui.QColor("#e0e0e0")
+        self.subject_color = QtGui.QColor("#cccccc")
+        self.timestamp_color = QtGui.QColor("#808080")
+        self.selected_color = QtGui.QColor("#2c3e50")
+        self.hover_color = QtGui.QColor("#232323")
+        self.border_color = QtGui.QColor("#3d3d3d")
+
+    def sizeHint(self, option, index):
+        return QtCore.QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def paint(self, painter, option, index):
+        painter.save()
+
+        rect = option.rect
+        if option.state & QtWidgets.QStyle.State_Selected:
+            painter.fillRect(rect, self.selected_color)
+        elif option.state & QtWidgets.QStyle.State_MouseOver:
+            painter.fillRect(rect, self.hover_color)
+
+        painter.setPen(self.border_color)
+        painter.drawLine(rect.bottomLeft(), rect.bottomRight())
+
+        text_rect = rect.adjusted(10, 8, -10, -15)
+        line_height = text_rect.height() // 3
+
+        lines = (
+            (index.data(EmailListModel.SenderRole), self.sender_font, self.sender_color),
+            (index.data(EmailListModel.SubjectRole), self.subject_font, self.subject_color),
+            (index.data(EmailListModel.TimestampRole), self.timestamp_font, self.timestamp_color),
+        )
+
+        for i, (text, font, color) in enumerate(lines):
+            line_rect = QtCore.QRect(text_rect.left(), text_rect.top() + i * line_height,
+                                     text_rect.width(), line_height)
+            painter.setFont(font)
+            painter.setPen(color)
+
+            elided = QtGui.QFontMetrics(font).elidedText(text or "", QtCore.Qt.ElideRight,
+                                                         line_rect.width())
+            painter.drawText(line_rect, QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter, elided)
+
+        painter.restore()
@@ -17,6 +17,14 @@ class LoadingScreen(QtWidgets.QWidget):
         progress_label.setStyleSheet("color: #e0e0e0; margin-bottom: 20px;")
         layout.addWidget(progress_label)
         
+        # какие этапы выполняются прямо сейчас
+        self.stage_label = QtWidgets.QLabel("")
+        self.stage_label.setAlignment(QtCore.Qt.AlignCenter)
+        self.stage_label.setFont(QtGui.QFont('Arial', 11))
+        self.stage_label.setStyleSheet("color: #a0a0a0; margin-bottom: 10px;")
+        self.stage_label.setWordWrap(True)
+        layout.addWidget(self.stage_label)
+        
         self.progress_bar = QtWidgets.QProgressBar()
         self.progress_bar.setRange(0, 0)  # Неопределенный прогресс
         self.progress_bar.setFixedSize(400, 30)
@@ -38,3 +46,6 @@ class LoadingScreen(QtWidgets.QWidget):
         progress_layout.addWidget(self.progress_bar)
         progress_layout.addStretch()
         layout.addLayout(progress_layout)
+
+    def show_stage(self, stages):
+        self.stage_label.setText(stages)
@@ -1,5 +1,8 @@
 from Qt import QtWidgets, QtCore, QtGui
 from app.utils.api import check_security
+from app.utils.worker import Worker
+from app.utils.metrics import metrics
+from app.utils.tracing import tracer
 import webbrowser
 
 class SettingsScreen(QtWidgets.QDialog):
@@ -7,7 +10,7 @@ class SettingsScreen(QtWidgets.QDialog):
         super().__init__(parent)
         self.parent = parent
         self.setWindowTitle("Дополнительные функции")
-        self.setFixedSize(500, 350)
+        self.setFixedSize(500, 520)
         self.setup_ui()
         
     def setup_ui(self):
@@ -62,47 +65,90 @@ class SettingsScreen(QtWidgets.QDialog):
         
         self.layout.addWidget(self.security_section)
         
-        self.layout.addStretch(1)
+        # отладочная панель: сводка трассировки и метрики
+        self.debug_title_label = QtWidgets.QLabel("Диагностика")
+        self.debug_title_label.setFont(QtGui.QFont('Arial', 12, QtGui.QFont.Bold))
+        self.debug_title_label.setStyleSheet("color: #3498db;")
+        self.layout.addWidget(self.debug_title_label)
+        
+        self.debug_info = QtWidgets.QPlainTextEdit()
+        self.debug_info.setReadOnly(True)
+        self.debug_info.setFont(QtGui.QFont('Courier New', 9))
+        self.debug_info.setStyleSheet("background-color: #1e1e1e; color: #cccccc; border: 1px solid #3d3d3d;")
+        self.layout.addWidget(self.debug_info, 1)
+        
+        self.update_debug_info()
+
+    def update_debug_info(self):
+        lines = []
+        
+        summary = tracer.last_trace_summary("tunnel.setup")
+        lines.append(summary or "Туннель еще не создавался")
+        lines.append("")
+        
+        for name, timing in sorted(metrics.snapshot()["timings"].items()):
+            lines.append(f"{name}: n={timing['count']} avg={timing['avg']:.3f}с max={timing['max']:.3f}с")
+        
+        rathole = getattr(self.parent, "rathole", None)
+        if rathole is not None:
+            lines.append("")
+            lines.append(f"rathole: {'на связи' if rathole.connected else 'нет связи'}, перезапусков {rathole.restarts}")
+            lines.extend(f"  {event.level} {event.message}" for event in rathole.recent_events()[-5:])
+        
+        self.debug_info.setPlainText("\n".join(lines))
 
     def check_security(self):
         try:
             self.security_button.setText("Проверка...")
             self.security_button.setEnabled(False)
-            QtWidgets.QApplication.processEvents()  # обновление интерфейса
             
+            # запрос к crt.sh может занимать десятки секунд - выполняем в фоне
+            self.certificates = None
+            self.security_worker = Worker(self.load_certificates, self.parent.subdomain)
+            # поток принадлежит главному окну, чтобы пережить закрытие диалога
+            self.security_worker.setParent(self.parent)
+            self.security_worker.finished.connect(self.show_security_result)
+            self.security_worker.error.connect(self.show_security_error)
+            self.security_worker.start()
+        except Exception as e:
+            self.show_security_error(str(e))
+
+    def load_certificates(self, should_stop, subdomain):
+        self.certificates = check_security(subdomain)
+
+    def show_security_result(self):
+        certificates = self.certificates or []
+        
+        if len(certificates) == 2:
+            self.security_button.setText("Безопасность подтверждена")
+            self.security_button.setStyleSheet("""
+                QPushButton {
+                    background-color: #2ecc71;
+                    color: white;
+                    border: none;
+                    border-radius: 4px;
+                    padding: 8px 16px;
+                }
+            """)
             
-            certificates = check_security(self.parent.subdomain)
+            cert_link = f"https://crt.sh/?q={self.parent.subdomain}"
             
-            if len(certificates) == 2:
-                self.security_button.setText("Безопасность подтверждена")
-                self.security_button.setStyleSheet("""
-                    QPushButton {
-                        background-color: #2ecc71;
-                        color: white;
-                        border: none;
-                        border-radius: 4px;
-                        padding: 8px 16px;
-                    }
-                """)
-                
-                cert_link = f"https://crt.sh/?q={self.parent.subdomain}"
-                
-                self.security_result.setText(f"Данные о сертификате доступны по <a href='{cert_link}'>ссылке</a>")
-                self.security_result.show()
-            elif len(certificates) == 0:
-                self.security_button.setText("Проверить безопасность")
-                self.security_button.setEnabled(True)
-                QtWidgets.QMessageBox.warning(self, "Проверка безопасности",
-                                    "Данные о сертификате еще не успели появиться в открытом доступе. "
-                                    "Попробуйте ещё раз через пару минут")
-            else:
-                self.security_button.setText("Проверить безопасность")
-                self.security_button.setEnabled(True)
-                QtWidgets.QMessageBox.warning(self, "Проверка безопасности", 
-                                   "Не удалось подтвердить безопасность. "
-                                   "Обнаружены проблемы с сертификатами.")
-                
-        except Exception as e:
+            self.security_result.setText(f"Данные о сертификате доступны по <a href='{cert_link}'>ссылке</a>")
+            self.security_result.show()
+        elif len(certificates) == 0:
             self.security_button.setText("Проверить безопасность")
             self.security_button.setEnabled(True)
-            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Произошла ошибка при проверке безопасности: {str(e)}")
+            QtWidgets.QMessageBox.warning(self, "Проверка безопасности",
+                                "Данные о сертификате еще не успели появиться в открытом доступе. "
+                                "Попробуйте ещё раз через пару минут")
+        else:
+            self.security_button.setText("Проверить безопасность")
+            self.security_button.setEnabled(True)
+            QtWidgets.QMessageBox.warning(self, "Проверка безопасности", 
+                               "Не удалось подтвердить безопасность. "
+                               "Обнаружены проблемы с сертификатами.")
+
+    def show_security_error(self, error_msg):
+        self.security_button.setText("Проверить безопасность")
+        self.security_button.setEnabled(True)
+        QtWidgets.QMessageBox.critical(self, "Ошибка", f"Произошла ошибка при проверке безопасности: {error_msg}")
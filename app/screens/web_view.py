@@ -0,0 +1,81 @@
+import webbrowser
+
+from PySide6.QtWebEngineWidgets import QWebEngineView
+from PySide6.QtWebEngineCore import QWebEnginePage, QWebEngineSettings
+
+from app.screens.blob_scheme import install_handler, register_scheme
+from app.utils.logger import setup_logger
+
+
+logger = setup_logger("web_view")
+
+_scheme_registered = False
+
+
+# перехват ссылок, чтобы можно было открывать ссылки в пользовательском браузере
+class ExternalBrowserPage(QWebEnginePage):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.logger = setup_logger(f"{self.__class__.__name__}")
+
+    def acceptNavigationRequest(self, url, _type, isMainFrame):
+        try:
+            if _type == QWebEnginePage.NavigationType.NavigationTypeLinkClicked:
+                url_str = url.toString()
+                # открываем ссылку в системном браузере
+                webbrowser.open(url_str)
+                return False
+        except Exception as e:
+            self.logger.error(f"Ошибка при обработке внешней ссылки: {str(e)}", exc_info=True)
+
+        return True
+
+    def createWindow(self, _type):
+        # для ссылок, открывающихся в новом окне
+        dummy_page = ExternalBrowserPage(self)
+        dummy_page.urlChanged.connect(lambda url: webbrowser.open(url.toString()))
+        return dummy_page
+
+
+def create_web_view(parent=None):
+    # модуль импортируется только при первом показе письма:
+    global _scheme_registered
+
+    # схема встроенных картинок регистрируется здесь, а не в main: иначе
+    # QtWebEngineCore загружался бы при каждом запуске, даже без html-писем
+    if not _scheme_registered:
+        register_scheme()
+        _scheme_registered = True
+
+    # QtWebEngine запускает процессы Chromium уже при создании view
+    view = QWebEngineView(parent)
+    view.setMinimumHeight(300)
+
+    # перехват ссылок
+    try:
+        custom_page = ExternalBrowserPage(view)
+        view.setPage(custom_page)
+    except Exception as e:
+        logger.error(f"Ошибка при установке обработчика ссылок: {str(e)}", exc_info=True)
+
+    # встроенные картинки (cid:) из хранилища вложений
+    try:
+        install_handler(view.page().profile())
+    except Exception as e:
+        logger.error(f"Ошибка при установке обработчика вложений: {str(e)}", exc_info=True)
+
+    # безопасный рендеринг html и css
+    try:
+        settings = view.settings()
+        settings.setAttribute(QWebEngineSettings.AutoLoadImages, True)
+        settings.setAttribute(QWebEngineSettings.JavascriptEnabled, False)
+        settings.setAttribute(QWebEngineSettings.LocalContentCanAccessFileUrls, False)
+        settings.setAttribute(QWebEngineSettings.PluginsEnabled, False)
+        logger.debug("Настроены параметры безопасности WebEngine")
+    except Exception as e:
+        logger.error(f"Ошибка при настройке параметров WebEngine: {str(e)}", exc_info=True)
+
+    # темный фон
+    view.setStyleSheet("background-color: #1e1e1e;")
+
+    return view
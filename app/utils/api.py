@@ -1,22 +1,191 @@
 import requests
+import json
 import webbrowser
-from app.config.constants import BASE_URL, BASE_DOMAIN
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.config.constants import (BASE_URL, BASE_DOMAIN, API_TIMEOUTS, API_RETRIES,
+                                  API_RETRY_BACKOFF, USER_AGENT, CT_CACHE_TTL,
+                                  CT_CHECK_TIMEOUT)
+from app.utils.metrics import metrics
 import os
 import sys
 
 
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    # общая сессия: keep-alive и пул соединений для всех запросов к API
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            # повторяем только идемпотентные запросы
+            retry = Retry(
+                total=API_RETRIES,
+                backoff_factor=API_RETRY_BACKOFF,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset(["GET", "HEAD"]),
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+
+            session = requests.Session()
+            session.headers["User-Agent"] = USER_AGENT
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+
+        return _session
+
+
+_ct_session = None
+
+
+def get_ct_session():
+    # отдельная сессия для crt.sh без повторов: у проверки общий лимит
+    # времени, и повторы с таймаутом чтения его бы превысили
+    global _ct_session
+
+    with _session_lock:
+        if _ct_session is None:
+            session = requests.Session()
+            session.headers["User-Agent"] = USER_AGENT
+            session.mount("https://", HTTPAdapter(max_retries=0))
+            _ct_session = session
+
+        return _ct_session
+
+
+def api_request(method, url, endpoint, session=None, **kwargs):
+    # запрос через общую сессию с таймаутом эндпоинта и замером задержки
+    kwargs.setdefault("timeout", API_TIMEOUTS.get(endpoint, API_TIMEOUTS["default"]))
+
+    start = time.monotonic()
+    try:
+        response = (session or get_session()).request(method, url, **kwargs)
+    except requests.RequestException:
+        metrics.increment(f"api.{endpoint}.errors")
+        raise
+    finally:
+        metrics.observe(f"api.{endpoint}.latency", time.monotonic() - start)
+
+    metrics.increment(f"api.{endpoint}.status.{response.status_code}")
+    return response
+
+
 def yandex_login(token):
     url = f"{BASE_URL}/auth/yandex/login?token={token}"
     webbrowser.open(url)
 
 def get_ttl(tunnel_id):
-    req = requests.get(f"{BASE_URL}/tunnel_status", params={"tunnel_id": tunnel_id}).json()
+    req = api_request("GET", f"{BASE_URL}/tunnel_status", "tunnel_status",
+                      params={"tunnel_id": tunnel_id}).json()
     return req["ttl"]
 
+CT_URL = "https://crt.sh/"
+
+_ct_cache = {}
+_ct_cache_lock = threading.Lock()
+
+# поля crt.sh, которые нужны для проверки; остальное не держим в памяти
+CT_FIELDS = ("id", "issuer_name", "name_value", "serial_number", "not_before", "not_after")
+
+
+def _iter_json_array(response, deadline, chunk_size=64 * 1024):
+    # разбирает JSON-массив по мере получения, не дожидаясь всего ответа
+    decoder = json.JSONDecoder()
+    response.encoding = response.encoding or "utf-8"
+    buffer = ""
+    started = finished = False
+
+    for chunk in response.iter_content(chunk_size=chunk_size, decode_unicode=True):
+        if time.monotonic() > deadline:
+            raise TimeoutError("crt.sh не ответил вовремя")
+
+        buffer += chunk
+        pos = 0
+
+        while not finished:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+
+            if pos >= len(buffer):
+                break
+
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("crt.sh вернул не JSON-массив")
+                started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == "]":
+                finished = True
+                pos += 1
+                break
+
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # объект пришел не целиком - ждем следующий кусок
+                break
+
+            yield item
+
+        buffer = buffer[pos:]
+
+    if time.monotonic() > deadline:
+        raise TimeoutError("crt.sh не ответил вовремя")
+
+    # оборванный ответ иначе выглядел бы как короткий, но полный список
+    if not finished:
+        raise ValueError("Ответ crt.sh оборвался до конца списка")
+    if buffer.strip():
+        raise ValueError("Лишние данные в ответе crt.sh")
+
+
 def check_security(subdomain):
-    req = requests.get(f"https://crt.sh/?q={subdomain}&output=json").json()
+    with _ct_cache_lock:
+        cached = _ct_cache.get(subdomain)
+
+    if cached and time.monotonic() - cached[0] < CT_CACHE_TTL:
+        metrics.increment("ct.cache_hit")
+        return cached[1]
+
+    metrics.increment("ct.cache_miss")
+    deadline = time.monotonic() + CT_CHECK_TIMEOUT
+
+    connect_timeout, read_timeout = API_TIMEOUTS["crt_sh"]
+    response = api_request("GET", CT_URL, "crt_sh", session=get_ct_session(),
+                           params={"q": subdomain, "output": "json"}, stream=True,
+                           timeout=(connect_timeout, min(read_timeout, CT_CHECK_TIMEOUT)))
+    # таймер обрывает чтение, даже если сервер отдает ответ по байту
+    watchdog = threading.Timer(max(0, deadline - time.monotonic()),
+                               getattr(response.raw, "shutdown", response.close))
+    watchdog.daemon = True
+    watchdog.start()
+    try:
+        response.raise_for_status()
+        certificates = [{field: cert.get(field) for field in CT_FIELDS}
+                        for cert in _iter_json_array(response, deadline)]
+    except (requests.RequestException, ValueError):
+        if time.monotonic() > deadline:
+            raise TimeoutError("crt.sh не ответил вовремя") from None
+        raise
+    finally:
+        watchdog.cancel()
+        response.close()
+
+    # пустой ответ не кэшируем: данные могут появиться через пару минут
+    if certificates:
+        with _ct_cache_lock:
+            _ct_cache[subdomain] = (time.monotonic(), certificates)
 
-    return req
+    return certificates
 
 def resource_path(relative_path):
     if getattr(sys, "frozen", False):
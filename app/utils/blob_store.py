@@ -0,0 +1,114 @@
+import ctypes
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import time
+
+from app.config.constants import BLOB_GC_GRACE
+from app.utils.api import script_path
+from app.utils.logger import setup_logger
+
+logger = setup_logger("blob_store")
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobStore:
+    """
+    Хранилище вложений на диске с адресацией по SHA-256.
+
+    Содержимое пишется блоками во временный файл и переименовывается
+    по хэшу, поэтому в памяти не держится целиком, а одинаковые
+    картинки из разных писем лежат на диске в одном экземпляре.
+    """
+    def __init__(self, root=None):
+        self.root = root or script_path(".blobs")
+
+    def _ensure_root(self):
+        if os.path.isdir(self.root):
+            return
+
+        os.makedirs(self.root, exist_ok=True)
+
+        if sys.platform == "win32":
+            # making the folder hidden in windows
+            ctypes.windll.kernel32.SetFileAttributesW(self.root, 0x02)
+
+    def path(self, digest):
+        if not DIGEST_PATTERN.match(digest or ""):
+            raise ValueError(f"Некорректный ключ вложения: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest):
+        try:
+            return os.path.exists(self.path(digest))
+        except ValueError:
+            return False
+
+    def put(self, chunks):
+        # chunks - итератор блоков байтов; возвращает (sha256, размер)
+        self._ensure_root()
+        sha256 = hashlib.sha256()
+        size = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                for chunk in chunks:
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    tmp.write(chunk)
+
+            digest = sha256.hexdigest()
+            path = self.path(digest)
+
+            if os.path.exists(path):
+                # такой файл уже есть - отмечаем, что он снова нужен
+                os.remove(tmp_path)
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return digest, size
+
+    def collect(self, referenced, grace=BLOB_GC_GRACE):
+        # удаляет файлы, на которые не ссылается ни одно письмо
+        if not os.path.isdir(self.root):
+            return 0
+
+        threshold = time.time() - grace
+        removed = 0
+
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    if name in referenced or os.path.getmtime(path) > threshold:
+                        continue
+                    os.remove(path)
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"Не удалось удалить вложение {name}: {str(e)}")
+
+        if removed:
+            logger.debug(f"Удалено неиспользуемых вложений: {removed}")
+        return removed
+
+
+_blob_store = None
+
+def get_blob_store():
+    # общий экземпляр; в процессе разбора писем создается свой
+    global _blob_store
+
+    if _blob_store is None:
+        _blob_store = BlobStore()
+
+    return _blob_store
@@ -1,9 +1,16 @@
 from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import ctypes
+import json
+import os
+import sys
+import time
 import traceback
 
+from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
 import josepy as jose
 import OpenSSL
 
@@ -16,22 +23,95 @@ from acme import standalone
 import socket
 
 import requests
-from app.config.constants import BASE_URL, DIRECTORY_URL_ZEROSSL, ZEROSSL_EAB_URL, DIRECTORY_URL_LE
+from app.config.constants import (BASE_URL, DIRECTORY_URL_ZEROSSL, ZEROSSL_EAB_URL, DIRECTORY_URL_LE,
+                                  USER_AGENT, CERT_RENEW_BEFORE_DAYS, ACC_KEY_TYPE, CERT_KEY_TYPE)
+from app.utils.api import api_request, script_path
+from app.utils.key_pool import key_pool, EC_CURVES
+from app.utils.tracing import tracer
 from app.utils.logger import setup_logger
 
 logger = setup_logger("cert_manager")
 
-USER_AGENT = 'mailtunnel'
-ACC_KEY_BITS = 2048
-CERT_PKEY_BITS = 2048
+
+def key_type_of(privkey):
+    if isinstance(privkey, rsa.RSAPrivateKey):
+        return "rsa"
+    elif isinstance(privkey, ec.EllipticCurvePrivateKey):
+        for key_type, curve in EC_CURVES.items():
+            if isinstance(privkey.curve, curve):
+                return key_type
+
+    return None
+
+
+def account_jwk(privkey):
+    # JWK и алгоритм подписи JWS для ключа ACME аккаунта
+    key_type = key_type_of(privkey)
+
+    if key_type == "rsa":
+        return jose.JWKRSA(key=privkey), jose.RS256
+    elif key_type == "ec-p256":
+        return jose.JWKEC(key=privkey), jose.ES256
+    elif key_type == "ec-p384":
+        return jose.JWKEC(key=privkey), jose.ES384
+
+    raise ValueError("Ключ аккаунта должен быть RSA или ECDSA P-256/P-384")
+
+
+def load_cached_certificate(domain):
+    # ранее выпущенный сертификат из .certs/<domain>, если он еще пригоден
+    path = os.path.join(script_path(".certs"), domain)
+    fc_path = os.path.join(path, "fullchain.pem")
+    pk_path = os.path.join(path, "privkey.pem")
+
+    if not (os.path.exists(fc_path) and os.path.exists(pk_path)):
+        return None
+
+    try:
+        with open(fc_path, "rb") as f:
+            fullchain_pem = f.read()
+        with open(pk_path, "rb") as f:
+            pkey_pem = f.read()
+
+        # первый сертификат в цепочке - сертификат домена
+        cert = x509.load_pem_x509_certificate(fullchain_pem)
+        pkey = serialization.load_pem_private_key(pkey_pem, password=None)
+
+        now = datetime.now(timezone.utc)
+        not_before = cert.not_valid_before_utc
+        not_after = cert.not_valid_after_utc
+
+        if not_before > now or not_after - now < timedelta(days=CERT_RENEW_BEFORE_DAYS):
+            logger.debug(f"Сохраненный сертификат для {domain} истекает {not_after}, нужен новый")
+            return None
+
+        san = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName)
+        if domain not in san.value.get_values_for_type(x509.DNSName):
+            logger.debug(f"Сохраненный сертификат не выписан на {domain}")
+            return None
+
+        spki = (serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+        if cert.public_key().public_bytes(*spki) != pkey.public_key().public_bytes(*spki):
+            logger.warning(f"Ключ в {pk_path} не соответствует сертификату")
+            return None
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать сохраненный сертификат для {domain}: {str(e)}")
+        return None
+
+    logger.info(f"Найден действующий сертификат для {domain} (до {not_after})")
+    return fullchain_pem.decode("utf-8"), pkey_pem.decode("utf-8")
+
 
 def new_csr_comp(domain_name, pkey_pem=None):
+    # возвращает (ключ, CSR, сэкономленное пулом ключей время)
+    saved = 0.0
+
     try:
         logger.debug(f"Создание CSR для домена {domain_name}")
         
         if pkey_pem is None:
-            logger.debug("Генерация нового приватного ключа")
-            pkey = rsa.generate_private_key(public_exponent=65537, key_size=CERT_PKEY_BITS)
+            logger.debug("Получение приватного ключа для сертификата")
+            pkey, saved = key_pool.get(CERT_KEY_TYPE)
             pkey_pem = pkey.private_bytes(encoding=serialization.Encoding.PEM,
                                          format=serialization.PrivateFormat.PKCS8,
                                          encryption_algorithm=serialization.NoEncryption())
@@ -39,7 +119,7 @@ def new_csr_comp(domain_name, pkey_pem=None):
         csr_pem = crypto_util.make_csr(pkey_pem, [domain_name])
         logger.debug("CSR успешно создан")
         
-        return pkey_pem, csr_pem
+        return pkey_pem, csr_pem, saved
     except Exception as e:
         logger.error(f"Ошибка при создании CSR: {str(e)}", exc_info=True)
         raise RuntimeError(f"Не удалось создать CSR для домена {domain_name}: {str(e)}")
@@ -70,14 +150,15 @@ def select_http01_chall(orderr):
 def send_verification_data(token, url_token, validation_token):
     try:
         logger.info("Отправка данных верификации на сервер")
-        response = requests.post(
-            f"{BASE_URL}/verify_subdomain", 
+        response = api_request(
+            "POST",
+            f"{BASE_URL}/verify_subdomain",
+            "verify_subdomain",
             json={
                 "token": token,
                 "url_token": url_token,
                 "validation_token": validation_token
-            },
-            timeout=30
+            }
         )
         
         if response.status_code != 200:
@@ -91,137 +172,298 @@ def send_verification_data(token, url_token, validation_token):
         raise RuntimeError(f"Не удалось отправить данные верификации: {str(e)}")
 
 
-def get_certificate(token, domain, developer_token=None, ca="le"):
-    logger.debug(f"Запуск процесса получения сертификата для домена {domain}")
+@contextmanager
+def timed(stage, timings):
+    # спан этапа выпуска сертификата; длительность попадает и в сводку
+    with tracer.span(f"acme.{stage}") as span:
+        try:
+            yield span
+        finally:
+            timings[stage] = time.monotonic() - span.start
+            logger.debug(f"Этап {stage}: {timings[stage]:.3f} с")
+
+
+def _account_path(ca):
+    accounts_path = script_path(".acme")
+
+    if not os.path.exists(accounts_path):
+        os.mkdir(accounts_path)
+
+        if sys.platform == "win32":
+            # making the folder hidden in windows
+            ctypes.windll.kernel32.SetFileAttributesW(accounts_path, 0x02)
+
+    return os.path.join(accounts_path, f"{ca}.json")
+
+
+def load_account(ca, directory_url):
+    # сохраненный ключ и URI ACME аккаунта для данного CA
+    path = _account_path(ca)
+
+    if not os.path.exists(path):
+        return None, None
 
-    if not ca in ["le", "zerossl"]:
-        raise ValueError("ca should be either le (Let's Encrypt) or zerossl")
-    
     try:
-        privkey = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=ACC_KEY_BITS,
-            backend=default_backend()
-        )
-        acc_key = jose.JWKRSA(key=privkey)
+        with open(path, "r") as f:
+            account = json.load(f)
 
-        try:
-            net = client.ClientNetwork(acc_key, user_agent=USER_AGENT)
+        if account.get("directory") != directory_url:
+            logger.debug(f"Сохраненный аккаунт {ca} относится к другому ACME серверу")
+            return None, None
 
-            if ca == "le":
-                directory = client.ClientV2.get_directory(DIRECTORY_URL_LE, net)
-            elif ca == "zerossl":
-                directory = client.ClientV2.get_directory(DIRECTORY_URL_ZEROSSL, net)
+        privkey = serialization.load_pem_private_key(account["key"].encode("utf-8"), password=None)
 
-            client_acme = client.ClientV2(directory, net=net)
-        except Exception as e:
-            logger.error(f"Ошибка при инициализации ACME клиента: {str(e)}", exc_info=True)
+        if key_type_of(privkey) != ACC_KEY_TYPE:
+            logger.debug(f"Тип ключа аккаунта {ca} изменился, нужен новый аккаунт")
+            return None, None
 
-            raise RuntimeError(f"Не удалось инициализировать ACME клиент: {str(e)}")
+        return privkey, account.get("uri")
+    except Exception as e:
+        logger.warning(f"Не удалось загрузить сохраненный ACME аккаунт {ca}: {str(e)}")
+        return None, None
 
-        if ca == "zerossl":
-            # получение eab от zerossl
-            logger.debug("Запрос EAB credentials от ZeroSSL")
-
-            try:
-                eab_response = requests.post(
-                    ZEROSSL_EAB_URL,
-                    params={"access_key": developer_token},
-                    timeout=30  # добавляем таймаут
-                )
+
+def save_account(ca, directory_url, privkey, uri):
+    key_pem = privkey.private_bytes(encoding=serialization.Encoding.PEM,
+                                    format=serialization.PrivateFormat.PKCS8,
+                                    encryption_algorithm=serialization.NoEncryption())
+
+    path = _account_path(ca)
+    # в файле приватный ключ аккаунта: читать его может только владелец
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    if sys.platform != "win32":
+        # файл мог остаться от прежних версий с правами по умолчанию
+        os.fchmod(fd, 0o600)
+
+    with os.fdopen(fd, "w") as f:
+        json.dump({"directory": directory_url, "uri": uri, "key": key_pem.decode("utf-8")}, f)
+
+
+def delete_account(ca):
+    path = _account_path(ca)
+
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def register_account(client_acme, acc_key, directory, ca, developer_token=None):
+    if ca == "zerossl":
+        # получение eab от zerossl
+        logger.debug("Запрос EAB credentials от ZeroSSL")
+
+        try:
+            eab_response = api_request(
+                "POST",
+                ZEROSSL_EAB_URL,
+                "zerossl_eab",
+                params={"access_key": developer_token}
+            )
+            
+            if eab_response.status_code != 200:
+                logger.error(f"ZeroSSL API вернул код {eab_response.status_code}: {eab_response.text}")
+                eab_response.raise_for_status()
                 
-                if eab_response.status_code != 200:
-                    logger.error(f"ZeroSSL API вернул код {eab_response.status_code}: {eab_response.text}")
-                    eab_response.raise_for_status()
-                    
-                eab_json = eab_response.json()
+            eab_json = eab_response.json()
+            
+            if "error" in eab_json:
+                error_msg = eab_json.get("error", {}).get("message", "Unknown error")
+                logger.error(f"ZeroSSL API вернул ошибку: {error_msg}")
+                raise RuntimeError(f"Ошибка ZeroSSL API: {error_msg}")
                 
-                if "error" in eab_json:
-                    error_msg = eab_json.get("error", {}).get("message", "Unknown error")
-                    logger.error(f"ZeroSSL API вернул ошибку: {error_msg}")
-                    raise RuntimeError(f"Ошибка ZeroSSL API: {error_msg}")
-                    
-            except requests.RequestException as e:
-                logger.error(f"Ошибка при запросе EAB: {str(e)}", exc_info=True)
-                raise RuntimeError(f"Не удалось получить EAB креденшалы от ZeroSSL: {str(e)}")
-
-            # Создание eab
-            try:
-                eab = messages.ExternalAccountBinding.from_data(
-                    acc_key,
-                    eab_json["eab_kid"],
-                    eab_json["eab_hmac_key"],
-                    directory
-                )
-            except (KeyError, ValueError) as e:
-                logger.error(f"Ошибка при создании EAB объекта: {str(e)}", exc_info=True)
-                raise RuntimeError(f"Неверный формат EAB данных от ZeroSSL: {str(e)}")
+        except requests.RequestException as e:
+            logger.error(f"Ошибка при запросе EAB: {str(e)}", exc_info=True)
+            raise RuntimeError(f"Не удалось получить EAB креденшалы от ZeroSSL: {str(e)}")
 
+        # Создание eab
+        try:
+            eab = messages.ExternalAccountBinding.from_data(
+                acc_key,
+                eab_json["eab_kid"],
+                eab_json["eab_hmac_key"],
+                directory
+            )
+        except (KeyError, ValueError) as e:
+            logger.error(f"Ошибка при создании EAB объекта: {str(e)}", exc_info=True)
+            raise RuntimeError(f"Неверный формат EAB данных от ZeroSSL: {str(e)}")
 
-        logger.debug("Регистрация нового ACME аккаунта")
 
-        try:
-            if ca == "zerossl":
-                regr = client_acme.new_account(
-                    messages.NewRegistration.from_data(
-                        external_account_binding=eab,
-                        terms_of_service_agreed=True
-                    )
+    logger.debug("Регистрация нового ACME аккаунта")
+
+    try:
+        if ca == "zerossl":
+            regr = client_acme.new_account(
+                messages.NewRegistration.from_data(
+                    external_account_binding=eab,
+                    terms_of_service_agreed=True
                 )
-            elif ca == "le":
-                regr = client_acme.new_account(
-                    messages.NewRegistration.from_data(
-                        terms_of_service_agreed=True
-                    )
+            )
+        elif ca == "le":
+            regr = client_acme.new_account(
+                messages.NewRegistration.from_data(
+                    terms_of_service_agreed=True
                 )
+            )
+
+        logger.debug(f"Аккаунт ACME зарегистрирован: {regr.uri}")
+        return regr
+    except errors.Error as e:
+        logger.error(f"Ошибка при регистрации ACME аккаунта: {str(e)}", exc_info=True)
+        raise RuntimeError(f"Не удалось зарегистрировать ACME аккаунт: {str(e)}")
+
 
-            logger.debug(f"Аккаунт ACME зарегистрирован: {regr.uri}")
-        except errors.Error as e:
-            logger.error(f"Ошибка при регистрации ACME аккаунта: {str(e)}", exc_info=True)
-            raise RuntimeError(f"Не удалось зарегистрировать ACME аккаунт: {str(e)}")
+class StaleAccountError(Exception):
+    # CA не принял сохраненный аккаунт
+    pass
 
 
-        pkey_pem, csr_pem = new_csr_comp(domain)
+# ошибки ACME (RFC 8555), после которых сохраненный аккаунт регистрируется заново;
+# остальные (rateLimited, serverInternal, ...) к аккаунту не относятся
+STALE_ACCOUNT_ERRORS = (
+    "urn:ietf:params:acme:error:accountDoesNotExist",
+    "urn:ietf:params:acme:error:unauthorized",
+)
 
-        logger.debug("Создание нового запроса сертификата")
+
+def is_stale_account_error(error):
+    return isinstance(error, messages.Error) and error.typ in STALE_ACCOUNT_ERRORS
+
+
+class AcmeSession:
+    # подготовленный ACME клиент: каталог получен, аккаунт зарегистрирован
+    def __init__(self, ca, client_acme, account_reused, timings, keygen_saved):
+        self.ca = ca
+        self.client = client_acme
+        self.account_reused = account_reused
+        self.timings = timings
+        self.keygen_saved = keygen_saved
+
+
+def prepare_acme_client(ca="le", developer_token=None):
+    # не зависит от поддомена, поэтому может выполняться параллельно с созданием туннеля
+    if not ca in ["le", "zerossl"]:
+        raise ValueError("ca should be either le (Let's Encrypt) or zerossl")
+
+    directory_url = DIRECTORY_URL_LE if ca == "le" else DIRECTORY_URL_ZEROSSL
+    timings = {}
+    keygen_saved = 0.0
+    
+    try:
+        # ключ аккаунта и регистрация переиспользуются между выпусками
+        with timed("account_key", timings):
+            privkey, account_uri = load_account(ca, directory_url)
+
+            if privkey is None:
+                logger.debug(f"Новый ключ ACME аккаунта ({ACC_KEY_TYPE})")
+                privkey, saved = key_pool.get(ACC_KEY_TYPE)
+                keygen_saved += saved
+                account_uri = None
+
+        acc_key, jws_alg = account_jwk(privkey)
+        regr = None
+        if account_uri:
+            logger.debug(f"Используется сохраненный ACME аккаунт: {account_uri}")
+            regr = messages.RegistrationResource(uri=account_uri, body=messages.Registration())
 
         try:
+            with timed("directory", timings):
+                net = client.ClientNetwork(acc_key, account=regr, alg=jws_alg, user_agent=USER_AGENT)
+                directory = client.ClientV2.get_directory(directory_url, net)
+
+                client_acme = client.ClientV2(directory, net=net)
+        except Exception as e:
+            logger.error(f"Ошибка при инициализации ACME клиента: {str(e)}", exc_info=True)
+
+            raise RuntimeError(f"Не удалось инициализировать ACME клиент: {str(e)}")
+
+        if regr is None:
+            with timed("registration", timings):
+                regr = register_account(client_acme, acc_key, directory, ca, developer_token)
+                save_account(ca, directory_url, privkey, regr.uri)
+
+        return AcmeSession(ca, client_acme, bool(account_uri), timings, keygen_saved)
+    except Exception as e:
+        logger.critical(f"Критическая ошибка при подготовке ACME клиента {ca}: {str(e)}", exc_info=True)
+        raise RuntimeError(f"Не удалось подготовить ACME клиент: {str(e)}")
+
+
+def issue_certificate(acme, token, domain):
+    client_acme = acme.client
+    timings = dict(acme.timings)
+    keygen_saved = acme.keygen_saved
+
+    with timed("cert_key", timings):
+        pkey_pem, csr_pem, saved = new_csr_comp(domain)
+        keygen_saved += saved
+
+    logger.debug("Создание нового запроса сертификата")
+
+    try:
+        with timed("order", timings):
             orderr = client_acme.new_order(csr_pem)
 
-            logger.debug(f"Заказ сертификата создан: {orderr.uri}")
-        except errors.Error as e:
-            logger.error(f"Ошибка при создании заказа сертификата: {str(e)}", exc_info=True)
-            raise RuntimeError(f"Не удалось создать заказ сертификата: {str(e)}")
+        logger.debug(f"Заказ сертификата создан: {orderr.uri}")
+    except errors.Error as e:
+        if acme.account_reused and is_stale_account_error(e):
+            # аккаунт удален или деактивирован на стороне CA
+            raise StaleAccountError(str(e))
 
-        # http-01 challenge
-        logger.debug("Выбор HTTP-01 challenge")
-        challb = select_http01_chall(orderr)
+        logger.error(f"Ошибка при создании заказа сертификата: {str(e)}", exc_info=True)
+        raise RuntimeError(f"Не удалось создать заказ сертификата: {str(e)}")
 
-        url_token = challb.chall.encode("token")
+    # http-01 challenge
+    logger.debug("Выбор HTTP-01 challenge")
+    challb = select_http01_chall(orderr)
 
-        response, validation_token = challb.response_and_validation(client_acme.net.key)
+    url_token = challb.chall.encode("token")
 
-        logger.debug("Отправка данных верификации")
+    response, validation_token = challb.response_and_validation(client_acme.net.key)
+
+    logger.debug("Отправка данных верификации")
+    with timed("verification", timings):
         send_verification_data(token, url_token, validation_token)
-    
-        try:
+
+    try:
+        with timed("challenge", timings):
             client_acme.answer_challenge(challb, response)
-        except errors.Error as e:
-            logger.error(f"Ошибка при ответе на answer_challenge: {str(e)}", exc_info=True)
-            raise RuntimeError(f"Не удалось ответить на challenge: {str(e)}")
+    except errors.Error as e:
+        logger.error(f"Ошибка при ответе на answer_challenge: {str(e)}", exc_info=True)
+        raise RuntimeError(f"Не удалось ответить на challenge: {str(e)}")
 
-        logger.debug("Ожидание finalized_orderr сертификата")
+    logger.debug("Ожидание finalized_orderr сертификата")
 
-        try:
+    try:
+        with timed("finalize", timings):
             finalized_orderr = client_acme.poll_and_finalize(orderr)
-            logger.debug("Сертификат успешно получен")
-        except errors.Error as e:
-            logger.error(f"Ошибка при финализации заказа сертификата: {str(e)}", exc_info=True)
-            raise RuntimeError(f"Не удалось финализировать заказ сертификата: {str(e)}")
+        logger.debug("Сертификат успешно получен")
+    except errors.Error as e:
+        logger.error(f"Ошибка при финализации заказа сертификата: {str(e)}", exc_info=True)
+        raise RuntimeError(f"Не удалось финализировать заказ сертификата: {str(e)}")
 
-        fullchain_pem = finalized_orderr.fullchain_pem
-        
-        return fullchain_pem, pkey_pem.decode("utf-8")
+    fullchain_pem = finalized_orderr.fullchain_pem
+
+    summary = ", ".join(f"{stage}={duration:.2f}с" for stage, duration in timings.items())
+    logger.info(f"Сертификат для {domain} выпущен за {sum(timings.values()):.2f}с ({summary}), "
+                f"пул ключей сэкономил ~{keygen_saved:.2f}с")
+    
+    return fullchain_pem, pkey_pem.decode("utf-8")
+
+
+def get_certificate(token, domain, developer_token=None, ca="le", acme=None):
+    # acme - заранее подготовленный prepare_acme_client клиент
+    logger.debug(f"Запуск процесса получения сертификата для домена {domain}")
+
+    try:
+        if acme is None:
+            acme = prepare_acme_client(ca, developer_token)
+
+        try:
+            return issue_certificate(acme, token, domain)
+        except StaleAccountError as e:
+            logger.warning(f"CA отклонил сохраненный аккаунт ({str(e)}), регистрируем новый")
+            delete_account(acme.ca)
+
+            acme = prepare_acme_client(acme.ca, developer_token)
+            return issue_certificate(acme, token, domain)
     except Exception as e:
         logger.critical(f"Критическая ошибка при получении сертификата для {domain}: {str(e)}", exc_info=True)
         raise RuntimeError(f"Не удалось получить сертификат для {domain}: {str(e)}")
@@ -0,0 +1,263 @@
+import html
+import re
+from html.parser import HTMLParser
+from urllib.parse import quote, unquote
+
+# уровни отображения: text/simple идут в QTextBrowser, complex - в QWebEngineView
+TIER_TEXT = "text"
+TIER_SIMPLE = "simple"
+TIER_COMPLEX = "complex"
+
+ALLOWED_TAGS = {
+    "a", "b", "i", "u", "s", "strong", "em", "small", "big", "sub", "sup", "font",
+    "p", "br", "hr", "div", "span", "center", "blockquote", "pre", "code",
+    "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "dl", "dt", "dd",
+    "table", "thead", "tbody", "tfoot", "tr", "td", "th", "caption", "img",
+}
+VOID_TAGS = {"br", "hr", "img"}
+# содержимое этих тегов не показывается вовсе
+DROP_CONTENT_TAGS = {"script", "style", "head", "title", "noscript", "template", "xml"}
+
+ALLOWED_ATTRS = {
+    "a": {"href", "title"},
+    "img": {"alt", "width", "height"},
+    "font": {"color", "size", "face"},
+    "td": {"colspan", "rowspan", "align", "valign", "width", "bgcolor"},
+    "th": {"colspan", "rowspan", "align", "valign", "width", "bgcolor"},
+    "table": {"width", "cellpadding", "cellspacing", "border", "align", "bgcolor"},
+    "tr": {"align", "valign", "bgcolor"},
+    "p": {"align"},
+    "div": {"align"},
+}
+ALLOWED_STYLES = {
+    "color", "background-color", "font-weight", "font-style", "font-size",
+    "text-decoration", "text-align", "vertical-align", "white-space",
+}
+SAFE_URL = re.compile(r"^(https?:|mailto:)", re.IGNORECASE)
+
+# встроенные картинки (cid:) отдаются из хранилища вложений по этой схеме
+BLOB_SCHEME = "tunnel-blob"
+BLOB_URL = re.compile(rf"^{BLOB_SCHEME}:[0-9a-f]{{64}}(\?[\w.+/=%-]*)?$")
+CID_REFERENCE = re.compile(r"cid:([^\s\"'<>)]+)", re.IGNORECASE)
+
+# признаки верстки, с которой QTextBrowser не справится
+COMPLEX_TAGS = {"svg", "iframe", "canvas", "video", "audio", "form", "object", "embed", "picture"}
+COMPLEX_CSS = re.compile(r"@media|@font-face|position\s*:|display\s*:\s*(flex|grid)|float\s*:|"
+                         r"background(-image)?\s*:[^;\"']*url\(", re.IGNORECASE)
+MAX_SIMPLE_IMAGES = 2
+MAX_SIMPLE_TABLE_DEPTH = 3
+MAX_SIMPLE_STYLE = 2000
+
+
+class _Inspector(HTMLParser):
+    # собирает признаки сложности без построения дерева
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.complex = False
+        self.images = 0
+        self.table_depth = 0
+        self.max_table_depth = 0
+        self.style_size = 0
+        self._in_style = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in COMPLEX_TAGS:
+            self.complex = True
+        elif tag == "img":
+            self.images += 1
+        elif tag == "table":
+            self.table_depth += 1
+            self.max_table_depth = max(self.max_table_depth, self.table_depth)
+        elif tag == "style":
+            self._in_style = True
+
+        for name, value in attrs:
+            if name == "style" and value and COMPLEX_CSS.search(value):
+                self.complex = True
+
+    def handle_endtag(self, tag):
+        if tag == "table":
+            self.table_depth = max(0, self.table_depth - 1)
+        elif tag == "style":
+            self._in_style = False
+
+    def handle_data(self, data):
+        if self._in_style:
+            self.style_size += len(data)
+            if COMPLEX_CSS.search(data):
+                self.complex = True
+
+
+def classify(html_content):
+    if not html_content:
+        return TIER_TEXT
+
+    inspector = _Inspector()
+    try:
+        inspector.feed(html_content)
+        inspector.close()
+    except Exception:
+        return TIER_COMPLEX
+
+    if (inspector.complex or inspector.images > MAX_SIMPLE_IMAGES
+            or inspector.max_table_depth > MAX_SIMPLE_TABLE_DEPTH
+            or inspector.style_size > MAX_SIMPLE_STYLE):
+        return TIER_COMPLEX
+
+    return TIER_SIMPLE
+
+
+class _Sanitizer(HTMLParser):
+    # оставляет только разрешенные теги и атрибуты, остальное - как текст
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._drop_depth = 0
+
+    def _attrs(self, tag, attrs):
+        allowed = ALLOWED_ATTRS.get(tag, set())
+        result = []
+
+        for name, value in attrs:
+            if value is None:
+                continue
+            if name == "style":
+                value = sanitize_style(value)
+                if not value:
+                    continue
+            elif name not in allowed:
+                continue
+            elif name == "href" and not SAFE_URL.match(value.strip()):
+                continue
+
+            result.append(f' {name}="{html.escape(value, quote=True)}"')
+
+        return "".join(result)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self._drop_depth += 1
+            return
+        if self._drop_depth or tag not in ALLOWED_TAGS:
+            return
+
+        if tag == "img":
+            src = (dict(attrs).get("src") or "").strip()
+            if BLOB_URL.match(src):
+                # встроенная картинка с диска, сеть не нужна
+                self.parts.append(f'<img src="{html.escape(src)}"{self._attrs(tag, attrs)}>')
+                return
+
+            # удаленные картинки не загружаются; вместо них подпись
+            alt = dict(attrs).get("alt")
+            if alt:
+                self.parts.append(f"[{html.escape(alt)}]")
+            return
+
+        self.parts.append(f"<{tag}{self._attrs(tag, attrs)}>")
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self._drop_depth = max(0, self._drop_depth - 1)
+            return
+        if self._drop_depth or tag not in ALLOWED_TAGS or tag in VOID_TAGS:
+            return
+
+        self.parts.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if not self._drop_depth:
+            self.parts.append(html.escape(data, quote=False))
+
+
+def sanitize_style(style):
+    declarations = []
+
+    for declaration in style.split(";"):
+        name, _, value = declaration.partition(":")
+        name, value = name.strip().lower(), value.strip()
+
+        if name in ALLOWED_STYLES and value and "url(" not in value.lower() \
+                and "expression" not in value.lower():
+            declarations.append(f"{name}: {value}")
+
+    return "; ".join(declarations)
+
+
+def sanitize(html_content):
+    sanitizer = _Sanitizer()
+    sanitizer.feed(html_content)
+    sanitizer.close()
+    return "".join(sanitizer.parts)
+
+
+def blob_url(attachment):
+    content_type = quote(attachment.get("content_type") or "application/octet-stream", safe="/")
+    return f"{BLOB_SCHEME}:{attachment['digest']}?type={content_type}"
+
+
+def resolve_cids(html_content, attachments):
+    # cid:<Content-ID> -> адрес вложения в хранилище
+    urls = {a["content_id"].lower(): blob_url(a) for a in attachments or () if a.get("content_id")}
+    if not urls or not html_content:
+        return html_content
+
+    def replace(match):
+        return urls.get(unquote(match.group(1)).lower(), match.group(0))
+
+    return CID_REFERENCE.sub(replace, html_content)
+
+
+def text_to_html(text):
+    return html.escape(text or "").replace("\n", "<br>")
+
+
+def prepare(email, force_full=False):
+    """
+    Выбирает способ отображения письма.
+
+    Возвращает (уровень, html): для text и simple - очищенный html
+    для QTextBrowser, для complex - исходный html для QWebEngineView.
+    Ссылки cid: в обоих случаях ведут на вложения в хранилище.
+    """
+    html_content = resolve_cids(email.get("html_content"), email.get("attachments"))
+    tier = TIER_COMPLEX if force_full and html_content else classify(html_content)
+
+    if tier == TIER_TEXT:
+        return tier, text_to_html(email.get("body") or email.get("plain_content"))
+    if tier == TIER_SIMPLE:
+        return tier, sanitize(html_content)
+    return tier, html_content
+
+
+def build_document(tier, body):
+    # итоговый html для view, в который попадет письмо
+    if tier != TIER_COMPLEX:
+        # QTextBrowser понимает только подмножество html; стили страницы не нужны
+        return f'<div style="font-family: Arial, sans-serif;">{body}</div>'
+
+    # упрощенный html шаблон
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <style>
+            body {{
+                background-color: #1e1e1e;
+                color: #e0e0e0;
+                font-family: Arial, sans-serif;
+            }}
+
+        </style>
+    </head>
+    <body>
+        {body}
+    </body>
+    </html>
+    """
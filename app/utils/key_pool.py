@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import deque
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+from app.config.constants import KEY_POOL_SIZE, KEY_POOL_TYPES, KEY_POOL_RETRY_DELAY, KEY_POOL_RETRY_MAX
+from app.utils.logger import setup_logger
+from app.utils.tracing import tracer
+
+logger = setup_logger("key_pool")
+
+RSA_KEY_BITS = 2048
+
+EC_CURVES = {
+    "ec-p256": ec.SECP256R1,
+    "ec-p384": ec.SECP384R1,
+}
+
+
+def generate_private_key(key_type):
+    if key_type == "rsa":
+        return rsa.generate_private_key(public_exponent=65537, key_size=RSA_KEY_BITS,
+                                        backend=default_backend())
+    elif key_type in EC_CURVES:
+        return ec.generate_private_key(EC_CURVES[key_type](), backend=default_backend())
+
+    raise ValueError(f"Неизвестный тип ключа: {key_type}")
+
+
+class KeyPool:
+    """
+    Заранее сгенерированные приватные ключи.
+
+    Ключи хранятся только в памяти, не больше size штук каждого типа,
+    и догенерируются фоновым потоком после того, как их забрали.
+    Заранее создаются только типы из pooled_types, остальные дешевле
+    сгенерировать по запросу, чем держать в памяти и в фоновом потоке.
+    """
+    def __init__(self, size=KEY_POOL_SIZE, pooled_types=KEY_POOL_TYPES):
+        self.size = size
+        self.pooled_types = pooled_types
+
+        self._lock = threading.Lock()
+        self._keys = {}
+        # среднее время генерации по типу ключа - столько экономит ключ из пула
+        self._keygen_time = {}
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self, key_types):
+        key_types = [key_type for key_type in key_types if key_type in self.pooled_types]
+        if not key_types:
+            logger.debug("Пул ключей не нужен: все ключи создаются по запросу")
+            return
+
+        with self._lock:
+            for key_type in key_types:
+                self._keys.setdefault(key_type, deque())
+
+            if self._thread is not None:
+                self._wakeup.set()
+                return
+
+            self._thread = threading.Thread(target=self._refill_loop, name="key-pool", daemon=True)
+            self._thread.start()
+
+        logger.debug(f"Пул ключей запущен: {', '.join(key_types)} по {self.size} шт.")
+
+    def get(self, key_type):
+        # возвращает (ключ, сэкономленные секунды)
+        with tracer.span("keygen", key_type=key_type) as span:
+            with self._lock:
+                keys = self._keys.get(key_type)
+                privkey = keys.popleft() if keys else None
+                saved = self._keygen_time.get(key_type, 0.0)
+
+            span.set("pooled", privkey is not None)
+
+            if privkey is not None:
+                self._wakeup.set()
+                logger.debug(f"Ключ {key_type} взят из пула")
+                return privkey, saved
+
+            return self._generate(key_type), 0.0
+
+    def _generate(self, key_type):
+        start = time.monotonic()
+        privkey = generate_private_key(key_type)
+        duration = time.monotonic() - start
+
+        with self._lock:
+            previous = self._keygen_time.get(key_type)
+            self._keygen_time[key_type] = duration if previous is None else (previous + duration) / 2
+
+        return privkey
+
+    def _missing(self):
+        with self._lock:
+            for key_type, keys in self._keys.items():
+                if len(keys) < self.size:
+                    return key_type
+        return None
+
+    def _refill_loop(self):
+        failures = 0
+
+        while True:
+            key_type = self._missing()
+
+            if key_type is None:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            try:
+                privkey = self._generate(key_type)
+            except Exception as e:
+                # поток не завершается, иначе все следующие ключи создавались бы синхронно
+                failures += 1
+                delay = min(KEY_POOL_RETRY_DELAY * 2 ** (failures - 1), KEY_POOL_RETRY_MAX)
+                logger.error(f"Ошибка при генерации ключа для пула, повтор через {delay} с: {str(e)}",
+                             exc_info=True)
+                self._wakeup.wait(delay)
+                self._wakeup.clear()
+                continue
+
+            failures = 0
+            with self._lock:
+                self._keys[key_type].append(privkey)
+
+
+key_pool = KeyPool()
@@ -1,20 +1,25 @@
 import asyncio
-import ssl
-import email
+import functools
 import threading
 import time
 import os
 from aiosmtpd.controller import Controller
 from aiosmtpd.smtp import SMTP
-from email.policy import default
-from email.utils import parseaddr
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
-from app.config.constants import SMTPD_LOGGING
+from app.config.constants import (SMTPD_LOGGING, MAIL_PARSER_EXECUTOR,
+                                  MAIL_PARSER_WORKERS, MAIL_PARSER_MAX_PENDING,
+                                  EMAIL_BATCH_INTERVAL_MS)
+from app.utils.mail_spool import get_mail_spool, parse_spooled, unparsed_email
+from app.utils.tls_manager import TLSContextManager
+from app.utils.logger import setup_logger
 
 from Qt import QtCore 
 import logging, sys
 
 
+logger = setup_logger("mail_server_tls")
+
 def configure_smtpd_logging():
     stderr_handler = logging.StreamHandler(sys.stderr)
     logger = logging.getLogger("mail.log")
@@ -30,99 +35,210 @@ if SMTPD_LOGGING:
 
 
 class EmailSignals(QtCore.QObject):
-    new_email_received = QtCore.Signal(dict)
+    """
+    Мост между потоками сервера и интерфейсом.
+
+    Письма копятся в буфере и уходят в основной поток одной пачкой
+    не чаще раза в EMAIL_BATCH_INTERVAL_MS, чтобы поток писем
+    не перестраивал список на каждое письмо.
+    """
+    new_emails_received = QtCore.Signal(list)
+    _batch_pending = QtCore.Signal()
+
+    def __init__(self, interval=EMAIL_BATCH_INTERVAL_MS):
+        super().__init__()
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._scheduled = False
+        self._flush_timer = None
+
+        # сигнал из чужого потока доставляется в поток объекта через очередь
+        self._batch_pending.connect(self._schedule_flush)
+
+    def push(self, email_data):
+        # можно вызывать из любого потока
+        with self._lock:
+            self._buffer.append(email_data)
+            if self._scheduled:
+                return
+            self._scheduled = True
+
+        self._batch_pending.emit()
+
+    def _schedule_flush(self):
+        if self._flush_timer is None:
+            self._flush_timer = QtCore.QTimer(self)
+            self._flush_timer.setSingleShot(True)
+            self._flush_timer.timeout.connect(self._flush)
+
+        if not self._flush_timer.isActive():
+            self._flush_timer.start(self.interval)
+
+    def _flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+            self._scheduled = False
+
+        if batch:
+            self.new_emails_received.emit(batch)
 
 email_signals = EmailSignals()
 
+_parser_executor = None
+
+def get_parser_executor():
+    # пул для разбора писем, общий для всех запусков сервера
+    global _parser_executor
+
+    if _parser_executor is None:
+        if MAIL_PARSER_EXECUTOR == "process":
+            _parser_executor = ProcessPoolExecutor(max_workers=MAIL_PARSER_WORKERS)
+        else:
+            _parser_executor = ThreadPoolExecutor(max_workers=MAIL_PARSER_WORKERS,
+                                                  thread_name_prefix="mail-parser")
+        logger.debug(f"Создан пул разбора писем: {MAIL_PARSER_EXECUTOR}, {MAIL_PARSER_WORKERS} воркеров")
+
+    return _parser_executor
+
+
 # обработчик писем 
 class EmailHandler:
+    def __init__(self, executor, spool=None):
+        self.executor = executor
+        self.spool = spool or get_mail_spool()
+        self.pending = 0
+        # домены открытых ящиков; пустое множество - принимаем все
+        self.domains = set()
+        self.tls = None
+
+    def route(self, rcpt_tos):
+        # ящики, которым адресовано письмо
+        domains = {rcpt.rsplit("@", 1)[-1].lower() for rcpt in rcpt_tos}
+        if not self.domains:
+            return sorted(domains)
+        return sorted(domains & self.domains)
+
     async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if self.domains and not self.route([address]):
+            return '550 5.1.1 Mailbox unavailable'
+
         envelope.rcpt_tos.append(address)
         return '250 OK'
 
+    def handle_STARTTLS(self, server, session, envelope):
+        # aiosmtpd вызывает хук синхронно сразу после рукопожатия
+        ssl_object = (session.ssl or {}).get("ssl_object")
+        if ssl_object is not None and self.tls is not None:
+            try:
+                self.tls.record_handshake(ssl_object)
+            except Exception as e:
+                logger.warning(f"Ошибка при учете TLS-рукопожатия: {str(e)}")
+
+        return True
+
     async def handle_DATA(self, server, session, envelope):
-        # содержимое письма
-        message_data = envelope.content.decode('utf-8', errors='replace')
-        
-        # парсим письмо
-        message = email.message_from_string(message_data, policy=default)
-        
-        html_body, plain_body = self._get_body(message)
-        
-        # адрес отправителя
-        from_header = message.get("From", "")
-        sender_name, sender_email = parseaddr(from_header)
-        
-        sender = sender_email if sender_email else envelope.mail_from
-        
-        email_data = {
-            "sender": sender,
-            "sender_name": sender_name,
-            "subject": message.get("Subject", "(Без темы)"),
-            "body": html_body if html_body else plain_body,  # Приоритет HTML
-            "html_content": html_body if html_body else None,
-            "plain_content": plain_body,
-            "timestamp": message.get("Date", ""),
-            "recipients": envelope.rcpt_tos
-        }
-        # сигнал в основной поток
-        email_signals.new_email_received.emit(email_data)
-        
+        if self.pending >= MAIL_PARSER_MAX_PENDING:
+            logger.warning(f"Очередь разбора писем переполнена ({self.pending}), письмо отклонено")
+            return '451 4.3.1 Too many messages in queue, try again later'
+
+        # 250 только после записи на диск: отправитель считает письмо доставленным
+        loop = asyncio.get_running_loop()
+        try:
+            spool_id = await loop.run_in_executor(None, self.spool.put, envelope.content,
+                                                  envelope.mail_from, list(envelope.rcpt_tos))
+        except OSError as e:
+            logger.error(f"Не удалось записать письмо в очередь: {str(e)}", exc_info=True)
+            return '451 4.3.0 Local error in processing, try again later'
+
+        self.submit(spool_id)
         return '250 Message accepted for delivery'
 
-    
-    def _get_body(self, message):
-        # извлекаем html и обычный текст
-        html_content = None
-        plain_content = None
-        
-        if message.is_multipart():
-            for part in message.walk():
-                content_type = part.get_content_type()
-                
-                if content_type == "text/html" and html_content is None:
-                    payload = part.get_payload(decode=True)
-                    if payload:
-                        html_content = payload.decode('utf-8', errors='replace')
-                        
-                elif content_type == "text/plain" and plain_content is None:
-                    payload = part.get_payload(decode=True)
-                    if payload:
-                        plain_content = payload.decode('utf-8', errors='replace')
-        else:
-            content_type = message.get_content_type()
-            payload = message.get_payload(decode=True)
-            
-            if payload:
-                decoded_payload = payload.decode('utf-8', errors='replace')
-                if content_type == "text/html":
-                    html_content = decoded_payload
-                elif content_type == "text/plain":
-                    plain_content = decoded_payload
-                    
-        return html_content, plain_content
+    def submit(self, spool_id):
+        # разбор в пуле, чтобы одно большое письмо не блокировало остальные сессии
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, parse_spooled, self.spool.root, spool_id)
+        self.pending += 1
+        future.add_done_callback(functools.partial(self._on_parsed, spool_id))
+
+    def recover(self):
+        # письма, принятые до падения или выхода, но не сохраненные в хранилище
+        pending = self.spool.claim_pending()
+        for spool_id in pending:
+            self.submit(spool_id)
+
+        if pending:
+            logger.info(f"Из очереди восстановлено писем: {len(pending)}")
+
+    def _on_parsed(self, spool_id, future):
+        # вызывается в потоке цикла aiosmtpd
+        self.pending -= 1
 
+        try:
+            email_data = future.result()
+        except Exception as e:
+            logger.error(f"Ошибка при разборе письма: {str(e)}", exc_info=True)
+            try:
+                # письмо уже принято - показываем его хотя бы как текст
+                email_data = unparsed_email(self.spool, spool_id)
+            except Exception as load_error:
+                logger.error(f"Письмо {spool_id} осталось в очереди: {str(load_error)}", exc_info=True)
+                return
 
+        email_data["mailboxes"] = self.route(email_data["recipients"])
 
-def start(certs_path, port=8025):
-    ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        # в основной поток письмо уйдет вместе с остальными из пачки
+        email_signals.push(email_data)
 
-    fc_path = os.path.join(certs_path, "fullchain.pem")
-    pk_path = os.path.join(certs_path, "privkey.pem")
 
-    ssl_context.load_cert_chain(fc_path, pk_path)
+
+def load_certificate(controller, certs_path, hostname=None):
+    # сертификат можно загрузить уже после запуска сервера:
+    # новые STARTTLS подхватят его сразу, а изменения файлов - через наблюдателя
+    controller.tls.add(hostname or os.path.basename(os.path.normpath(certs_path)), certs_path)
+    logger.debug(f"Сертификат загружен в почтовый сервер: {certs_path}")
+
+
+def set_domains(controller, domains):
+    # письма на другие домены отклоняются уже на RCPT
+    controller.handler.domains = {domain.lower() for domain in domains}
+
+
+class MailController(Controller):
+    def factory(self):
+        # базовый контекст пересоздается при смене ключей тикетов
+        self.SMTP_kwargs["tls_context"] = self.tls.default
+        return super().factory()
+
+    # вместе с сервером останавливается наблюдатель за сертификатами
+    def stop(self, *args, **kwargs):
+        self.tls.stop()
+        super().stop(*args, **kwargs)
+
+
+def start(certs_path=None, port=8025):
+    # сертификат выбирается по имени из SNI; один порт на все ящики
+    tls = TLSContextManager()
 
     # запуск
-    controller = Controller(
-        EmailHandler(),
+    controller = MailController(
+        EmailHandler(get_parser_executor()),
         hostname='127.0.0.1',
         port=port,
         server_kwargs={
-            'tls_context': ssl_context,
+            'tls_context': tls.default,
             'require_starttls': True,
             'timeout': 15
         }
     )
+    # не ssl_context: этот атрибут Controller включает неявный TLS на всем порту
+    controller.tls = tls
+    controller.handler.tls = tls
+    tls.start()
+
+    if certs_path:
+        load_certificate(controller, certs_path)
     
     # запуск в отдельном потоке
     server_thread = threading.Thread(target=run_server, args=(controller,), daemon=True)
@@ -132,6 +248,7 @@ def start(certs_path, port=8025):
 
 def run_server(controller):
     controller.start()
+    controller.loop.call_soon_threadsafe(controller.handler.recover)
     try:
         while True:
             time.sleep(1)
@@ -0,0 +1,145 @@
+import ctypes
+import json
+import os
+import sys
+import tempfile
+import threading
+import uuid
+
+from app.utils.api import script_path
+from app.utils.logger import setup_logger
+from app.utils.mime_parser import parse_envelope
+
+logger = setup_logger("mail_spool")
+
+
+class MailSpool:
+    """
+    Очередь принятых писем на диске.
+
+    Сервер отвечает 250 только после того, как сырое письмо записано
+    и сброшено на диск. Файл удаляется, когда письмо сохранено в
+    хранилище; то, что осталось после падения или выхода, разбирается
+    заново при следующем запуске сервера.
+    """
+    def __init__(self, root=None):
+        self.root = root or script_path(".spool")
+
+        # письма, которые уже в работе в этом процессе
+        self._claimed = set()
+        self._lock = threading.Lock()
+
+    def _ensure_root(self):
+        if os.path.isdir(self.root):
+            return
+
+        os.makedirs(self.root, exist_ok=True)
+
+        if sys.platform == "win32":
+            # making the folder hidden in windows
+            ctypes.windll.kernel32.SetFileAttributesW(self.root, 0x02)
+
+    def _path(self, spool_id):
+        return os.path.join(self.root, f"{spool_id}.eml")
+
+    def put(self, content, mail_from, rcpt_tos):
+        # первая строка - конверт в json, дальше письмо как есть
+        self._ensure_root()
+        spool_id = uuid.uuid4().hex
+        envelope = json.dumps({"mail_from": mail_from, "rcpt_tos": rcpt_tos}).encode()
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(envelope + b"\n")
+                tmp.write(content)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+
+            os.replace(tmp_path, self._path(spool_id))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._claimed.add(spool_id)
+        return spool_id
+
+    def load(self, spool_id):
+        # возвращает (письмо, mail_from, rcpt_tos)
+        with open(self._path(spool_id), "rb") as spooled:
+            envelope = json.loads(spooled.readline())
+            content = spooled.read()
+
+        return content, envelope["mail_from"], envelope["rcpt_tos"]
+
+    def claim_pending(self):
+        # письма, оставшиеся с прошлого запуска, в порядке получения
+        if not os.path.isdir(self.root):
+            return []
+
+        entries = []
+        for name in os.listdir(self.root):
+            spool_id, ext = os.path.splitext(name)
+            if ext == ".eml":
+                entries.append((os.path.getmtime(os.path.join(self.root, name)), spool_id))
+
+        with self._lock:
+            pending = [spool_id for _, spool_id in sorted(entries) if spool_id not in self._claimed]
+            self._claimed.update(pending)
+
+        return pending
+
+    def remove(self, spool_ids):
+        # письма сохранены в хранилище и больше не нужны в очереди
+        for spool_id in spool_ids:
+            try:
+                os.remove(self._path(spool_id))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Не удалось удалить письмо {spool_id} из очереди: {str(e)}")
+
+            with self._lock:
+                self._claimed.discard(spool_id)
+
+
+_mail_spool = None
+
+def get_mail_spool():
+    # общий экземпляр для сервера и интерфейса
+    global _mail_spool
+
+    if _mail_spool is None:
+        _mail_spool = MailSpool()
+
+    return _mail_spool
+
+
+def parse_spooled(root, spool_id):
+    # выполняется в пуле разбора, в том числе в отдельном процессе
+    content, mail_from, rcpt_tos = MailSpool(root).load(spool_id)
+
+    email_data = parse_envelope(content, mail_from, rcpt_tos)
+    email_data["spool_id"] = spool_id
+    return email_data
+
+
+def unparsed_email(spool, spool_id):
+    # письмо, которое не удалось разобрать, показывается как есть
+    content, mail_from, rcpt_tos = spool.load(spool_id)
+    text = content.decode("utf-8", errors="replace")
+
+    return {
+        "sender": mail_from,
+        "sender_name": None,
+        "subject": "(не удалось разобрать письмо)",
+        "body": text,
+        "html_content": None,
+        "plain_content": text,
+        "timestamp": "",
+        "attachments": [],
+        "recipients": rcpt_tos,
+        "spool_id": spool_id,
+    }
@@ -0,0 +1,355 @@
+import html
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import ctypes
+
+from app.config.constants import FTS_BACKFILL_BATCH
+from app.utils.api import script_path
+from app.utils.logger import setup_logger
+
+logger = setup_logger("mailbox")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS emails (
+    id INTEGER PRIMARY KEY,
+    mailbox TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    sender_name TEXT,
+    subject TEXT NOT NULL,
+    has_html INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS emails_by_time ON emails (mailbox, received_at);
+CREATE INDEX IF NOT EXISTS emails_by_sender ON emails (mailbox, sender);
+CREATE INDEX IF NOT EXISTS emails_by_subject ON emails (mailbox, subject);
+
+CREATE TABLE IF NOT EXISTS bodies (
+    email_id INTEGER PRIMARY KEY REFERENCES emails (id) ON DELETE CASCADE,
+    body TEXT,
+    html_content TEXT,
+    plain_content TEXT
+);
+
+CREATE TABLE IF NOT EXISTS attachments (
+    email_id INTEGER NOT NULL REFERENCES emails (id) ON DELETE CASCADE,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    filename TEXT,
+    content_type TEXT,
+    content_id TEXT,
+    inline INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS attachments_by_email ON attachments (email_id);
+"""
+
+# префиксы до 4 символов лежат в индексе готовыми: запрос из нескольких
+# слов не перебирает все термы, начинающиеся с "news" или "code"
+FTS_PREFIX = "prefix = '2 3 4'"
+
+# полнотекстовый индекс по отправителю, теме и тексту; rowid совпадает с emails.id;
+# в fts_backfill - докуда проиндексированы письма, сохраненные до индекса
+FTS_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5(
+    sender, subject, body,
+    tokenize = 'unicode61 remove_diacritics 2',
+    {FTS_PREFIX}
+);
+CREATE TRIGGER IF NOT EXISTS emails_fts_delete AFTER DELETE ON emails BEGIN
+    DELETE FROM emails_fts WHERE rowid = old.id;
+END;
+CREATE TABLE IF NOT EXISTS fts_backfill (
+    last_id INTEGER NOT NULL,
+    upto INTEGER NOT NULL
+);
+"""
+
+HTML_NOISE = re.compile(r"<(script|style)\b.*?</\1\s*>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+# однобуквенные префиксы совпадают почти со всем и не покрыты индексом prefix
+SEARCH_TERM = re.compile(r"\w{2,}")
+
+HEADER_COLUMNS = ("id", "sender", "subject", "timestamp")
+ATTACHMENT_COLUMNS = ("digest", "size", "filename", "content_type", "content_id", "inline")
+
+
+class Mailbox:
+    """
+    Хранилище писем в SQLite рядом с .secrets.json.
+
+    В памяти держатся только заголовки, которые сейчас нужны интерфейсу,
+    тела писем читаются с диска по запросу.
+    """
+    def __init__(self, path=None):
+        self.path = path or script_path(".mailbox.db")
+        make_hidden = not os.path.exists(self.path) and sys.platform == "win32"
+
+        self._lock = threading.Lock()
+        # запись идет по очереди с фоновой индексацией, у которой свое соединение
+        self._write_lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+
+        self._closed = False
+        self._backfill = None
+        # пока старые письма индексируются, поиск идет по отправителю и теме
+        self.fts_indexing = False
+        self.fts = self._init_fts()
+
+        if make_hidden:
+            # making the file hidden in windows
+            ctypes.windll.kernel32.SetFileAttributesW(self.path, 0x02)
+
+        logger.debug(f"Хранилище писем открыто: {self.path}")
+
+    def _init_fts(self):
+        row = self._conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'emails_fts'"
+        ).fetchone()
+
+        drop = ""
+        if row is not None and FTS_PREFIX not in row[0]:
+            # индекс с другими настройками строится заново
+            logger.debug("Параметры поискового индекса изменились, индекс будет перестроен")
+            drop, row = "DROP TABLE emails_fts;", None
+
+        try:
+            if row is None:
+                # таблица и отметка о непроиндексированных письмах - одной транзакцией
+                self._conn.executescript(
+                    "BEGIN;" + drop + FTS_SCHEMA +
+                    "DELETE FROM fts_backfill;"
+                    "INSERT INTO fts_backfill SELECT 0, COALESCE(MAX(id), 0) FROM emails;"
+                    "COMMIT;"
+                )
+            else:
+                self._conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            # sqlite собран без fts5 - поиск только по отправителю и теме
+            if self._conn.in_transaction:
+                self._conn.rollback()
+            logger.warning(f"Полнотекстовый поиск недоступен: {str(e)}")
+            return False
+
+        pending = self._conn.execute("SELECT last_id < upto FROM fts_backfill").fetchone()
+        if pending and pending[0]:
+            # письма, сохраненные до появления индекса, индексируются в фоне
+            # небольшими транзакциями, чтобы не задерживать запуск и интерфейс
+            self.fts_indexing = True
+            self._backfill = threading.Thread(target=self._backfill_fts, name="fts-backfill", daemon=True)
+            self._backfill.start()
+        elif pending:
+            with self._conn:
+                self._conn.execute("DELETE FROM fts_backfill")
+
+        return True
+
+    def _backfill_fts(self):
+        # у индексации свое соединение: в режиме WAL чтение из интерфейса ее не ждет,
+        # а новые письма ждут не дольше одной пачки
+        conn = sqlite3.connect(self.path, timeout=30)
+        columns = ("id", "sender", "sender_name", "subject", "html_content", "plain_content")
+        start = time.monotonic()
+        indexed = 0
+
+        try:
+            while True:
+                last_id, upto = conn.execute("SELECT last_id, upto FROM fts_backfill").fetchone()
+                rows = [dict(zip(columns, row)) for row in conn.execute(
+                    "SELECT e.id, e.sender, e.sender_name, e.subject, b.html_content, b.plain_content "
+                    "FROM emails e JOIN bodies b ON b.email_id = e.id "
+                    "WHERE e.id > ? AND e.id <= ? ORDER BY e.id LIMIT ?",
+                    (last_id, upto, FTS_BACKFILL_BATCH)
+                )]
+                fields = [(email["id"], *self._search_fields(email), email["id"], email["id"]) for email in rows]
+
+                with self._write_lock:
+                    if self._closed:
+                        return
+
+                    with conn:
+                        if not rows:
+                            conn.execute("DELETE FROM fts_backfill")
+                            self.fts_indexing = False
+                            break
+
+                        # письмо могли удалить или уже проиндексировать после чтения пачки
+                        conn.executemany(
+                            "INSERT INTO emails_fts (rowid, sender, subject, body) SELECT ?, ?, ?, ? "
+                            "WHERE EXISTS (SELECT 1 FROM emails WHERE id = ?) "
+                            "AND NOT EXISTS (SELECT 1 FROM emails_fts WHERE rowid = ?)",
+                            fields
+                        )
+                        conn.execute("UPDATE fts_backfill SET last_id = ?", (rows[-1]["id"],))
+
+                indexed += len(rows)
+        except Exception as e:
+            logger.error(f"Ошибка при построении поискового индекса: {str(e)}", exc_info=True)
+            return
+        finally:
+            conn.close()
+
+        if indexed:
+            logger.debug(f"Построен поисковый индекс для писем: {indexed} за {time.monotonic() - start:.1f}с")
+
+    def _search_fields(self, email):
+        sender = " ".join(filter(None, (email.get("sender_name"), email.get("sender"))))
+        body = email.get("plain_content")
+        if not body and email.get("html_content"):
+            body = html.unescape(HTML_NOISE.sub(" ", email["html_content"]))
+
+        return sender, email.get("subject", ""), body or ""
+
+    def add(self, mailbox, email):
+        # сохраняет письмо и возвращает его id
+        return self.add_many(mailbox, [email])[0]
+
+    def add_many(self, mailbox, emails):
+        # сохраняет пачку писем одной транзакцией и возвращает их id
+        received_at = time.time()
+        default_timestamp = time.strftime("%d.%m.%Y %H:%M", time.localtime(received_at))
+        email_ids = []
+
+        with self._write_lock, self._lock, self._conn:
+            for email in emails:
+                cursor = self._conn.execute(
+                    "INSERT INTO emails (mailbox, received_at, timestamp, sender, sender_name, subject, has_html) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (mailbox, received_at, email.get("timestamp") or default_timestamp,
+                     email.get("sender", ""), email.get("sender_name"),
+                     email.get("subject", ""), 1 if email.get("html_content") else 0)
+                )
+                email_id = cursor.lastrowid
+
+                self._conn.execute(
+                    "INSERT INTO bodies (email_id, body, html_content, plain_content) VALUES (?, ?, ?, ?)",
+                    (email_id, email.get("body"), email.get("html_content"), email.get("plain_content"))
+                )
+                # само содержимое вложений лежит в хранилище blob_store
+                self._conn.executemany(
+                    "INSERT INTO attachments (email_id, digest, size, filename, content_type, content_id, inline) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(email_id, a["digest"], a["size"], a.get("filename"), a.get("content_type"),
+                      a.get("content_id"), 1 if a.get("inline") else 0)
+                     for a in email.get("attachments") or ()]
+                )
+                if self.fts:
+                    self._conn.execute(
+                        "INSERT INTO emails_fts (rowid, sender, subject, body) VALUES (?, ?, ?, ?)",
+                        (email_id, *self._search_fields(email))
+                    )
+                email_ids.append(email_id)
+
+        return email_ids
+
+    def count(self, mailbox):
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM emails WHERE mailbox = ?",
+                                     (mailbox,)).fetchone()
+        return row[0]
+
+    def headers(self, mailbox, offset=0, limit=100):
+        # страница заголовков в порядке получения
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, sender, subject, timestamp FROM emails WHERE mailbox = ? "
+                "ORDER BY received_at, id LIMIT ? OFFSET ?",
+                (mailbox, limit, offset)
+            ).fetchall()
+
+        return [dict(zip(HEADER_COLUMNS, row)) for row in rows]
+
+    def search(self, mailbox, query, offset=0, limit=100, email_ids=None):
+        """
+        Страница заголовков писем, подходящих под запрос.
+
+        Каждое слово запроса ищется как префикс, нужны все слова. Запрос
+        идет от индекса в порядке id, без COUNT и сортировки всех
+        совпадений, поэтому страница не дорожает с ростом ящика.
+        С email_ids проверяются только эти письма, например новые.
+        """
+        terms = SEARCH_TERM.findall(query or "")
+        if not terms:
+            return []
+
+        only = ""
+        if email_ids is not None:
+            email_ids = list(email_ids)
+            if not email_ids:
+                return []
+            only = f" AND e.id IN ({', '.join('?' * len(email_ids))})"
+
+        with self._lock:
+            if self.fts and not self.fts_indexing:
+                match = " ".join(f'"{term}"*' for term in terms)
+                rows = self._conn.execute(
+                    "SELECT e.id, e.sender, e.subject, e.timestamp "
+                    "FROM emails_fts f JOIN emails e ON e.id = f.rowid "
+                    f"WHERE emails_fts MATCH ? AND e.mailbox = ?{only} ORDER BY f.rowid LIMIT ? OFFSET ?",
+                    (match, mailbox, *(email_ids or ()), limit, offset)
+                ).fetchall()
+            else:
+                conditions = " AND ".join("(e.sender LIKE ? OR e.subject LIKE ?)" for _ in terms)
+                rows = self._conn.execute(
+                    "SELECT e.id, e.sender, e.subject, e.timestamp FROM emails e "
+                    f"WHERE e.mailbox = ? AND {conditions}{only} ORDER BY e.id LIMIT ? OFFSET ?",
+                    (mailbox, *(f"%{term}%" for term in terms for _ in range(2)),
+                     *(email_ids or ()), limit, offset)
+                ).fetchall()
+
+        return [dict(zip(HEADER_COLUMNS, row)) for row in rows]
+
+    def get_email(self, email_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT e.id, e.sender, e.sender_name, e.subject, e.timestamp, "
+                "b.body, b.html_content, b.plain_content "
+                "FROM emails e JOIN bodies b ON b.email_id = e.id WHERE e.id = ?",
+                (email_id,)
+            ).fetchone()
+
+            attachments = self._conn.execute(
+                "SELECT digest, size, filename, content_type, content_id, inline "
+                "FROM attachments WHERE email_id = ? ORDER BY rowid",
+                (email_id,)
+            ).fetchall() if row is not None else []
+
+        if row is None:
+            return None
+
+        email = dict(zip(("id", "sender", "sender_name", "subject", "timestamp",
+                          "body", "html_content", "plain_content"), row))
+        email["attachments"] = [dict(zip(ATTACHMENT_COLUMNS, a), inline=bool(a[5])) for a in attachments]
+        return email
+
+    def blob_digests(self):
+        # вложения, на которые еще ссылаются письма
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT digest FROM attachments").fetchall()
+        return {row[0] for row in rows}
+
+    def clear(self, mailbox):
+        with self._write_lock, self._lock, self._conn:
+            self._conn.execute("DELETE FROM emails WHERE mailbox = ?", (mailbox,))
+        logger.debug(f"Письма ящика {mailbox} удалены")
+
+    def purge(self, older_than):
+        # удаляет письма, полученные раньше older_than (время unix), и возвращает их число;
+        # тела и вложения уходят каскадом, индекс поиска - триггером
+        with self._write_lock, self._lock, self._conn:
+            removed = self._conn.execute("DELETE FROM emails WHERE received_at < ?", (older_than,)).rowcount
+        if removed:
+            logger.debug(f"Удалено старых писем: {removed}")
+        return removed
+
+    def close(self):
+        with self._write_lock, self._lock:
+            # фоновая индексация останавливается на следующей пачке
+            self._closed = True
+            self._conn.close()
@@ -0,0 +1,37 @@
+import threading
+
+
+class Metrics:
+    """
+    Простые счетчики и тайминги внутри процесса.
+
+    Значения читаются через snapshot(), например для логов
+    или отладочной панели.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timings = {}
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timing = self._timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0})
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["last"] = seconds
+            timing["max"] = max(timing["max"], seconds)
+
+    def snapshot(self):
+        with self._lock:
+            timings = {}
+            for name, timing in self._timings.items():
+                timings[name] = dict(timing, avg=timing["total"] / timing["count"])
+
+            return {"counters": dict(self._counters), "timings": timings}
+
+
+metrics = Metrics()
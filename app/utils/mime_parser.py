@@ -0,0 +1,238 @@
+import base64
+import binascii
+from email.parser import BytesHeaderParser
+from email.policy import default
+from email.utils import parseaddr
+
+from app.config.constants import BLOB_CHUNK_SIZE
+from app.utils.blob_store import get_blob_store
+from app.utils.logger import setup_logger
+
+logger = setup_logger("mime_parser")
+
+_header_parser = BytesHeaderParser(policy=default)
+
+# какие части письма нужны интерфейсу
+BODY_TYPES = ("text/html", "text/plain")
+
+# все байты, кроме алфавита base64: переносы строк и мусор между блоками
+_B64_JUNK = bytes(set(range(256)) - set(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="))
+
+
+def _find_headers_end(data, start, end):
+    # возвращает (конец заголовков, начало тела)
+    if data.startswith(b"\r\n", start):
+        return start, start + 2
+    if data.startswith(b"\n", start):
+        return start, start + 1
+
+    crlf = data.find(b"\r\n\r\n", start, end)
+    lf = data.find(b"\n\n", start, end)
+
+    if crlf != -1 and (lf == -1 or crlf < lf):
+        return crlf + 2, crlf + 4
+    if lf != -1:
+        return lf + 1, lf + 2
+
+    # письмо без тела
+    return end, end
+
+
+def _decode_payload(headers, data, start, end):
+    raw = data[start:end]
+    cte = str(headers.get("Content-Transfer-Encoding", "7bit")).strip().lower()
+
+    try:
+        if cte == "base64":
+            raw = base64.b64decode(raw)
+        elif cte == "quoted-printable":
+            raw = binascii.a2b_qp(raw)
+    except (binascii.Error, ValueError) as e:
+        logger.warning(f"Не удалось декодировать часть письма ({cte}): {str(e)}")
+
+    charset = headers.get_content_charset() or "utf-8"
+
+    try:
+        return raw.decode(charset, errors="replace")
+    except LookupError:
+        return raw.decode("utf-8", errors="replace")
+
+
+def _iter_decoded(headers, data, start, end, chunk_size=BLOB_CHUNK_SIZE):
+    # декодированное содержимое части блоками, без копии всей части в памяти
+    cte = str(headers.get("Content-Transfer-Encoding", "7bit")).strip().lower()
+    pos = start
+
+    if cte == "base64":
+        tail = b""
+        while pos < end:
+            chunk = tail + data[pos:min(end, pos + chunk_size)].translate(None, _B64_JUNK)
+            pos += chunk_size
+
+            # декодируются только полные группы по 4 символа; ошибка уходит
+            # в BlobStore.put, чтобы испорченная часть не сохранилась обрезанной
+            usable = len(chunk) - len(chunk) % 4
+            tail = chunk[usable:]
+            if usable:
+                yield base64.b64decode(chunk[:usable])
+
+        # последняя группа без "=" в конце, как ее дополняет и модуль email
+        tail = tail.rstrip(b"=")
+        if tail:
+            yield base64.b64decode(tail + b"=" * (-len(tail) % 4))
+
+    elif cte == "quoted-printable":
+        while pos < end:
+            cut = end
+            if pos + chunk_size < end:
+                # блок заканчивается на переносе строки, чтобы не разрезать =XX
+                cut = data.rfind(b"\n", pos, pos + chunk_size) + 1 or pos + chunk_size
+                # строка длиннее блока: режем перед "=", если он в последних двух байтах
+                escape = data.rfind(b"=", max(pos + 1, cut - 2), cut)
+                if escape != -1:
+                    cut = escape
+            yield binascii.a2b_qp(data[pos:cut])
+            pos = cut
+
+    else:
+        while pos < end:
+            yield data[pos:min(end, pos + chunk_size)]
+            pos += chunk_size
+
+
+def _store_part(data, start, end, headers, attachments):
+    content_id = str(headers.get("Content-ID", "")).strip().strip("<>") or None
+
+    try:
+        digest, size = get_blob_store().put(_iter_decoded(headers, data, start, end))
+    except ValueError as e:
+        # binascii.Error: поврежденный base64, часть пропускается целиком
+        logger.warning(f"Вложение {headers.get_filename() or content_id or ''} повреждено "
+                       f"и не сохранено: {str(e)}")
+        return
+    except OSError as e:
+        logger.error(f"Не удалось сохранить вложение: {str(e)}", exc_info=True)
+        return
+
+    if not size:
+        return
+
+    attachments.append({
+        "digest": digest,
+        "size": size,
+        "filename": headers.get_filename(),
+        "content_type": headers.get_content_type(),
+        "content_id": content_id,
+        # встроенная картинка, на которую ссылается html через cid:
+        "inline": content_id is not None and headers.get_content_disposition() != "attachment",
+    })
+
+
+def _iter_parts(data, start, end, boundary):
+    # границы частей multipart без копирования содержимого
+    delimiter = b"--" + boundary.encode("ascii", errors="replace")
+
+    if data.startswith(delimiter, start):
+        pos = start
+    else:
+        pos = data.find(b"\n" + delimiter, start, end)
+        if pos == -1:
+            return
+        pos += 1
+
+    while pos < end:
+        after = pos + len(delimiter)
+        if data.startswith(b"--", after):
+            # закрывающая граница
+            return
+
+        line_end = data.find(b"\n", after, end)
+        if line_end == -1:
+            return
+        part_start = line_end + 1
+
+        next_pos = data.find(b"\n" + delimiter, part_start, end)
+        if next_pos == -1:
+            # нет закрывающей границы - берем все до конца
+            yield part_start, end
+            return
+
+        part_end = next_pos
+        if part_end > part_start and data[part_end - 1:part_end] == b"\r":
+            part_end -= 1
+
+        yield part_start, part_end
+        pos = next_pos + 1
+
+
+def _walk(data, start, end, headers, bodies, attachments):
+    content_type = headers.get_content_type()
+
+    if headers.get_content_maintype() == "multipart":
+        boundary = headers.get_boundary()
+        if not boundary:
+            return
+
+        for part_start, part_end in _iter_parts(data, start, end, boundary):
+            hdr_end, body_start = _find_headers_end(data, part_start, part_end)
+            part_headers = _header_parser.parsebytes(data[part_start:hdr_end])
+
+            _walk(data, body_start, part_end, part_headers, bodies, attachments)
+        return
+
+    if (content_type in BODY_TYPES and bodies.get(content_type) is None
+            and headers.get_content_disposition() != "attachment"):
+        payload = _decode_payload(headers, data, start, end)
+        if payload:
+            bodies[content_type] = payload
+        return
+
+    # вложения и встроенные картинки уходят на диск
+    _store_part(data, start, end, headers, attachments)
+
+
+def parse_message(data):
+    """
+    Разбирает письмо из байтов, не создавая полную объектную модель.
+
+    Возвращает (заголовки, html, текст, вложения). Декодируются только
+    первые text/html и text/plain части; остальные части пишутся
+    блоками в хранилище вложений, в результате остаются их хэши.
+    """
+    end = len(data)
+    hdr_end, body_start = _find_headers_end(data, 0, end)
+    headers = _header_parser.parsebytes(data[:hdr_end])
+
+    bodies = {}
+    attachments = []
+    _walk(data, body_start, end, headers, bodies, attachments)
+
+    return headers, bodies.get("text/html"), bodies.get("text/plain"), attachments
+
+
+def parse_envelope(content, mail_from, rcpt_tos):
+    """
+    Собирает данные письма для интерфейса из сырого конверта.
+
+    Функция верхнего уровня без зависимостей от Qt, чтобы ее можно было
+    выполнять как в потоке, так и в отдельном процессе.
+    """
+    headers, html_body, plain_body, attachments = parse_message(content)
+
+    # адрес отправителя
+    from_header = headers.get("From", "")
+    sender_name, sender_email = parseaddr(str(from_header))
+
+    sender = sender_email if sender_email else mail_from
+
+    return {
+        "sender": sender,
+        "sender_name": sender_name,
+        "subject": str(headers.get("Subject", "(Без темы)")),
+        "body": html_body if html_body else plain_body,  # Приоритет HTML
+        "html_content": html_body if html_body else None,
+        "plain_content": plain_body,
+        "timestamp": str(headers.get("Date", "")),
+        "attachments": attachments,
+        "recipients": rcpt_tos
+    }
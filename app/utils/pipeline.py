@@ -0,0 +1,117 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from app.utils.logger import setup_logger
+from app.utils.tracing import tracer
+
+logger = setup_logger("pipeline")
+
+
+class StageError(Exception):
+    # ошибка в одном из этапов; исходное исключение в error
+    def __init__(self, stage, error):
+        super().__init__(f"{stage}: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class Stage:
+    def __init__(self, name, func, deps=(), title=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.title = title or name
+
+
+class Pipeline:
+    """
+    Выполняет этапы по графу зависимостей.
+
+    Этап запускается, как только завершены все его зависимости, поэтому
+    независимые этапы идут параллельно. Функция этапа получает словарь
+    с результатами уже выполненных этапов.
+    """
+    def __init__(self, stages, max_workers=4, on_progress=None, parent_span=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_workers = max_workers
+        self.on_progress = on_progress
+        # этапы выполняются в других потоках, поэтому родительский спан передается явно
+        self.parent_span = parent_span
+
+        self.results = {}
+        self.timings = {}
+
+        self._active = []
+        self._lock = threading.Lock()
+
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Этап {stage.name} зависит от неизвестного этапа {dep}")
+
+    def _report(self, stage, started):
+        with self._lock:
+            if started:
+                self._active.append(stage.title)
+            else:
+                self._active.remove(stage.title)
+            active = list(self._active)
+
+        if self.on_progress and active:
+            try:
+                self.on_progress(active)
+            except Exception as e:
+                logger.warning(f"Ошибка в обработчике прогресса: {str(e)}")
+
+    def _run_stage(self, stage):
+        self._report(stage, True)
+        start = time.monotonic()
+        try:
+            with tracer.span(stage.name, parent=self.parent_span):
+                return stage.func(self.results)
+        finally:
+            self.timings[stage.name] = time.monotonic() - start
+            logger.debug(f"Этап {stage.name}: {self.timings[stage.name]:.3f} с")
+            self._report(stage, False)
+
+    def run(self):
+        pending = dict(self.stages)
+        running = {}
+        start = time.monotonic()
+        error = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline") as executor:
+            while pending or running:
+                if error is None:
+                    ready = [stage for stage in pending.values()
+                             if all(dep in self.results for dep in stage.deps)]
+
+                    for stage in ready:
+                        del pending[stage.name]
+                        running[executor.submit(self._run_stage, stage)] = stage
+
+                if not running:
+                    if pending and error is None:
+                        raise ValueError(f"Циклическая зависимость этапов: {', '.join(pending)}")
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        self.results[stage.name] = future.result()
+                    except Exception as e:
+                        # новые этапы не запускаем, ждем уже запущенные
+                        if error is None:
+                            error = StageError(stage.name, e)
+
+        total = time.monotonic() - start
+        summary = ", ".join(f"{name}={duration:.2f}с" for name, duration in self.timings.items())
+        logger.debug(f"Этапы выполнены за {total:.2f}с ({summary})")
+
+        if error is not None:
+            raise error
+
+        return self.results
@@ -0,0 +1,300 @@
+import os
+import re
+import random
+import logging
+import subprocess
+import threading
+import time
+import sys
+import ctypes
+from collections import deque, namedtuple
+from logging.handlers import RotatingFileHandler
+
+from Qt import QtCore
+
+from app.config.constants import (RATHOLE_RESTART_MIN, RATHOLE_RESTART_MAX,
+                                  RATHOLE_STABLE_AFTER, RATHOLE_DOWN_RESTART,
+                                  RATHOLE_LOG_MAX_BYTES, RATHOLE_LOG_BACKUPS,
+                                  RATHOLE_EVENTS_KEEP)
+from app.utils.api import resource_path, script_path
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+from app.utils.tracing import tracer
+
+logger = setup_logger("rathole")
+
+# rathole раскрашивает вывод, даже когда пишет не в терминал
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+
+# строка tracing-subscriber: "<время>  INFO <спаны>: <модуль>: <сообщение>"
+LINE_PATTERN = re.compile(r"^(?:(?P<time>\S+)\s+)?(?P<level>TRACE|DEBUG|INFO|WARN|ERROR)\s+(?P<rest>.*)$")
+TARGET_PATTERN = re.compile(r"^(?:\S*\{.*?\}:\s*)*(?P<target>[\w:]+):\s(?P<message>.*)$")
+
+CONNECTED_PATTERN = re.compile(r"^Control channel established")
+# "Failed to run the control channel: ..." и "<ошибка>. Retry in 1.2s..." при повторе подключения
+DISCONNECTED_PATTERN = re.compile(r"^Failed to run the control channel|\. Retry in \d[\d.]*\w*s\.\.\.$")
+
+# kind: "connected", "disconnected" или "log"
+RatholeEvent = namedtuple("RatholeEvent", ["time", "level", "target", "message", "kind"])
+
+
+def parse_line(line):
+    # разбирает строку вывода rathole в событие
+    line = ANSI_ESCAPE.sub("", line).rstrip()
+    level, target, message = "INFO", "", line
+
+    match = LINE_PATTERN.match(line)
+    if match:
+        level, message = match.group("level"), match.group("rest")
+        target_match = TARGET_PATTERN.match(message)
+        if target_match:
+            target, message = target_match.group("target"), target_match.group("message")
+
+    if CONNECTED_PATTERN.search(message):
+        kind = "connected"
+    elif DISCONNECTED_PATTERN.search(message):
+        kind = "disconnected"
+    else:
+        kind = "log"
+
+    return RatholeEvent(time.time(), level, target, message, kind)
+
+
+_output_logger = None
+_output_lock = threading.Lock()
+
+
+def output_logger():
+    # вывод rathole пишется в .rathole.log с ротацией по размеру
+    global _output_logger
+
+    with _output_lock:
+        if _output_logger is None:
+            path_to_log = script_path(".rathole.log")
+            make_hidden = not os.path.exists(path_to_log) and sys.platform == "win32"
+
+            handler = RotatingFileHandler(path_to_log, maxBytes=RATHOLE_LOG_MAX_BYTES,
+                                          backupCount=RATHOLE_LOG_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+
+            if make_hidden:
+                # making the file hidden in windows
+                ctypes.windll.kernel32.SetFileAttributesW(path_to_log, 0x02)
+
+            output = logging.getLogger("rathole.output")
+            output.setLevel(logging.INFO)
+            output.propagate = False
+            output.addHandler(handler)
+            _output_logger = output
+
+        return _output_logger
+
+
+class RatholeSignals(QtCore.QObject):
+    # туннель поднят/упал; время восстановления связи в секундах
+    state_changed = QtCore.Signal(bool)
+    reconnected = QtCore.Signal(float)
+
+
+rathole_signals = RatholeSignals()
+
+
+def rathole_binary():
+    if sys.platform == "win32":
+        return os.path.join(resource_path("bin"), "rathole.exe")
+    return os.path.join(resource_path("bin"), "rathole")
+
+
+class Rathole:
+    """
+    Запускает rathole и следит за ним.
+
+    По выводу процесса определяется состояние control channel. Упавший
+    процесс перезапускается с растущей задержкой со случайным разбросом,
+    а если связь не восстанавливается слишком долго - перезапускается
+    принудительно.
+
+    Последние события держатся в ограниченной очереди, подписчики
+    получают каждое событие из потока чтения.
+    """
+    def __init__(self, signals=rathole_signals, trace_parent=None):
+        self.rh_process = None
+        self.signals = signals
+        self.trace_parent = trace_parent
+
+        self.connected = False
+        self.restarts = 0
+        self.events = deque(maxlen=RATHOLE_EVENTS_KEEP)
+
+        self._subscribers = []
+
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._down_since = None
+
+    def run(self):
+        # цикл надзора; выполняется в отдельном потоке до вызова stop()
+        failures = 0
+
+        while not self._stop_event.is_set():
+            spawned = time.monotonic()
+
+            try:
+                process = self._spawn()
+            except Exception as e:
+                logger.error(f"Не удалось запустить rathole: {str(e)}", exc_info=True)
+                process = None
+
+            if process is not None:
+                reader = threading.Thread(target=self._read_output, args=(process,), daemon=True)
+                reader.start()
+                self._watch(process)
+                reader.join(timeout=2)
+
+            if self._stop_event.is_set():
+                break
+
+            self._set_state(False)
+
+            if time.monotonic() - spawned > RATHOLE_STABLE_AFTER:
+                failures = 0
+            failures += 1
+            self.restarts += 1
+            metrics.increment("rathole.restarts")
+
+            # разброс задержки, чтобы клиенты не переподключались одновременно
+            delay = min(RATHOLE_RESTART_MAX, RATHOLE_RESTART_MIN * 2 ** (failures - 1))
+            delay *= random.uniform(0.5, 1.0)
+
+            code = process.returncode if process is not None else None
+            logger.warning(f"rathole завершился (код {code}), перезапуск через {delay:.1f}с")
+            self._stop_event.wait(delay)
+
+        logger.debug("Надзор за rathole остановлен")
+
+    def _spawn(self):
+        kwargs = {}
+        if sys.platform == "win32":
+            kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+
+        process = subprocess.Popen([rathole_binary(), script_path(".config.toml")],
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   text=True, encoding="utf-8", errors="replace",
+                                   bufsize=1, **kwargs)
+
+        with self._lock:
+            # stop() мог прийти, пока процесс запускался, и не увидеть его
+            stopped = self._stop_event.is_set()
+            if not stopped:
+                self.rh_process = process
+
+        if stopped:
+            self._terminate(process)
+            return None
+
+        if self._down_since is None:
+            self._down_since = time.monotonic()
+
+        logger.debug(f"rathole запущен, pid {process.pid}")
+        return process
+
+    def _watch(self, process):
+        # ждем завершения процесса; зависший без связи процесс перезапускаем
+        while process.poll() is None:
+            if self._stop_event.wait(1):
+                self._terminate(process)
+                return
+
+            down_since = self._down_since
+            if (not self.connected and down_since is not None
+                    and time.monotonic() - down_since > RATHOLE_DOWN_RESTART):
+                logger.warning("Control channel не восстановился, перезапуск rathole")
+                self._terminate(process)
+                self._down_since = time.monotonic()
+                return
+
+    def subscribe(self, callback):
+        # callback(event) вызывается в потоке чтения вывода
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def recent_events(self):
+        with self._lock:
+            return list(self.events)
+
+    def _read_output(self, process):
+        output = output_logger()
+
+        try:
+            for line in process.stdout:
+                line = ANSI_ESCAPE.sub("", line).rstrip()
+                output.info(line)
+                self._handle_event(parse_line(line))
+        except Exception as e:
+            logger.warning(f"Ошибка при чтении вывода rathole: {str(e)}")
+        finally:
+            process.stdout.close()
+
+    def _handle_event(self, event):
+        with self._lock:
+            self.events.append(event)
+            subscribers = list(self._subscribers)
+
+        if event.kind == "connected":
+            self._set_state(True)
+        elif event.kind == "disconnected":
+            self._set_state(False)
+        elif event.level == "ERROR":
+            logger.warning(f"rathole: {event.message}")
+
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.warning(f"Ошибка в подписчике на события rathole: {str(e)}")
+
+    def _set_state(self, connected):
+        if connected == self.connected:
+            return
+
+        self.connected = connected
+        now = time.monotonic()
+
+        if connected:
+            down_since = self._down_since or now
+            latency = now - down_since
+            self._down_since = None
+
+            metrics.observe("rathole.reconnect", latency)
+            tracer.event("rathole.connected", parent=self.trace_parent,
+                         latency=round(latency, 3), restarts=self.restarts)
+            logger.info(f"Туннель подключен за {latency:.2f}с")
+            self.signals.reconnected.emit(latency)
+        else:
+            self._down_since = now
+            metrics.increment("rathole.disconnects")
+            logger.warning("Связь с сервером туннеля потеряна")
+
+        self.signals.state_changed.emit(connected)
+
+    def _terminate(self, process):
+        try:
+            process.terminate()
+            process.wait(timeout=3)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def stop(self):
+        self._stop_event.set()
+
+        with self._lock:
+            process = self.rh_process
+            self.rh_process = None
+
+        if process and process.poll() is None:
+            self._terminate(process)
@@ -0,0 +1,253 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import random
+import socket
+import struct
+import time
+
+from app.config.constants import (BASE_DOMAIN, RATHOLE_RESTART_MIN, RATHOLE_RESTART_MAX,
+                                  RATHOLE_STABLE_AFTER, RATHOLE_HEARTBEAT_TIMEOUT)
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+from app.utils.rathole import Rathole, RatholeEvent, rathole_signals
+
+logger = setup_logger("rathole_client")
+
+# протокол rathole: сообщения сериализуются bincode (little-endian, варианты enum - u32)
+PROTO_VERSION = 0
+HELLO_CONTROL = 0
+HELLO_DATA = 1
+ACK_OK = 0
+CMD_CREATE_DATA_CHANNEL = 0
+CMD_HEARTBEAT = 1
+DATA_START_FORWARD_TCP = 0
+
+HELLO_LEN = 37
+CMD_LEN = 4
+
+ACK_ERRORS = {1: "сервис не найден на сервере", 2: "неверный токен сервиса"}
+
+
+def digest(data):
+    return hashlib.sha256(data).digest()
+
+
+def pack_hello(kind, value):
+    return struct.pack("<IB", kind, PROTO_VERSION) + value
+
+
+class TunnelProtocolError(Exception):
+    pass
+
+
+class InProcessTunnel(Rathole):
+    """
+    Клиент протокола rathole внутри приложения.
+
+    Работает в цикле событий почтового сервера: после рукопожатия
+    сокет data channel сразу передается aiosmtpd, без процесса rathole,
+    конфига на диске и лишнего соединения через 127.0.0.1. У каждого
+    сервиса свой control channel; туннель считается поднятым, когда
+    подключены все сервисы.
+    """
+    def __init__(self, controller, services, remote_addr=(BASE_DOMAIN, 6789),
+                 signals=rathole_signals, trace_parent=None):
+        super().__init__(signals=signals, trace_parent=trace_parent)
+
+        self.controller = controller
+        # {service_name: token}
+        self.services = dict(services)
+        self.remote_addr = remote_addr
+
+        self._future = None
+        self._tasks = {}
+        self._sockets = set()
+        self._connected_services = set()
+
+    def run(self):
+        # блокирует поток, пока клиент работает в цикле aiosmtpd
+        self._future = asyncio.run_coroutine_threadsafe(self._main(), self.controller.loop)
+
+        try:
+            self._future.result()
+        except (asyncio.CancelledError, concurrent.futures.CancelledError):
+            pass
+        except Exception as e:
+            logger.error(f"Клиент туннеля завершился с ошибкой: {str(e)}", exc_info=True)
+
+        logger.debug("Клиент туннеля остановлен")
+
+    def stop(self):
+        self._stop_event.set()
+
+        if self._future is not None:
+            self._future.cancel()
+            # отмененные задачи сервисов уже не сообщат об отключении сами
+            self._emit("Tunnel client stopped", "disconnected")
+
+    def _emit(self, message, kind="log", level="INFO"):
+        self._handle_event(RatholeEvent(time.time(), level, "rathole_client", message, kind))
+
+    def _start_service(self, service_name, token):
+        # вызывается в цикле aiosmtpd
+        if self._stop_event.is_set() or service_name in self._tasks:
+            return
+        task = self.controller.loop.create_task(self._service_loop(service_name, token))
+        self._tasks[service_name] = task
+
+    def _service_state(self, service_name, connected, message):
+        if connected:
+            self._connected_services.add(service_name)
+        else:
+            self._connected_services.discard(service_name)
+
+        if not connected:
+            self._emit(message, "disconnected", "ERROR")
+        elif self._connected_services >= set(self.services):
+            self._emit(message, "connected")
+        else:
+            self._emit(message)
+
+    async def _main(self):
+        if self._down_since is None:
+            self._down_since = time.monotonic()
+
+        try:
+            for service_name, token in self.services.items():
+                self._start_service(service_name, token)
+
+            # сервисы работают в своих задачах до отмены
+            await asyncio.Event().wait()
+        finally:
+            for task in self._tasks.values():
+                task.cancel()
+            for sock in list(self._sockets):
+                sock.close()
+
+    async def _service_loop(self, service_name, token):
+        failures = 0
+
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+
+            try:
+                await self._control_channel(service_name, token)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._service_state(service_name, False,
+                                    f"Failed to run the control channel {service_name}: {str(e)}")
+
+            if time.monotonic() - started > RATHOLE_STABLE_AFTER:
+                failures = 0
+            failures += 1
+            self.restarts += 1
+            metrics.increment("rathole.restarts")
+
+            delay = min(RATHOLE_RESTART_MAX, RATHOLE_RESTART_MIN * 2 ** (failures - 1))
+            delay *= random.uniform(0.5, 1.0)
+            logger.warning(f"Переподключение {service_name} через {delay:.1f}с")
+            await asyncio.sleep(delay)
+
+    async def _connect(self):
+        loop = asyncio.get_running_loop()
+        host, port = self.remote_addr
+
+        family, type_, proto, _, addr = (await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM))[0]
+        sock = socket.socket(family, type_, proto)
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, addr), 10)
+        except BaseException:
+            sock.close()
+            raise
+
+        return sock
+
+    async def _recv_exactly(self, sock, size):
+        loop = asyncio.get_running_loop()
+        data = b""
+
+        while len(data) < size:
+            chunk = await loop.sock_recv(sock, size - len(data))
+            if not chunk:
+                raise TunnelProtocolError("сервер закрыл соединение")
+            data += chunk
+
+        return data
+
+    async def _recv_u32(self, sock):
+        return struct.unpack("<I", await self._recv_exactly(sock, CMD_LEN))[0]
+
+    async def _control_channel(self, service_name, token):
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        sock = await self._connect()
+        self._sockets.add(sock)
+
+        try:
+            await loop.sock_sendall(sock, pack_hello(HELLO_CONTROL, digest(service_name.encode())))
+
+            hello = await self._recv_exactly(sock, HELLO_LEN)
+            kind, version = struct.unpack("<IB", hello[:5])
+            if kind != HELLO_CONTROL or version != PROTO_VERSION:
+                raise TunnelProtocolError(f"неожиданный ответ сервера (версия {version})")
+
+            session_key = digest(token.encode() + hello[5:])
+            await loop.sock_sendall(sock, session_key)
+
+            ack = await self._recv_u32(sock)
+            if ack != ACK_OK:
+                raise TunnelProtocolError(ACK_ERRORS.get(ack, f"ошибка {ack}"))
+
+            metrics.observe("rathole.handshake", time.monotonic() - start)
+            self._service_state(service_name, True, f"Control channel established: {service_name}")
+
+            while True:
+                cmd = await asyncio.wait_for(self._recv_u32(sock), RATHOLE_HEARTBEAT_TIMEOUT)
+                if cmd == CMD_CREATE_DATA_CHANNEL:
+                    loop.create_task(self._data_channel(session_key))
+                elif cmd != CMD_HEARTBEAT:
+                    raise TunnelProtocolError(f"неизвестная команда {cmd}")
+        except asyncio.TimeoutError:
+            raise TunnelProtocolError("нет heartbeat от сервера")
+        finally:
+            self._sockets.discard(sock)
+            sock.close()
+
+    async def _data_channel(self, session_key):
+        loop = asyncio.get_running_loop()
+
+        try:
+            sock = await self._connect()
+        except Exception as e:
+            logger.warning(f"Не удалось открыть data channel: {str(e)}")
+            return
+
+        self._sockets.add(sock)
+        try:
+            await loop.sock_sendall(sock, pack_hello(HELLO_DATA, session_key))
+
+            # сервер держит канал в пуле до появления входящего соединения
+            cmd = await self._recv_u32(sock)
+            if cmd != DATA_START_FORWARD_TCP:
+                raise TunnelProtocolError(f"неподдерживаемая команда data channel {cmd}")
+        except Exception as e:
+            self._sockets.discard(sock)
+            sock.close()
+            logger.warning(f"Ошибка data channel: {str(e)}")
+            return
+
+        # соединение отдается SMTP-серверу напрямую, дальше сокетом владеет транспорт
+        self._sockets.discard(sock)
+        start = time.monotonic()
+        try:
+            await loop.connect_accepted_socket(self.controller.factory, sock=sock)
+            metrics.observe("rathole.data_channel", time.monotonic() - start)
+        except Exception as e:
+            logger.warning(f"Не удалось передать соединение почтовому серверу: {str(e)}")
+            sock.close()
@@ -0,0 +1,108 @@
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config.constants import RENDER_CACHE_SIZE
+from app.utils import email_renderer
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+logger = setup_logger("render_cache")
+
+# письмо из хранилища, выбранный способ показа и готовый документ для view
+PreparedEmail = namedtuple("PreparedEmail", ["email", "tier", "document"])
+
+
+def prepare_email(email, force_full=False):
+    tier, body = email_renderer.prepare(email, force_full)
+    return PreparedEmail(email, tier, email_renderer.build_document(tier, body))
+
+
+class RenderCache:
+    """
+    LRU-кэш писем, подготовленных к показу.
+
+    Чтение из хранилища, классификация и очистка html выполняются
+    один раз; соседние письма готовятся заранее в фоновом потоке,
+    чтобы переход по списку стрелками не ждал диска и парсера.
+    """
+    def __init__(self, loader, max_size=RENDER_CACHE_SIZE):
+        # loader(email_id) -> словарь письма или None
+        self.loader = loader
+        self.max_size = max_size
+
+        self._entries = OrderedDict()
+        self._pending = set()
+        # меняется при очистке: письма, прочитанные до нее, в кэш не попадают
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render-prefetch")
+
+    def _store(self, email_id, prepared, generation):
+        with self._lock:
+            if generation != self._generation:
+                # ящик очищен, пока письмо готовилось; его id может уже принадлежать другому
+                return
+
+            self._entries[email_id] = prepared
+            self._entries.move_to_end(email_id)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _load(self, email_id):
+        with self._lock:
+            generation = self._generation
+
+        email = self.loader(email_id)
+        if email is None:
+            return None
+
+        prepared = prepare_email(email)
+        self._store(email_id, prepared, generation)
+        return prepared
+
+    def get(self, email_id):
+        with self._lock:
+            prepared = self._entries.get(email_id)
+            if prepared is not None:
+                self._entries.move_to_end(email_id)
+
+        if prepared is not None:
+            metrics.increment("render_cache.hit")
+            return prepared
+
+        metrics.increment("render_cache.miss")
+        return self._load(email_id)
+
+    def prefetch(self, email_ids):
+        for email_id in email_ids:
+            with self._lock:
+                if email_id in self._entries or email_id in self._pending:
+                    continue
+                self._pending.add(email_id)
+
+            self._executor.submit(self._prefetch_one, email_id)
+
+    def _prefetch_one(self, email_id):
+        try:
+            with self._lock:
+                if email_id in self._entries:
+                    return
+
+            if self._load(email_id) is not None:
+                metrics.increment("render_cache.prefetch")
+        except Exception as e:
+            logger.warning(f"Не удалось подготовить письмо {email_id} заранее: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.discard(email_id)
+
+    def clear(self):
+        # вызывается после очистки хранилища: id удаленных писем могут быть выданы заново
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
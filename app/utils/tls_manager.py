@@ -0,0 +1,187 @@
+import os
+import ssl
+import threading
+import time
+import weakref
+
+from app.config.constants import TLS_RELOAD_INTERVAL, TLS_NUM_TICKETS, TLS_TICKET_ROTATE
+from app.utils.api import script_path
+from app.utils.logger import setup_logger
+from app.utils.metrics import metrics
+
+logger = setup_logger("tls_manager")
+
+
+class TLSContextManager:
+    """
+    TLS-контексты почтового сервера по именам хостов.
+
+    Базовый контекст отдается каждому новому соединению aiosmtpd, а сертификат для
+    конкретного ящика выбирается в sni_callback из кэша. Фоновый поток
+    следит за файлами в .certs/<поддомен> и подменяет контекст целиком,
+    когда новый сертификат удалось загрузить, - без перезапуска сервера.
+
+    Повторные подключения возобновляют сессию по тикету. Ключи тикетов
+    живут в контексте, поэтому раз в rotate_interval все контексты
+    пересоздаются: старые тикеты перестают приниматься.
+    """
+    def __init__(self, certs_root=None, poll_interval=TLS_RELOAD_INTERVAL,
+                 rotate_interval=TLS_TICKET_ROTATE):
+        self.certs_root = certs_root or script_path(".certs")
+        self.poll_interval = poll_interval
+        self.rotate_interval = rotate_interval
+        self.rotated_at = time.monotonic()
+
+        # начало рукопожатия по объекту соединения, для замера задержки
+        self._handshakes = weakref.WeakKeyDictionary()
+
+        # контекст для клиентов без SNI или с неизвестным именем
+        self.default = self._new_context()
+        self.default_hostname = None
+
+        # hostname -> (контекст, путь, mtime файлов)
+        self._contexts = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watcher = None
+
+    def _new_context(self):
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.sni_callback = self._sni_callback
+
+        # тикеты для TLS 1.3 и 1.2; серверный кэш сессий OpenSSL включен по умолчанию
+        context.options &= ~ssl.OP_NO_TICKET
+        context.num_tickets = TLS_NUM_TICKETS
+        return context
+
+    def _paths(self, certs_path):
+        return os.path.join(certs_path, "fullchain.pem"), os.path.join(certs_path, "privkey.pem")
+
+    def _mtimes(self, certs_path):
+        return tuple(os.stat(path).st_mtime_ns for path in self._paths(certs_path))
+
+    def _build(self, certs_path):
+        context = self._new_context()
+        context.load_cert_chain(*self._paths(certs_path))
+        return context
+
+    def add(self, hostname, certs_path=None):
+        hostname = hostname.lower()
+        certs_path = certs_path or os.path.join(self.certs_root, hostname)
+
+        mtimes = self._mtimes(certs_path)
+        context = self._build(certs_path)
+
+        with self._lock:
+            self._contexts[hostname] = (context, certs_path, mtimes)
+
+            if self.default_hostname in (None, hostname):
+                # первый сертификат отдается и клиентам без SNI; контекст подменяется
+                # целиком, а не дозагружается: рукопожатия идут на нем одновременно
+                self.default = context
+                self.default_hostname = hostname
+
+        logger.debug(f"TLS-контекст для {hostname} загружен")
+
+    def remove(self, hostname):
+        with self._lock:
+            self._contexts.pop(hostname.lower(), None)
+
+    def get(self, hostname):
+        entry = self._contexts.get((hostname or "").lower())
+        return entry[0] if entry else None
+
+    def _sni_callback(self, ssl_object, server_name, ssl_context):
+        # вызывается OpenSSL во время рукопожатия, до выбора сертификата
+        self._handshakes[ssl_object] = time.monotonic()
+
+        context = self.get(server_name)
+        if context is not None and context is not ssl_context:
+            ssl_object.context = context
+        return None
+
+    def record_handshake(self, ssl_object):
+        # вызывается после завершения рукопожатия
+        started = self._handshakes.pop(ssl_object, None)
+        kind = "resumed" if ssl_object.session_reused else "full"
+
+        metrics.increment(f"tls.handshake.{kind}")
+        if started is not None:
+            metrics.observe(f"tls.handshake.{kind}", time.monotonic() - started)
+
+    def rotate(self):
+        # новые контексты - новые ключи тикетов
+        with self._lock:
+            entries = list(self._contexts.items())
+            default_hostname = self.default_hostname
+
+        contexts = {}
+        for hostname, (context, certs_path, mtimes) in entries:
+            try:
+                contexts[hostname] = (self._build(certs_path), certs_path, self._mtimes(certs_path))
+            except (ssl.SSLError, OSError) as e:
+                logger.warning(f"Не удалось пересоздать TLS-контекст {hostname}: {str(e)}")
+                contexts[hostname] = (context, certs_path, mtimes)
+
+        if default_hostname in contexts:
+            default = contexts[default_hostname][0]
+        else:
+            default = self._new_context()
+
+        with self._lock:
+            self._contexts.update(contexts)
+            self.default = default
+            self.rotated_at = time.monotonic()
+
+        metrics.increment("tls.ticket_rotation")
+        logger.debug("Ключи TLS-тикетов обновлены")
+
+    def reload(self):
+        # перечитывает сертификаты, файлы которых изменились
+        with self._lock:
+            entries = list(self._contexts.items())
+
+        for hostname, (context, certs_path, mtimes) in entries:
+            try:
+                current = self._mtimes(certs_path)
+            except FileNotFoundError:
+                continue
+
+            if current == mtimes:
+                continue
+
+            try:
+                # fullchain и privkey пишутся по очереди: пока пара не сходится,
+                # остается прежний контекст, попытка повторится на следующем проходе
+                new_context = self._build(certs_path)
+            except (ssl.SSLError, OSError) as e:
+                logger.debug(f"Сертификат {hostname} еще не готов: {str(e)}")
+                continue
+
+            with self._lock:
+                self._contexts[hostname] = (new_context, certs_path, current)
+                if hostname == self.default_hostname:
+                    self.default = new_context
+
+            metrics.increment("tls.reload")
+            logger.info(f"Сертификат {hostname} обновлен без перезапуска сервера")
+
+    def start(self):
+        if self._watcher is not None:
+            return
+
+        self._watcher = threading.Thread(target=self._watch, daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                if time.monotonic() - self.rotated_at > self.rotate_interval:
+                    self.rotate()
+                else:
+                    self.reload()
+            except Exception as e:
+                logger.warning(f"Ошибка при проверке сертификатов: {str(e)}")
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+from app.config.constants import TRACING_ENABLED, TRACE_LOG_MAX_BYTES, TRACE_LOG_BACKUPS
+from app.utils.logger import setup_logger, log_dir
+
+logger = setup_logger("tracing")
+
+trace_file = os.path.join(log_dir, "trace.jsonl")
+
+SERVICE_NAME = "mailtunnel"
+
+# коды статуса спана в OTLP
+STATUS_CODES = {"OK": 1, "ERROR": 2}
+
+
+def _otlp_value(value):
+    # AnyValue: 64-битные целые в OTLP JSON передаются строкой
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    elif isinstance(value, int):
+        return {"intValue": str(value)}
+    elif isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes",
+                 "start_ns", "start", "duration", "status")
+
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.start = time.monotonic()
+        self.duration = None
+        self.status = "OK"
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def to_otlp(self):
+        # спан в формате OTLP JSON (opentelemetry.proto.trace.v1.Span)
+        duration_ns = int((self.duration or 0) * 1e9)
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.start_ns + duration_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": STATUS_CODES[self.status]},
+        }
+
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.status == "ERROR" and "error" in self.attributes:
+            span["status"]["message"] = str(self.attributes["error"])
+
+        return span
+
+
+def export_request(spans):
+    # строка файла - ExportTraceServiceRequest, как у файлового экспортера
+    # OpenTelemetry Collector; такой файл читает приемник otlpjsonfile
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+            "scopeSpans": [{
+                "scope": {"name": SERVICE_NAME},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }],
+    }
+
+
+class Tracer:
+    """
+    Легковесная трассировка этапов жизненного цикла туннеля.
+
+    Длительности меряются по monotonic, готовые спаны пишутся строками
+    OTLP JSON в .logs/trace.jsonl с ротацией по размеру и держатся
+    в небольшом буфере для отладочной панели.
+    """
+    def __init__(self, path=trace_file, enabled=TRACING_ENABLED, keep=500,
+                 max_bytes=TRACE_LOG_MAX_BYTES, backups=TRACE_LOG_BACKUPS):
+        self.path = path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=keep)
+        self._output = None
+
+    def current(self):
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, parent=None, **attributes):
+        # parent нужен, когда спан открывается в другом потоке
+        parent = parent or self.current()
+        trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        span = Span(name, trace_id, parent.span_id if parent else None, attributes)
+
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(span)
+
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "ERROR"
+            span.set("error", str(e))
+            raise
+        finally:
+            span.duration = time.monotonic() - span.start
+            stack.pop()
+            self._finish(span)
+
+    def event(self, name, parent=None, **attributes):
+        # мгновенное событие, например получение первого письма
+        with self.span(name, parent=parent, **attributes) as span:
+            pass
+        return span
+
+    def _finish(self, span):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._recent.append(span)
+
+            try:
+                if self._output is None:
+                    # старые файлы удаляются так же, как вывод rathole
+                    self._output = RotatingFileHandler(self.path, maxBytes=self.max_bytes,
+                                                       backupCount=self.backups, encoding="utf-8")
+                    self._output.setFormatter(logging.Formatter("%(message)s"))
+
+                line = json.dumps(export_request([span]), ensure_ascii=False)
+                self._output.emit(logging.makeLogRecord({"msg": line}))
+            except Exception as e:
+                logger.warning(f"Не удалось записать спан {span.name}: {str(e)}")
+
+    def spans(self, trace_id):
+        with self._lock:
+            return [span for span in self._recent if span.trace_id == trace_id]
+
+    def summary(self, root):
+        # строка вида "tunnel.setup 3.21с: create_tunnel=0.40с, acme.order=0.80с, ..."
+        children = sorted((span for span in self.spans(root.trace_id) if span is not root),
+                          key=lambda span: span.start)
+        parts = ", ".join(f"{span.name}={span.duration:.2f}с" for span in children
+                          if span.duration is not None)
+        duration = root.duration if root.duration is not None else time.monotonic() - root.start
+
+        return f"{root.name} {duration:.2f}с: {parts}"
+
+    def last_trace_summary(self, name):
+        with self._lock:
+            roots = [span for span in self._recent if span.name == name and span.parent_id is None]
+
+        return self.summary(roots[-1]) if roots else None
+
+
+tracer = Tracer()
@@ -0,0 +1,129 @@
+import json
+import threading
+
+from Qt import QtCore
+from requests.exceptions import ConnectionError
+
+from app.config.constants import (BASE_URL, TTL_POLL_MIN, TTL_POLL_MAX,
+                                  TTL_STREAM_READ_TIMEOUT, TTL_ERROR_BACKOFF_MAX)
+from app.utils.api import api_request, get_ttl
+from app.utils.logger import setup_logger
+
+
+class TTLWatcher(QtCore.QThread):
+    """
+    Следит за TTL туннеля вне основного потока.
+
+    Сначала пробует подписаться на tunnel_status как на event-stream.
+    Если сервер отвечает обычным JSON, переходит на опрос, частота
+    которого растет по мере приближения к концу TTL.
+    """
+    ttl_updated = QtCore.Signal(int)
+    ttl_error = QtCore.Signal(str)
+
+    def __init__(self, tunnel_id, parent=None):
+        super().__init__(parent)
+        self.logger = setup_logger(f"{self.__class__.__name__}")
+
+        self.tunnel_id = tunnel_id
+        self.last_ttl = None
+
+        self._stop_event = threading.Event()
+        self._response = None
+
+    def stop(self):
+        self._stop_event.set()
+
+        # прерываем чтение потока, если оно заблокировано: close() из другого
+        # потока ждал бы конца чтения, shutdown сокета будит его сразу
+        response = self._response
+        if response is not None:
+            try:
+                getattr(response.raw, "shutdown", response.close)()
+            except Exception:
+                pass
+
+        if not self.wait(2000):
+            self.logger.warning("Поток TTL не завершился вовремя")
+
+    def poll_interval(self):
+        # чем меньше осталось времени, тем чаще сверяемся с сервером
+        if self.last_ttl is None:
+            return TTL_POLL_MIN
+
+        return max(TTL_POLL_MIN, min(TTL_POLL_MAX, self.last_ttl // 10))
+
+    def run(self):
+        stream_supported = True
+        failures = 0
+
+        while not self._stop_event.is_set():
+            try:
+                if stream_supported:
+                    stream_supported = self._subscribe()
+                    delay = 1 if stream_supported else self.poll_interval()
+                else:
+                    self._poll()
+                    delay = self.poll_interval()
+                failures = 0
+            except Exception as e:
+                if self._stop_event.is_set():
+                    break
+
+                failures += 1
+                delay = min(TTL_ERROR_BACKOFF_MAX, TTL_POLL_MIN * 2 ** (failures - 1))
+
+                if isinstance(e, ConnectionError):
+                    self.logger.warning("Невозможно подключиться к серверу при обновлении TTL")
+                    self.ttl_error.emit("сервер временно недоступен")
+                else:
+                    self.logger.warning(f"Ошибка при получении TTL: {str(e)}")
+                    self.ttl_error.emit(str(e))
+
+            self._stop_event.wait(delay)
+
+        self.logger.debug("Отслеживание TTL остановлено")
+
+    def _emit_ttl(self, ttl):
+        self.last_ttl = int(ttl)
+        self.ttl_updated.emit(self.last_ttl)
+        self.logger.debug(f"Текущий TTL: {self.last_ttl} секунд")
+
+    def _poll(self):
+        self._emit_ttl(get_ttl(self.tunnel_id))
+
+    def _subscribe(self):
+        # возвращает False, если сервер не поддерживает event-stream
+        response = api_request("GET", f"{BASE_URL}/tunnel_status", "tunnel_status_stream",
+                               params={"tunnel_id": self.tunnel_id},
+                               headers={"Accept": "text/event-stream"},
+                               timeout=(5, TTL_STREAM_READ_TIMEOUT),
+                               stream=True)
+        self._response = response
+
+        try:
+            if response.status_code in (404, 405, 406):
+                self.logger.debug("Подписка на TTL недоступна, используется опрос")
+                return False
+
+            response.raise_for_status()
+
+            if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                self._emit_ttl(response.json()["ttl"])
+                self.logger.debug("Сервер не поддерживает подписку на TTL, используется опрос")
+                return False
+
+            self.logger.debug("Подписка на обновления TTL установлена")
+            # события короткие: с блоком по умолчанию (512 байт) чтение ждало бы
+            # следующих событий, если сервер отдает поток без chunked-кодирования
+            for line in response.iter_lines(chunk_size=1, decode_unicode=True):
+                if self._stop_event.is_set():
+                    break
+
+                if line and line.startswith("data:"):
+                    self._emit_ttl(json.loads(line[5:].strip())["ttl"])
+
+            return True
+        finally:
+            self._response = None
+            response.close()
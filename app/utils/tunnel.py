@@ -1,19 +1,20 @@
 import os
-import requests
-import subprocess
-import threading
 import json
 import sys
 import ctypes
 from app.config.constants import BASE_URL, BASE_DOMAIN
-from app.utils.api import resource_path, script_path
+from app.utils.api import script_path, api_request
+
+
+class TunnelExistsError(Exception):
+    pass
 
 
 def create_tunnel(token):
-    req = requests.post(f"{BASE_URL}/create_tunnel", json={"token": token})
+    req = api_request("POST", f"{BASE_URL}/create_tunnel", "create_tunnel", json={"token": token})
     
     if req.status_code == 409:
-        raise Exception("Туннель уже был создан")
+        raise TunnelExistsError("Туннель уже был создан")
     elif req.status_code == 403:
         raise Exception("Доступ запрещен. Вы указали неверный токен")
     elif req.status_code != 200:
@@ -24,15 +25,15 @@ def create_tunnel(token):
     return (req_json["subdomain"], req_json["tunnel_id"], req_json["tunnel_secret"])
 
 def delete_tunnel(token):
-    req = requests.post(f"{BASE_URL}/delete_tunnel", json={"token": token})
+    req = api_request("POST", f"{BASE_URL}/delete_tunnel", "delete_tunnel", json={"token": token})
 
     if req.status_code != 200:
         raise Exception("Не удалось удалить почту")
 
 
-def add_tunnel_to_rathole(tunnel_id, tunnel_secret):
+def add_tunnel_to_rathole(services):
+    # services: {tunnel_id: tunnel_secret}; все сервисы идут на один SMTP-порт
     path_to_conf = script_path(".config.toml")
-    make_hidden = False
 
     if not os.path.exists(path_to_conf):
         open(path_to_conf, "w").close()
@@ -41,57 +42,19 @@ def add_tunnel_to_rathole(tunnel_id, tunnel_secret):
             # making the file hidden in windows
             ctypes.windll.kernel32.SetFileAttributesW(path_to_conf, 0x02)
 
-    with open(path_to_conf, "r+") as file:
-        file.truncate()
-        file.write(f"""[client]
+    config = f"""[client]
 remote_addr = "{BASE_DOMAIN}:6789"
-
+"""
+    for tunnel_id, tunnel_secret in services.items():
+        config += f"""
 [client.services.{tunnel_id}]
 token = \"{tunnel_secret}\"
-local_addr = \"127.0.0.1:8025\"""")
-
-
-class Rathole:
-    def __init__(self):
-        self.rh_process = None
-
-
-    def run(self):
-        make_hidden = False
-
-        if sys.platform == "win32":
-            rh_path = os.path.join(resource_path("bin"), "rathole.exe")
-        else:
-            rh_path = os.path.join(resource_path("bin"), "rathole")
-
-        path_to_log = script_path(".rathole.log")
-
-        if not os.path.exists(path_to_log) and sys.platform == "win32":
-            make_hidden = True
-
-        with open(path_to_log, "a") as f:
-            if sys.platform == "win32":
-                self.rh_process = subprocess.Popen([rh_path, script_path(".config.toml")],
-                                                stdout=f, stderr=subprocess.STDOUT,
-                                                creationflags=subprocess.CREATE_NO_WINDOW)
-            else:
-                self.rh_process = subprocess.Popen([rh_path, script_path(".config.toml")],
-                                                stdout=f, stderr=subprocess.STDOUT)
-
-        if make_hidden:
-            # making the file hidden in windows
-            ctypes.windll.kernel32.SetFileAttributesW(path_to_log, 0x02)
-
-
-    def stop(self):
-        if self.rh_process:
-            try:
-                self.rh_process.terminate()
-                self.rh_process.wait(timeout=3)
-            except subprocess.TimeoutExpired:
-                self.rh_process.kill()
+local_addr = \"127.0.0.1:8025\"
+"""
 
-            self.rh_process = None
+    with open(path_to_conf, "r+") as file:
+        file.truncate()
+        file.write(config)
 
 
 def save_certificate(subdomain, fullchain, privkey):
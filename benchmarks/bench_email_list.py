@@ -0,0 +1,140 @@
+"""
+Список писем: QListWidget с виджетом на строку против модели с делегатом.
+
+Письма заранее лежат в Mailbox; в окно (без дисплея - QT_QPA_PLATFORM=offscreen)
+они добавляются пачками, как из EmailHandler, и измеряются время вставки
+и прирост RSS. Затем список прокручивается сверху вниз на страницу за шаг,
+время кадра - setValue полосы прокрутки и обработка событий с перерисовкой.
+Каждый вариант запускается в своем процессе.
+
+    python benchmarks/bench_email_list.py --count 10000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import report, rss_mb, synthetic_emails
+
+os.environ.setdefault("QT_PREFERRED_BINDING", "PySide6")
+
+from Qt import QtWidgets, QtCore, QtGui
+
+from app.screens.email_list_model import EmailListModel, EmailItemDelegate
+from app.utils.mailbox import Mailbox
+
+BATCH = 100
+
+
+def add_widget_row(email_list, email, email_id):
+    # EmailInterfaceScreen.add_email_to_list до перехода на модель
+    item = QtWidgets.QListWidgetItem()
+    item_widget = QtWidgets.QWidget()
+
+    item_widget.setStyleSheet("background-color: transparent;")
+    item_layout = QtWidgets.QVBoxLayout(item_widget)
+    item_layout.setContentsMargins(5, 8, 5, 15)
+
+    sender_label = QtWidgets.QLabel(email["sender"])
+    sender_label.setFont(QtGui.QFont('Arial', 10, QtGui.QFont.Bold))
+    sender_label.setStyleSheet("color: #e0e0e0;")
+
+    subject_label = QtWidgets.QLabel(email["subject"])
+    subject_label.setFont(QtGui.QFont('Arial', 9))
+    subject_label.setStyleSheet("color: #cccccc;")
+
+    timestamp_label = QtWidgets.QLabel(email["timestamp"])
+    timestamp_label.setFont(QtGui.QFont('Arial', 8))
+    timestamp_label.setStyleSheet("color: #808080;")
+
+    item_layout.addWidget(sender_label)
+    item_layout.addWidget(subject_label)
+    item_layout.addWidget(timestamp_label)
+
+    item_widget.setFixedHeight(80)
+
+    item.setSizeHint(item_widget.sizeHint())
+    email_list.addItem(item)
+    email_list.setItemWidget(item, item_widget)
+    item.setData(QtCore.Qt.UserRole, email_id)
+
+
+def widgets_view(mailbox):
+    view = QtWidgets.QListWidget()
+
+    def append(emails):
+        for email_id, email in emails:
+            add_widget_row(view, email, email_id)
+
+    return view, append
+
+
+def model_view(mailbox):
+    # как в EmailInterfaceScreen.setup_ui
+    model = EmailListModel(mailbox)
+    model.set_mailbox("bench")
+    view = QtWidgets.QListView()
+    view.setModel(model)
+    view.setItemDelegate(EmailItemDelegate(view))
+    view.setUniformItemSizes(True)
+    return view, model.append_emails
+
+
+def run(variant, count):
+    app = QtWidgets.QApplication([])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mailbox = Mailbox(os.path.join(tmp, "mailbox.db"))
+        view, append = {"widgets": widgets_view, "model": model_view}[variant](mailbox)
+        view.resize(400, 800)
+        view.show()
+        app.processEvents()
+
+        # письма сохраняются до замера: сравнивается только список
+        emails = synthetic_emails(count)
+        for email in emails:
+            email["timestamp"] = "18.10.2026 12:00"
+        rows = list(zip(mailbox.add_many("bench", emails), emails))
+        rss_before = rss_mb()
+
+        start = time.perf_counter()
+        for offset in range(0, count, BATCH):
+            append(rows[offset:offset + BATCH])
+            app.processEvents()
+        inserted = time.perf_counter() - start
+        rss_after = rss_mb()
+
+        scrollbar = view.verticalScrollBar()
+        frames = []
+        for value in range(0, scrollbar.maximum() + 1, scrollbar.pageStep()):
+            start = time.perf_counter()
+            scrollbar.setValue(value)
+            app.processEvents()
+            frames.append(time.perf_counter() - start)
+
+        view.close()
+        mailbox.close()
+
+    print(f"{variant}: вставка {count} писем {inserted:.2f} с, RSS +{rss_after - rss_before:.0f} МБ, "
+          f"строк в виде {view.model().rowCount()}")
+    report(f"{variant}: кадр прокрутки", frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--variant", choices=("widgets", "model"))
+    args = parser.parse_args()
+
+    if args.variant:
+        run(args.variant, args.count)
+        return
+
+    for variant in ("widgets", "model"):
+        subprocess.run([sys.executable, __file__, "--variant", variant, "--count", str(args.count)], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Переключение между письмами: QTextBrowser для простых писем против QWebEngineView для всех.
+
+Корпус - письма с кодами подтверждения в типичных верстках сервисов
+(common.verification_email): текст, пара абзацев html, таблица с
+логотипом и кнопкой, адаптивный шаблон рассылки. Шаг - показ следующего
+письма так же, как в EmailInterfaceScreen.show_prepared, до отрисовки
+кадра (для WebEngine - до loadFinished). Каждый вариант идет в отдельном
+процессе; RSS считается вместе с дочерними процессами Chromium.
+
+    python benchmarks/bench_email_switch.py --count 200
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from common import report, rss_mb, verification_emails
+
+os.environ.setdefault("QT_PREFERRED_BINDING", "PySide6")
+
+from Qt import QtWidgets, QtCore
+
+from app.screens.email_interface_screen import EmailTextBrowser
+from app.utils import email_renderer
+
+VARIANTS = {"tiered": "по уровням", "webengine": "только WebEngine"}
+
+
+def children_rss_mb():
+    # RSS процессов Chromium, запущенных QtWebEngine (только Linux)
+    total = 0
+    for pid in filter(str.isdigit, os.listdir("/proc") if os.path.isdir("/proc") else ()):
+        try:
+            with open(f"/proc/{pid}/stat") as stat:
+                ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+            if ppid == os.getpid():
+                with open(f"/proc/{pid}/statm") as statm:
+                    total += int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            continue
+    return total / 1024 / 1024
+
+
+def run(variant, count):
+    app = QtWidgets.QApplication([])
+    stack = QtWidgets.QStackedWidget()
+    stack.resize(700, 800)
+
+    text_view = EmailTextBrowser()
+    stack.addWidget(text_view)
+    web_view = None
+    missing = None
+    try:
+        from app.screens.web_view import create_web_view
+    except ImportError as e:
+        missing = str(e)
+
+    stack.show()
+    app.processEvents()
+    rss_before = rss_mb()
+
+    samples = {}
+    skipped = Counter()
+    for email in verification_emails(count):
+        complex_ = email_renderer.classify(email["html_content"]) == email_renderer.TIER_COMPLEX
+        if missing and (variant == "webengine" or complex_):
+            skipped[email_renderer.TIER_COMPLEX] += 1
+            continue
+
+        # разбор и очистка html входят в задержку переключения
+        start = time.perf_counter()
+        if variant == "webengine":
+            # прежний путь: любое письмо, даже текст, уходит в setHtml
+            tier = email_renderer.TIER_COMPLEX
+            body = email["html_content"] or email_renderer.text_to_html(email["body"])
+        else:
+            tier, body = email_renderer.prepare(email)
+        document = email_renderer.build_document(tier, body)
+        if tier == email_renderer.TIER_COMPLEX:
+            if web_view is None:
+                web_view = create_web_view()
+                stack.addWidget(web_view)
+            loop = QtCore.QEventLoop()
+            web_view.loadFinished.connect(loop.quit)
+            web_view.setHtml(document)
+            stack.setCurrentWidget(web_view)
+            QtCore.QTimer.singleShot(5000, loop.quit)
+            loop.exec_()
+            web_view.loadFinished.disconnect(loop.quit)
+        else:
+            text_view.setHtml(document)
+            stack.setCurrentWidget(text_view)
+            text_view.viewport().repaint()
+        app.processEvents()
+        samples.setdefault(tier, []).append(time.perf_counter() - start)
+
+    rss_after = rss_mb()
+    chromium = children_rss_mb()
+    name = VARIANTS[variant]
+    shown = sum(len(values) for values in samples.values())
+    print(f"{name}: показано {shown} писем, RSS +{rss_after - rss_before:.1f} МБ "
+          f"(всего {rss_after:.0f} МБ, процессы Chromium {chromium:.0f} МБ)")
+    for tier, values in sorted(samples.items()):
+        report(f"{name}: {tier}", values)
+    if skipped:
+        print(f"{name}: пропущено {dict(skipped)}, QtWebEngine не загружен: {missing}")
+
+    stack.close()
+    # выход без очистки Qt: замер уже напечатан
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--variant", choices=tuple(VARIANTS))
+    args = parser.parse_args()
+
+    if args.variant:
+        run(args.variant, args.count)
+        return
+
+    tiers = Counter(email_renderer.classify(email["html_content"]) for email in verification_emails(args.count))
+    print(f"корпус: {args.count} писем, {dict(tiers)}")
+    for variant in VARIANTS:
+        subprocess.run([sys.executable, __file__, "--variant", variant, "--count", str(args.count)], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Поток писем и отзывчивость интерфейса: пачки EmailSignals против сигнала на письмо.
+
+Фоновый поток отдает --rate писем в секунду в течение --seconds, как
+пул разбора писем. В основном потоке письма сохраняются в Mailbox и
+вставляются в видимый список, как в EmailTunnelApp.addEmails. Таймер
+на 10 мс измеряет задержку цикла событий: насколько позже срабатывает
+очередной тик. Сигнал на письмо - то, как письма доставлялись до пачек.
+
+    python benchmarks/bench_mail_burst.py --rate 500 --seconds 4
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from common import report, synthetic_emails
+
+os.environ.setdefault("QT_PREFERRED_BINDING", "PySide6")
+
+from Qt import QtWidgets, QtCore
+
+from app.screens.email_list_model import EmailListModel, EmailItemDelegate
+from app.utils.mail_server_tls import EmailSignals
+from app.utils.mailbox import Mailbox
+
+TICK_MS = 10
+
+
+class PerEmailSignals(QtCore.QObject):
+    # доставка до EmailSignals: отдельный сигнал на каждое письмо
+    new_emails_received = QtCore.Signal(list)
+
+    def push(self, email_data):
+        self.new_emails_received.emit([email_data])
+
+
+def run(app, signals, emails, rate, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        mailbox = Mailbox(os.path.join(tmp, "mailbox.db"))
+        model = EmailListModel(mailbox)
+        model.set_mailbox("bench")
+        view = QtWidgets.QListView()
+        view.setModel(model)
+        view.setItemDelegate(EmailItemDelegate(view))
+        view.setUniformItemSizes(True)
+        view.resize(400, 800)
+        view.show()
+
+        batches = []
+
+        def add_emails(batch):
+            batches.append(len(batch))
+            model.append_emails(list(zip(mailbox.add_many("bench", batch), batch)))
+
+        signals.new_emails_received.connect(add_emails)
+
+        lags = []
+        last_tick = [time.perf_counter()]
+
+        def tick():
+            now = time.perf_counter()
+            lags.append(max(0.0, now - last_tick[0] - TICK_MS / 1000))
+            last_tick[0] = now
+
+        timer = QtCore.QTimer()
+        timer.timeout.connect(tick)
+        timer.start(TICK_MS)
+
+        total = int(rate * seconds)
+
+        def sender():
+            start = time.perf_counter()
+            for number in range(total):
+                # равномерный поток с заданной частотой
+                delay = start + number / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                signals.push(dict(emails[number % len(emails)]))
+
+        thread = threading.Thread(target=sender, daemon=True)
+        started = time.perf_counter()
+        thread.start()
+        while thread.is_alive() or sum(batches) < total:
+            app.processEvents(QtCore.QEventLoop.AllEvents, 50)
+        elapsed = time.perf_counter() - started
+
+        timer.stop()
+        signals.new_emails_received.disconnect(add_emails)
+        view.close()
+        mailbox.close()
+
+    return lags, len(batches), total, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=int, default=500, help="писем в секунду")
+    parser.add_argument("--seconds", type=float, default=4)
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication([])
+    emails = synthetic_emails(200)
+    for email in emails:
+        email["timestamp"] = "18.10.2026 12:00"
+
+    for name, signals in (("сигнал на письмо", PerEmailSignals()), ("пачки EmailSignals", EmailSignals())):
+        lags, batches, total, elapsed = run(app, signals, emails, args.rate, args.seconds)
+        print(f"{name}: {total} писем за {elapsed:.1f} с, обновлений списка: {batches}")
+        report(f"{name}: задержка цикла", lags)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Разбор писем: прежний путь через email.message_from_string и mime_parser.
+
+Прежний путь декодирует весь конверт в строку, строит полную объектную
+модель письма и обходит ее в поисках тел, как EmailHandler до mime_parser.
+Новый - parse_envelope: только заголовки и тела, вложения уходят на диск
+блоками. Для писем 10 КБ, 1 МБ и 25 МБ (html + вложение) измеряются
+пиковая память (tracemalloc) и писем в секунду.
+
+    python benchmarks/bench_mime_parser.py --repeat 5
+"""
+import argparse
+import email
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from email import policy
+from email.message import EmailMessage
+
+from common import newsletter_html
+
+import app.utils.mime_parser as mime_parser
+from app.utils.blob_store import BlobStore
+
+SIZES = (("10 КБ", 10 * 1024), ("1 МБ", 1024 * 1024), ("25 МБ", 25 * 1024 * 1024))
+
+
+def legacy_parse(content):
+    # EmailHandler.handle_DATA + _get_body до перехода на mime_parser
+    message = email.message_from_string(content.decode("utf-8", errors="replace"), policy=policy.default)
+    html_content = plain_content = None
+
+    for part in message.walk():
+        content_type = part.get_content_type()
+        if content_type == "text/html" and html_content is None:
+            payload = part.get_payload(decode=True)
+            if payload:
+                html_content = payload.decode("utf-8", errors="replace")
+        elif content_type == "text/plain" and plain_content is None:
+            payload = part.get_payload(decode=True)
+            if payload:
+                plain_content = payload.decode("utf-8", errors="replace")
+
+    return message.get("From", ""), html_content, plain_content
+
+
+def build_message(size, seed=1):
+    rng = random.Random(seed)
+    message = EmailMessage()
+    message["From"] = "Сервис <noreply@example.com>"
+    message["To"] = "user@tunnel.email"
+    message["Subject"] = "Ваш код подтверждения"
+    message.set_content("Ваш код: 123456\n")
+    message.add_alternative(newsletter_html(rng, blocks=4), subtype="html")
+
+    # остаток до нужного размера - вложение; base64 увеличивает его на треть
+    remaining = size - len(message.as_bytes())
+    if remaining > 0:
+        message.add_attachment(rng.randbytes(remaining * 3 // 4), maintype="application",
+                               subtype="pdf", filename="invoice.pdf")
+
+    return message.as_bytes(policy=policy.SMTP)
+
+
+def measure(parse, content, repeat):
+    tracemalloc.start()
+    parse(content)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(content)
+    elapsed = time.perf_counter() - start
+
+    return peak, repeat / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlobStore(os.path.join(tmp, "blobs"))
+        mime_parser.get_blob_store = lambda: store
+
+        def streaming_parse(content):
+            return mime_parser.parse_envelope(content, "noreply@example.com", ["user@tunnel.email"])
+
+        print(f"{'письмо':<8} {'путь':<22} {'пик памяти':>12} {'писем/с':>10}")
+        for name, size in SIZES:
+            content = build_message(size)
+            # мелкие письма повторяются чаще, чтобы время было измеримым
+            repeat = args.repeat * max(1, 1024 * 1024 // size)
+
+            for label, parse in (("message_from_string", legacy_parse), ("mime_parser", streaming_parse)):
+                peak, rate = measure(parse, content, repeat)
+                print(f"{name:<8} {label:<22} {peak / 1024 / 1024:9.2f} МБ {rate:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Переключение между письмами с кэшем подготовленных писем и без него.
+
+Письма лежат в настоящем хранилище Mailbox; шаг - переход на следующее
+письмо стрелкой с паузой --dwell между нажатиями. Без кэша каждое
+переключение читает письмо и заново классифицирует и очищает html, с
+кэшем соседние письма готовятся в фоне, пока пользователь читает текущее.
+
+    python benchmarks/bench_render_cache.py --count 300 --dwell 0.05
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import report, synthetic_emails
+
+from app.config.constants import RENDER_PREFETCH_NEIGHBORS
+from app.utils.mailbox import Mailbox
+from app.utils.render_cache import RenderCache, prepare_email
+
+
+def walk(email_ids, open_email, dwell):
+    samples = []
+    for email_id in email_ids:
+        start = time.perf_counter()
+        open_email(email_id)
+        samples.append(time.perf_counter() - start)
+        time.sleep(dwell)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=300)
+    parser.add_argument("--dwell", type=float, default=0.05, help="пауза между переключениями, с")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mailbox = Mailbox(os.path.join(tmp, "mailbox.db"))
+        email_ids = mailbox.add_many("bench", synthetic_emails(args.count))
+
+        uncached = walk(email_ids, lambda email_id: prepare_email(mailbox.get_email(email_id)), args.dwell)
+
+        cache = RenderCache(mailbox.get_email)
+
+        def open_cached(email_id):
+            cache.get(email_id)
+            # так же, как prefetch_neighbors в интерфейсе
+            row = email_ids.index(email_id)
+            cache.prefetch(email_ids[max(0, row - RENDER_PREFETCH_NEIGHBORS):row + RENDER_PREFETCH_NEIGHBORS + 1])
+
+        cached = walk(email_ids, open_cached, args.dwell)
+        revisit = walk(email_ids[-cache.max_size:], cache.get, 0)
+
+        cache_bytes = sum(len(prepared.document) for prepared in cache._entries.values())
+        cache.close()
+        mailbox.close()
+
+    print(f"писем: {args.count}, пауза между переключениями {args.dwell * 1000:.0f} мс")
+    report("без кэша", uncached)
+    report("кэш + подготовка соседей", cached)
+    report("повторный просмотр из кэша", revisit)
+    print(f"документов в кэше: {len(revisit)}, ~{cache_bytes / 1024:.0f} КБ текста")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Поиск по хранилищу писем: стоимость индекса, фоновая индексация и запросы.
+
+Ящик заполняется синтетическими письмами от сервисов (коды подтверждения
+и рассылки со случайным текстом). Затем индекс удаляется, как в хранилище
+из версии без поиска, и измеряется, сколько Mailbox() блокирует запуск,
+сколько идет фоновая индексация и как долго интерфейс ждет хранилище
+(страница заголовков и сохранение нового письма), пока она идет.
+В конце - задержка первой страницы для типичных запросов.
+
+    python benchmarks/bench_search.py --count 100000
+"""
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from common import report
+
+from app.utils.mailbox import Mailbox
+
+SERVICES = ("github", "google", "amazon", "telegram", "steam", "discord", "apple", "yandex", "openai", "twitch")
+
+
+def corpus(count, seed=1):
+    rng = random.Random(seed)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9)))
+             for _ in range(5000)]
+
+    for i in range(count):
+        service = rng.choice(SERVICES)
+        text = " ".join(rng.choices(words, k=40))
+        if i % 2:
+            yield {"sender": f"noreply@{service}.com", "sender_name": service.title(),
+                   "subject": f"Your {service} verification code {rng.randint(100000, 999999)}",
+                   "plain_content": f"Hello, your code is {rng.randint(100000, 999999)}. {text}"}
+        else:
+            yield {"sender": f"news@{service}.com", "subject": f"{service} newsletter",
+                   "html_content": f"<style>p{{color:red}}</style><p>Привет, <b>{text}</b></p>"}
+
+
+def fill(mailbox, count, batch=1000):
+    emails = corpus(count)
+    start = time.perf_counter()
+    while chunk := list(itertools.islice(emails, batch)):
+        mailbox.add_many("bench", chunk)
+    return time.perf_counter() - start
+
+
+def drop_index(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("DROP TRIGGER emails_fts_delete; DROP TABLE emails_fts; DROP TABLE fts_backfill;")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=30, help="повторов каждого запроса")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "mailbox.db")
+
+        mailbox = Mailbox(path)
+        with_index = fill(mailbox, args.count)
+        mailbox.close()
+        size = os.path.getsize(path)
+
+        drop_index(path)
+        plain = os.path.join(tmp, "plain.db")
+        mailbox = Mailbox(plain)
+        # то же сохранение, но без записи в индекс
+        mailbox.fts = False
+        without_index = fill(mailbox, args.count)
+        mailbox.close()
+
+        print(f"писем: {args.count}")
+        print(f"сохранение с индексом    {with_index / args.count * 1e6:6.0f} мкс/письмо")
+        print(f"сохранение без индекса   {without_index / args.count * 1e6:6.0f} мкс/письмо")
+
+        # запуск на хранилище без индекса
+        start = time.perf_counter()
+        mailbox = Mailbox(path)
+        opened = time.perf_counter() - start
+
+        # так интерфейс ждет хранилище, пока идет индексация
+        indexing_start = time.perf_counter()
+        incoming = corpus(args.count, seed=2)
+        reads, writes = [], []
+        while mailbox.fts_indexing:
+            start = time.perf_counter()
+            mailbox.headers("bench", 0, 50)
+            reads.append(time.perf_counter() - start)
+
+            if len(reads) % 10 == 0:
+                start = time.perf_counter()
+                mailbox.add("bench", next(incoming))
+                writes.append(time.perf_counter() - start)
+            time.sleep(0.016)
+        mailbox._backfill.join()
+        backfill = time.perf_counter() - indexing_start
+
+        print(f"Mailbox() до готовности  {opened * 1000:6.1f} мс")
+        print(f"фоновая индексация       {backfill:6.1f} с")
+        if writes:
+            report("заголовки во время индексации", reads)
+            report("новое письмо во время индексации", writes)
+        print(f"размер базы с индексом   {size / 1024 / 1024:6.0f} МБ")
+
+        for query in ("github", "git", "verification code", "news twitch", "newsl twitch",
+                      "telegram 1234", "привет", "zzzz"):
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                mailbox.search("bench", query, 0, 200)
+                samples.append(time.perf_counter() - start)
+            report(f"поиск {query!r}", samples)
+
+        mailbox.close()
+
+
+if __name__ == "__main__":
+    main()
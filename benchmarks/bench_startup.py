@@ -0,0 +1,160 @@
+"""
+Запуск приложения: время до первого окна и RSS, холодный и теплый старт.
+
+Каждый запуск - отдельный процесс, который проходит шаги main.main()
+и завершается, как только окно показано и цикл событий обработал первый
+кадр. Время считается от запуска интерпретатора. Холодный старт - с
+пустым кэшем байткода (и сброшенным страничным кэшем ОС, если хватает
+прав), теплый - повторные запуски. "Все экраны" воспроизводит прежний
+запуск: после создания окна строятся все шесть экранов и QtWebEngine.
+
+С --importtime вывод python -X importtime для теплого запуска
+сохраняется в benchmarks/importtime.txt, а самые долгие импорты
+печатаются.
+
+    python benchmarks/bench_startup.py --runs 5 --importtime
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import percentiles, rss_mb
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTTIME = os.path.join(ROOT, "benchmarks", "importtime.txt")
+SCREENS = ("welcome_screen", "auth_screen", "dev_token_screen",
+           "email_main_screen", "email_interface_screen", "loading_screen")
+
+
+def child(eager):
+    # шаги main.main() до показа окна
+    os.environ["QT_PREFERRED_BINDING"] = "PySide6"
+    from Qt import QtWidgets, QtCore
+    from app.app import EmailTunnelApp
+    from app.utils.styles import apply_global_styles
+
+    QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_ShareOpenGLContexts)
+    app = QtWidgets.QApplication([])
+    app.setStyle("Fusion")
+    apply_global_styles(app)
+
+    window = EmailTunnelApp()
+    missing = None
+    if eager:
+        for name in SCREENS:
+            getattr(window, name)
+        try:
+            window.email_interface_screen.email_content
+        except ImportError as e:
+            missing = str(e)
+    window.show()
+
+    def first_frame():
+        print(f"READY {rss_mb():.1f} {missing or ''}", flush=True)
+        app.quit()
+
+    QtCore.QTimer.singleShot(0, first_frame)
+    app.exec_()
+    # окно закрывается без очистки: интересен только запуск
+    os._exit(0)
+
+
+def launch(eager, env, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += [os.path.abspath(__file__), "--child"] + (["--eager"] if eager else [])
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, text=True,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE if importtime else subprocess.DEVNULL)
+    ready = None
+    for line in process.stdout:
+        if line.startswith("READY"):
+            ready = time.perf_counter() - start
+            _, rss, *missing = line.split(" ", 2)
+            break
+    stderr = process.stderr.read() if importtime else ""
+    process.wait()
+    if ready is None:
+        raise RuntimeError(f"окно не показано, код {process.returncode}")
+
+    return ready, float(rss), (missing[0].strip() if missing else ""), stderr
+
+
+def drop_page_cache():
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as file:
+            file.write("3")
+        return True
+    except OSError:
+        return False
+
+
+def top_imports(output, count=15):
+    # "import time: self [us] | cumulative | imported package"
+    rows = []
+    for line in output.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="теплых запусков")
+    parser.add_argument("--importtime", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--eager", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.eager)
+
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    variants = (("по требованию", False), ("все экраны", True))
+
+    cold = {}
+    for name, eager in variants:
+        with tempfile.TemporaryDirectory() as pycache:
+            env["PYTHONPYCACHEPREFIX"] = pycache
+            dropped = drop_page_cache()
+            cold[name] = launch(eager, env)
+
+    # теплые запуски чередуются, чтобы фоновая нагрузка делилась поровну
+    warm = {name: [] for name, _ in variants}
+    with tempfile.TemporaryDirectory() as pycache:
+        env["PYTHONPYCACHEPREFIX"] = pycache
+        launch(False, env)
+        for _ in range(args.runs):
+            for name, eager in variants:
+                warm[name].append(launch(eager, env))
+        if args.importtime:
+            *_, output = launch(False, env, importtime=True)
+
+    for name, _ in variants:
+        ready, rss, missing, _ = cold[name]
+        median, p95, _ = percentiles([ready for ready, *_ in warm[name]])
+        print(f"{name}: холодный {ready * 1000:.0f} мс, RSS {rss:.1f} МБ"
+              f"{'' if dropped else ' (страничный кэш ОС не сброшен)'}")
+        print(f"{name}: теплый медиана {median:.0f} мс, p95 {p95:.0f} мс, "
+              f"RSS {statistics.median(rss for _, rss, *_ in warm[name]):.1f} МБ")
+        if missing:
+            print(f"{name}: QtWebEngine не загружен: {missing}")
+
+    if args.importtime:
+        with open(IMPORTTIME, "w") as file:
+            file.write(output)
+        print(f"\n-X importtime записан в {os.path.relpath(IMPORTTIME, ROOT)}; самые долгие импорты:")
+        for cumulative, package in top_imports(output):
+            print(f"{cumulative / 1000:8.1f} мс  {package}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+Ключи RSA и ECDSA: время генерации и рукопожатия STARTTLS с почтовым сервером.
+
+Для каждого типа ключа из key_pool генерируется --keys ключей, затем
+почтовый сервер приложения поднимается с сертификатом на этом ключе, и
+клиент --handshakes раз подряд подключается с STARTTLS без возобновления
+сессии. Рукопожатий в секунду считается по полным SMTP-сессиям.
+
+    python benchmarks/bench_tls_keys.py --keys 10 --handshakes 200
+"""
+import argparse
+import tempfile
+import time
+
+from common import percentiles
+from smtp_tls import client_context, mail_server, starttls
+
+from app.utils.key_pool import generate_private_key
+
+KEY_TYPES = ("rsa", "ec-p256", "ec-p384")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keys", type=int, default=10)
+    parser.add_argument("--handshakes", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'ключ':<8} {'генерация, мс':>22} {'рукопожатие, мс':>22} {'сессий/с':>10}")
+    for key_type in KEY_TYPES:
+        keygen = []
+        for _ in range(args.keys):
+            start = time.perf_counter()
+            generate_private_key(key_type)
+            keygen.append(time.perf_counter() - start)
+
+        with tempfile.TemporaryDirectory() as tmp, mail_server(tmp, key_type) as (port, fullchain, _):
+            context = client_context(fullchain)
+            handshakes = []
+            start = time.perf_counter()
+            for _ in range(args.handshakes):
+                handshakes.append(starttls(port, context)[0])
+            rate = args.handshakes / (time.perf_counter() - start)
+
+        keygen_median, keygen_p95, _ = percentiles(keygen)
+        handshake_median, handshake_p95, _ = percentiles(handshakes)
+        print(f"{key_type:<8} {keygen_median:9.2f} (p95 {keygen_p95:6.2f}) "
+              f"{handshake_median:9.2f} (p95 {handshake_p95:6.2f}) {rate:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Возобновление TLS-сессий на STARTTLS: полные рукопожатия против тикетов.
+
+Клиент smtplib --connections раз подряд переподключается к почтовому
+серверу приложения: сначала каждый раз с полным рукопожатием, затем
+передавая сессию прошлого подключения. Для TLS 1.3 и 1.2 печатаются
+время рукопожатия на клиенте, доля возобновленных сессий и счетчики
+tls.handshake.* из метрик сервера. В конце ключи тикетов ротируются,
+и проверяется, что старый тикет больше не принимается.
+
+    python benchmarks/bench_tls_resumption.py --connections 200
+"""
+import argparse
+import ssl
+import tempfile
+
+from common import report
+from smtp_tls import client_context, mail_server, starttls
+
+from app.utils.metrics import metrics
+
+VERSIONS = (("TLS 1.3", ssl.TLSVersion.TLSv1_3), ("TLS 1.2", ssl.TLSVersion.TLSv1_2))
+
+
+def server_handshakes():
+    snapshot = metrics.snapshot()
+    return {kind: (snapshot["counters"].get(f"tls.handshake.{kind}", 0),
+                   snapshot["timings"].get(f"tls.handshake.{kind}", {}).get("total", 0.0))
+            for kind in ("full", "resumed")}
+
+
+def reconnect_loop(port, context, connections, resume):
+    handshakes = []
+    reused = 0
+    session = None
+    before = server_handshakes()
+
+    for _ in range(connections):
+        handshake, new_session, was_reused = starttls(port, context, session if resume else None)
+        handshakes.append(handshake)
+        reused += was_reused
+        session = new_session
+
+    after = server_handshakes()
+    server = {}
+    for kind in ("full", "resumed"):
+        count = after[kind][0] - before[kind][0]
+        total = after[kind][1] - before[kind][1]
+        server[kind] = (count, total / count * 1000 if count else 0.0)
+
+    return handshakes, reused, server, session
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--connections", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, mail_server(tmp) as (port, fullchain, controller):
+        for name, version in VERSIONS:
+            context = client_context(fullchain)
+            context.minimum_version = context.maximum_version = version
+
+            for label, resume in (("полное", False), ("с тикетом", True)):
+                handshakes, reused, server, session = reconnect_loop(port, context, args.connections, resume)
+                report(f"{name} {label}", handshakes)
+                print(f"    возобновлено {reused}/{args.connections}; сервер: "
+                      f"полных {server['full'][0]} (сред. {server['full'][1]:.2f} мс), "
+                      f"возобновленных {server['resumed'][0]} (сред. {server['resumed'][1]:.2f} мс)")
+
+            controller.tls.rotate()
+            _, _, reused = starttls(port, context, session)
+            print(f"    после ротации ключей тикетов старая сессия возобновлена: {'да' if reused else 'нет'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Транспорт туннеля: клиент rathole в приложении против внешнего бинарника.
+
+Локальный сервер протокола rathole (tests/fake_rathole.py) принимает
+клиентов туннеля и внешних отправителей. Установка соединения - время
+от запуска клиента до принятого сервером control channel, --setups раз.
+Задержка письма - полная SMTP-сессия с STARTTLS через туннель, --messages
+раз; для сравнения та же сессия напрямую на порт почтового сервера.
+Внешний rathole берется из bin/ (download_rathole.py); если его нет,
+строки для него пропускаются.
+
+    python benchmarks/bench_tunnel_transport.py --setups 20 --messages 200
+"""
+import argparse
+import os
+import smtplib
+import subprocess
+import tempfile
+import threading
+import time
+
+from common import report
+from smtp_tls import DOMAIN, client_context, mail_server
+
+from app.utils.rathole import rathole_binary
+from app.utils.rathole_client import InProcessTunnel
+from tests.fake_rathole import FakeRatholeServer
+
+SERVICES = {"bench": "bench-secret"}
+
+
+class Signal:
+    def emit(self, value):
+        pass
+
+
+class Signals:
+    state_changed = Signal()
+    reconnected = Signal()
+
+
+class InProcess:
+    name = "в приложении"
+
+    def __init__(self, controller, port, server):
+        self.controller = controller
+        self.server = server
+
+    def start(self):
+        self.tunnel = InProcessTunnel(self.controller, SERVICES, signals=Signals(),
+                                      remote_addr=("127.0.0.1", self.server.tunnel_port))
+        self.thread = threading.Thread(target=self.tunnel.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.tunnel.stop()
+        self.thread.join(timeout=5)
+
+
+class External:
+    name = "внешний rathole"
+
+    def __init__(self, controller, port, server):
+        # тот же конфиг, что пишет add_tunnel_to_rathole, но с локальным сервером
+        self.config = os.path.join(tempfile.mkdtemp(), "config.toml")
+        with open(self.config, "w") as file:
+            file.write(f'[client]\nremote_addr = "127.0.0.1:{server.tunnel_port}"\n')
+            for name, token in SERVICES.items():
+                file.write(f'\n[client.services.{name}]\ntoken = "{token}"\nlocal_addr = "127.0.0.1:{port}"\n')
+
+    def start(self):
+        self.process = subprocess.Popen([rathole_binary(), self.config],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=5)
+
+
+def smtp_session(port, context):
+    start = time.perf_counter()
+    with smtplib.SMTP("127.0.0.1", port, timeout=10) as client:
+        client._host = DOMAIN
+        client.starttls(context=context)
+        client.sendmail("sender@example.com", [f"user@{DOMAIN}"], "Subject: code\r\n\r\n123456\r\n")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--setups", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, mail_server(tmp) as (port, fullchain, controller):
+        context = client_context(fullchain)
+        report("напрямую: письмо", [smtp_session(port, context) for _ in range(args.messages)])
+
+        for transport in (InProcess, External):
+            if transport is External and not os.path.exists(rathole_binary()):
+                print(f"{transport.name}: {rathole_binary()} не найден, пропущено")
+                continue
+
+            with FakeRatholeServer(SERVICES, heartbeat=1) as server:
+                client = transport(controller, port, server)
+
+                setups = []
+                for _ in range(args.setups):
+                    start = time.perf_counter()
+                    client.start()
+                    if not server.authenticated.wait(10):
+                        raise RuntimeError(f"{transport.name}: control channel не установлен")
+                    setups.append(time.perf_counter() - start)
+                    client.stop()
+                    server.drop_controls()
+
+                client.start()
+                server.authenticated.wait(10)
+                messages = [smtp_session(server.visitor_port, context) for _ in range(args.messages)]
+                client.stop()
+
+            report(f"{transport.name}: установка", setups)
+            report(f"{transport.name}: письмо", messages)
+
+
+if __name__ == "__main__":
+    main()
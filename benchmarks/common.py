@@ -0,0 +1,153 @@
+import ctypes
+import os
+import random
+import statistics
+import sys
+
+# скрипты запускаются из корня репозитория: python benchmarks/<имя>.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ("код подтверждения заказ доставка newsletter invoice verification account "
+         "twitch steam github security password reset welcome offer news weekly").split()
+
+
+def sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def newsletter_html(rng, blocks=40):
+    # верстка рассылки: вложенные таблицы, стили, картинки
+    rows = "".join(
+        f'<tr><td style="padding:8px;color:#333"><h2>{sentence(rng, 4)}</h2>'
+        f'<p style="font-size:14px">{sentence(rng, 40)}</p>'
+        f'<img src="https://cdn.example.com/{i}.png" width="600"></td></tr>'
+        for i in range(blocks)
+    )
+    return (f"<html><head><style>@media (max-width:600px){{td{{display:block}}}}</style></head>"
+            f'<body><table width="100%"><tr><td><table width="600">{rows}</table></td></tr></table></body></html>')
+
+
+def simple_html(rng):
+    return f"<p>{sentence(rng)}</p><p>Ваш код: <b>{rng.randint(100000, 999999)}</b></p>"
+
+
+def synthetic_email(rng, kind=None):
+    kind = kind or rng.choice(("text", "simple", "complex"))
+    text = sentence(rng, 60)
+    html = {"text": None, "simple": simple_html(rng), "complex": newsletter_html(rng)}[kind]
+
+    return {
+        "sender": f"{rng.choice(WORDS)}@example.com",
+        "sender_name": rng.choice(WORDS).title(),
+        "subject": sentence(rng, 5),
+        "body": html or text,
+        "html_content": html,
+        "plain_content": text,
+        "attachments": [],
+    }
+
+
+def synthetic_emails(count, seed=1):
+    rng = random.Random(seed)
+    return [synthetic_email(rng) for _ in range(count)]
+
+
+SERVICES = ("GitHub", "Steam", "Twitch", "Discord", "Госуслуги", "Ozon", "Notion", "Reddit")
+
+
+def verification_email(rng, kind=None):
+    """
+    Письмо с кодом подтверждения в одной из типичных версток сервисов.
+
+    text - только текст; simple - пара абзацев html; transactional -
+    таблица с логотипом, кнопкой и пикселем отслеживания, как у большинства
+    сервисов; responsive - адаптивный шаблон рассылки с @media, баннером и
+    иконками соцсетей.
+    """
+    kind = kind or rng.choices(("text", "simple", "transactional", "responsive"), (25, 25, 30, 20))[0]
+    service = rng.choice(SERVICES)
+    code = rng.randint(100000, 999999)
+    link = f"https://{service.lower()}.example.com/verify?token={rng.getrandbits(128):032x}"
+    text = (f"Здравствуйте!\n\nВаш код подтверждения {service}: {code}\n"
+            f"Код действует 10 минут. Подтвердить можно и по ссылке: {link}\n\n"
+            f"Если вы не запрашивали код, просто проигнорируйте это письмо.\n\n-- \nКоманда {service}")
+
+    if kind == "text":
+        html = None
+    elif kind == "simple":
+        html = (f"<p>Здравствуйте!</p><p>Ваш код подтверждения {service}: <b>{code}</b></p>"
+                f'<p>Или перейдите по <a href="{link}">ссылке</a>. Код действует 10 минут.</p>'
+                f"<p>Если вы не запрашивали код, проигнорируйте письмо.</p>")
+    elif kind == "transactional":
+        html = (f'<table width="100%" cellpadding="0" cellspacing="0" bgcolor="#f6f8fa"><tr><td align="center">'
+                f'<table width="544" style="border:1px solid #d0d7de;font-family:Arial;color:#24292f">'
+                f'<tr><td align="center"><img src="https://{service.lower()}.example.com/logo.png" '
+                f'alt="{service}" width="48" height="48"></td></tr>'
+                f'<tr><td style="font-size:24px;padding:16px">Подтвердите адрес почты</td></tr>'
+                f'<tr><td style="font-size:14px">{sentence(rng, 30)}</td></tr>'
+                f'<tr><td style="font-size:32px;font-weight:bold;letter-spacing:8px">{code}</td></tr>'
+                f'<tr><td><a href="{link}" style="background-color:#2da44e;color:#ffffff;padding:12px 20px;'
+                f'border-radius:6px;text-decoration:none">Подтвердить</a></td></tr>'
+                f'<tr><td style="font-size:12px;color:#57606a">{sentence(rng, 20)}</td></tr>'
+                f'</table></td></tr></table>'
+                f'<img src="https://t.{service.lower()}.example.com/open.gif" width="1" height="1">')
+    else:
+        icons = "".join(f'<a href="https://social.example.com/{name}"><img src="https://cdn.example.com/{name}.png" '
+                        f'alt="{name}" width="24"></a>' for name in ("vk", "tg", "yt", "x"))
+        html = (f"<html><head><style>body{{margin:0}}.wrap{{max-width:600px}}"
+                f"@media (max-width:600px){{.col{{display:block!important;width:100%!important}}}}</style></head>"
+                f'<body><table width="100%" bgcolor="#0e0e10"><tr><td><table class="wrap" align="center">'
+                f'<tr><td><img src="https://cdn.example.com/{service.lower()}/hero.jpg" width="600" alt=""></td></tr>'
+                f'<tr><td class="col" style="color:#efeff1;font-size:16px"><h1>Ваш код: {code}</h1>'
+                f"<p>{sentence(rng, 40)}</p></td></tr>"
+                f'<tr><td><a href="{link}" style="background:#9147ff;color:#fff;padding:14px 28px">Подтвердить</a>'
+                f"</td></tr><tr><td>{icons}</td></tr>"
+                f'<tr><td style="font-size:11px;color:#adadb8">{sentence(rng, 60)}</td></tr>'
+                f"</table></td></tr></table></body></html>")
+
+    return {
+        "sender": f"noreply@{service.lower()}.example.com",
+        "sender_name": service,
+        "subject": f"{code} - ваш код подтверждения {service}",
+        "body": html or text,
+        "html_content": html,
+        "plain_content": text,
+        "attachments": [],
+    }
+
+
+def verification_emails(count, seed=1):
+    rng = random.Random(seed)
+    return [verification_email(rng) for _ in range(count)]
+
+
+def percentiles(samples):
+    # (медиана, p95, максимум) в миллисекундах
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return statistics.median(ordered) * 1000, p95 * 1000, ordered[-1] * 1000
+
+
+def report(name, samples):
+    median, p95, worst = percentiles(samples)
+    print(f"{name:<32} медиана {median:8.2f} мс   p95 {p95:8.2f} мс   макс {worst:8.2f} мс")
+
+
+def rss_mb():
+    # текущий RSS процесса, без psutil
+    if sys.platform == "win32":
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")
+            ]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.WorkingSetSize / 1024 / 1024
+
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
@@ -0,0 +1,81 @@
+import contextlib
+import os
+import smtplib
+import socket
+import ssl
+import time
+
+import app.utils.mail_server_tls as mail_server_tls
+from app.utils.key_pool import generate_private_key
+from app.utils.mail_spool import MailSpool
+from tests.certs import key_pem, make_certificate
+
+DOMAIN = "box.tunnel.test"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def mail_server(tmp, key_type="ec-p256"):
+    # почтовый сервер приложения с сертификатом на DOMAIN; отдает (порт, fullchain, controller)
+    certs_path = os.path.join(tmp, "certs", DOMAIN)
+    os.makedirs(certs_path)
+
+    key = generate_private_key(key_type)
+    fullchain = make_certificate(key, DOMAIN)
+    with open(os.path.join(certs_path, "fullchain.pem"), "wb") as file:
+        file.write(fullchain)
+    with open(os.path.join(certs_path, "privkey.pem"), "wb") as file:
+        file.write(key_pem(key))
+
+    mail_server_tls.get_mail_spool = lambda: MailSpool(os.path.join(tmp, "spool"))
+    mail_server_tls.email_signals.push = lambda email_data: None
+
+    port = free_port()
+    controller, _ = mail_server_tls.start(certs_path, port=port)
+
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+    try:
+        yield port, fullchain, controller
+    finally:
+        controller.stop()
+
+
+def client_context(fullchain):
+    return ssl.create_default_context(cadata=fullchain.decode())
+
+
+def starttls(port, context, session=None):
+    """
+    Одна SMTP-сессия с STARTTLS, как у пересылающего MTA.
+
+    Возвращает (время рукопожатия в секундах, TLS-сессию, возобновлена ли).
+    session - сессия прошлого подключения для возобновления по тикету.
+    """
+    with smtplib.SMTP("127.0.0.1", port, timeout=10) as client:
+        client.ehlo("mx.example.com")
+        code, _ = client.docmd("STARTTLS")
+        if code != 220:
+            raise smtplib.SMTPResponseException(code, "STARTTLS отклонен")
+
+        start = time.perf_counter()
+        client.sock = context.wrap_socket(client.sock, server_hostname=DOMAIN, session=session)
+        handshake = time.perf_counter() - start
+
+        client.file = None
+        client.ehlo("mx.example.com")
+        # тикет TLS 1.3 приходит после рукопожатия - сессию берем после обмена командами
+        return handshake, client.sock.session, client.sock.session_reused
@@ -3,7 +3,8 @@ os.environ['QT_PREFERRED_BINDING'] = 'PySide6' # pyside6 backend
 
 import sys
 import traceback
-from Qt import QtWidgets
+import multiprocessing
+from Qt import QtWidgets, QtCore
 from app.app import EmailTunnelApp
 from app.utils.logger import setup_logger
 
@@ -26,6 +27,9 @@ def excepthook(exc_type, exc_value, exc_tb):
 def main():
     logger.info("Запуск приложения")
     try:
+        # QtWebEngine импортируется только при показе первого письма,
+        # а это требуется сделать до создания QApplication
+        QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_ShareOpenGLContexts)
         app = QtWidgets.QApplication(sys.argv)
         app.setStyle("Fusion")
         
@@ -45,4 +49,6 @@ def main():
         return 1
 
 if __name__ == "__main__":
+    # нужно для пула процессов разбора писем в собранном приложении
+    multiprocessing.freeze_support()
     sys.exit(main())
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta, timezone
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+
+def make_key():
+    return ec.generate_private_key(ec.SECP256R1())
+
+
+def key_pem(key):
+    return key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                             serialization.NoEncryption())
+
+
+def make_certificate(key, domain, days=90, not_before_days=-1):
+    # самоподписанный сертификат с SAN на domain
+    now = datetime.now(timezone.utc)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, domain)])
+    cert = (x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now + timedelta(days=not_before_days))
+            .not_valid_after(now + timedelta(days=days))
+            .add_extension(x509.SubjectAlternativeName([x509.DNSName(domain)]), critical=False)
+            .sign(key, hashes.SHA256()))
+    return cert.public_bytes(serialization.Encoding.PEM)
+
+
+def write_certificate(path, domain, **kwargs):
+    # fullchain.pem и privkey.pem в path, как в .certs/<домен>
+    key = make_key()
+    fullchain = make_certificate(key, domain, **kwargs)
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "fullchain.pem").write_bytes(fullchain)
+    (path / "privkey.pem").write_bytes(key_pem(key))
+    return fullchain
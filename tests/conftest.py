@@ -0,0 +1,50 @@
+import os
+import socket
+import sys
+import time
+
+# тесты запускаются без дисплея; Qt.py должен выбрать PySide6, как и main.py
+os.environ.setdefault("QT_PREFERRED_BINDING", "PySide6")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    from Qt import QtWidgets
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def listener(tmp_path, free_port, monkeypatch):
+    # сервер поднимается так же, как в приложении, но без сертификата
+    import app.utils.mail_server_tls as mail_server_tls
+    from app.utils.mail_spool import MailSpool
+
+    monkeypatch.setattr(mail_server_tls, "get_mail_spool", lambda: MailSpool(str(tmp_path / "spool")))
+    monkeypatch.setattr(mail_server_tls.email_signals, "push", lambda email_data: None)
+
+    controller, _ = mail_server_tls.start(port=free_port)
+
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", free_port), timeout=1).close()
+            break
+        except OSError:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+
+    yield controller
+
+    controller.stop()
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import queue
+import socket
+import struct
+import threading
+
+
+def u32(value):
+    return struct.pack("<I", value)
+
+
+def recv_exactly(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("соединение закрыто")
+        data += chunk
+    return data
+
+
+class FakeRatholeServer:
+    """
+    Сервер протокола rathole для тестов и бенчмарков (только TCP-транспорт).
+
+    Клиенты туннеля подключаются к tunnel_port, внешние отправители -
+    к visitor_port: на каждое такое соединение серверу по control channel
+    нужен новый data channel, после чего байты копируются в обе стороны.
+    services - {service_name: token}; heartbeat - интервал в секундах,
+    None отключает heartbeat; version - версия протокола в ответном hello.
+    """
+    def __init__(self, services, heartbeat=0.2, version=0):
+        self.services = dict(services)
+        self.heartbeat = heartbeat
+        self.version = version
+
+        # service_name -> control-сокет и ключ сессии
+        self.controls = {}
+        self.data_channels = queue.Queue()
+        self.authenticated = threading.Event()
+        self.rejected = []
+
+        self._closed = threading.Event()
+        self._sockets = set()
+        self._lock = threading.Lock()
+
+        self.tunnel = self._listen()
+        self.visitors = self._listen()
+        self.tunnel_port = self.tunnel.getsockname()[1]
+        self.visitor_port = self.visitors.getsockname()[1]
+
+    def _listen(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(64)
+        return sock
+
+    def __enter__(self):
+        self._spawn(self._accept, self.tunnel, self._client)
+        self._spawn(self._accept, self.visitors, self._visitor)
+        return self
+
+    def __exit__(self, *exc):
+        self._closed.set()
+        for sock in (self.tunnel, self.visitors):
+            sock.close()
+        with self._lock:
+            sockets = list(self._sockets)
+        for sock in sockets:
+            self._close(sock)
+
+    def drop_controls(self):
+        # обрыв связи с сервером: клиент должен переподключиться
+        self.authenticated.clear()
+        for control, _ in list(self.controls.values()):
+            self._close(control)
+        self.controls.clear()
+
+    def _spawn(self, target, *args):
+        threading.Thread(target=target, args=args, daemon=True).start()
+
+    def _track(self, sock):
+        with self._lock:
+            self._sockets.add(sock)
+        return sock
+
+    def _close(self, sock):
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+    def _accept(self, listener, handle):
+        while not self._closed.is_set():
+            try:
+                sock, _ = listener.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._spawn(handle, self._track(sock))
+
+    def _client(self, sock):
+        try:
+            hello = recv_exactly(sock, 37)
+            kind, _ = struct.unpack("<IB", hello[:5])
+            if kind == 1:
+                self.data_channels.put((hello[5:], sock))
+                return
+
+            names = {hashlib.sha256(name.encode()).digest(): name for name in self.services}
+            name = names.get(hello[5:])
+            if name is None:
+                self.rejected.append("service")
+                sock.sendall(u32(1))
+                return self._close(sock)
+
+            nonce = os.urandom(32)
+            sock.sendall(struct.pack("<IB", 0, self.version) + nonce)
+            session_key = recv_exactly(sock, 32)
+            if session_key != hashlib.sha256(self.services[name].encode() + nonce).digest():
+                self.rejected.append("token")
+                sock.sendall(u32(2))
+                return self._close(sock)
+
+            sock.sendall(u32(0))
+            self.controls[name] = (sock, session_key)
+            self.authenticated.set()
+
+            while self.heartbeat is not None and not self._closed.wait(self.heartbeat):
+                sock.sendall(u32(1))
+        except OSError:
+            pass
+
+    def _visitor(self, visitor):
+        try:
+            # как в rathole: одно входящее соединение - один новый data channel
+            control, session_key = next(iter(self.controls.values()))
+            control.sendall(u32(0))
+            key, channel = self.data_channels.get(timeout=10)
+            assert key == session_key
+            channel.sendall(u32(0))
+        except (OSError, StopIteration, queue.Empty):
+            return self._close(visitor)
+
+        self._spawn(self._pipe, channel, visitor)
+        self._pipe(visitor, channel)
+
+    def _pipe(self, source, target):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                target.sendall(data)
+        except OSError:
+            pass
+        finally:
+            self._close(target)
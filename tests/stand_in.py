@@ -0,0 +1,57 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInServer:
+    """
+    Локальный HTTP-сервер для тестов: каждый запрос отдается функции
+    respond(handler), которая сама пишет статус, заголовки и тело.
+    connect_delay - пауза на каждом новом соединении, как рукопожатие TLS.
+    """
+    def __init__(self, respond, connect_delay=0):
+        self.requests = []
+        self.connections = set()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # заголовки и тело уходят отдельно; без этого keep-alive ждет отложенный ACK
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                time.sleep(connect_delay)
+                super().setup()
+
+            def do_GET(self):
+                stand_in.requests.append(self.path)
+                stand_in.connections.add(self.client_address)
+                respond(self)
+
+            do_POST = do_GET
+            do_DELETE = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def send_body(handler, body, status=200, content_type="application/json"):
+    body = body.encode() if isinstance(body, str) else body
+    handler.send_response(status)
+    handler.send_header("Content-Type", content_type)
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
@@ -0,0 +1,95 @@
+import json
+import time
+
+import pytest
+import requests
+
+import app.utils.api as api
+from app.utils.metrics import metrics
+from tests.stand_in import StandInServer, send_body
+
+
+@pytest.fixture(autouse=True)
+def fresh_session(monkeypatch):
+    monkeypatch.setattr(api, "_session", None)
+    monkeypatch.setattr(api, "API_RETRY_BACKOFF", 0)
+
+
+def tunnel_api(monkeypatch, respond, **kwargs):
+    server = StandInServer(respond, **kwargs)
+    monkeypatch.setattr(api, "BASE_URL", server.url)
+    return server
+
+
+def ttl_response(handler):
+    send_body(handler, json.dumps({"ttl": 3600}))
+
+
+def test_calls_share_one_connection(monkeypatch):
+    with tunnel_api(monkeypatch, ttl_response) as server:
+        for _ in range(5):
+            assert api.get_ttl("tunnel") == 3600
+
+    assert len(server.requests) == 5
+    assert len(server.connections) == 1
+
+
+def test_connection_reuse_cuts_per_call_latency(monkeypatch):
+    # каждое новое соединение стоит 50 мс, как рукопожатие с удаленным сервером
+    with tunnel_api(monkeypatch, ttl_response, connect_delay=0.05) as server:
+        def timed(call):
+            start = time.monotonic()
+            for _ in range(5):
+                call()
+            return (time.monotonic() - start) / 5
+
+        pooled = timed(lambda: api.get_ttl("tunnel"))
+        fresh = timed(lambda: requests.get(f"{server.url}/tunnel_status", params={"tunnel_id": "tunnel"},
+                                           timeout=5).json())
+
+    assert pooled < fresh / 2
+
+
+def test_get_is_retried_on_503(monkeypatch):
+    statuses = [503, 503, 200]
+
+    def respond(handler):
+        status = statuses.pop(0)
+        send_body(handler, json.dumps({"ttl": 60}), status=status)
+
+    with tunnel_api(monkeypatch, respond) as server:
+        assert api.get_ttl("tunnel") == 60
+
+    assert len(server.requests) == 3
+
+
+def test_post_is_not_retried(monkeypatch):
+    with tunnel_api(monkeypatch, lambda handler: send_body(handler, "{}", status=503)) as server:
+        response = api.api_request("POST", f"{api.BASE_URL}/create_tunnel", "create_tunnel", json={})
+
+    assert response.status_code == 503
+    assert len(server.requests) == 1
+
+
+def test_latency_status_and_errors_are_recorded(monkeypatch):
+    before = metrics.snapshot()["counters"]
+    with tunnel_api(monkeypatch, ttl_response):
+        api.get_ttl("tunnel")
+
+    def slow(handler):
+        time.sleep(0.3)
+        ttl_response(handler)
+
+    # GET после таймаута чтения повторяется, ошибка считается один раз
+    monkeypatch.setitem(api.API_TIMEOUTS, "tunnel_status", (1, 0.1))
+    with tunnel_api(monkeypatch, slow) as server:
+        with pytest.raises(requests.ConnectionError):
+            api.get_ttl("tunnel")
+
+    assert len(server.requests) == api.API_RETRIES + 1
+
+    snapshot = metrics.snapshot()
+    counters = snapshot["counters"]
+    assert counters["api.tunnel_status.status.200"] == before.get("api.tunnel_status.status.200", 0) + 1
+    assert counters["api.tunnel_status.errors"] == before.get("api.tunnel_status.errors", 0) + 1
+    assert snapshot["timings"]["api.tunnel_status.latency"]["last"] >= 0.1 * (api.API_RETRIES + 1)
@@ -0,0 +1,132 @@
+import json
+import time
+
+import pytest
+
+import app.utils.api as api
+from tests.stand_in import StandInServer, send_body
+
+
+CERTIFICATES = [
+    {"id": 1, "issuer_name": "C=AT, O=ZeroSSL", "name_value": "box.tunnel.test",
+     "serial_number": "01", "not_before": "2026-01-01", "not_after": "2026-04-01",
+     "entry_timestamp": "2026-01-01T00:00:00", "result_count": 2},
+    {"id": 2, "issuer_name": "C=AT, O=ZeroSSL", "name_value": "box.tunnel.test",
+     "serial_number": "02", "not_before": "2026-01-01", "not_after": "2026-04-01",
+     "entry_timestamp": "2026-01-01T00:00:00", "result_count": 2},
+]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(api, "_ct_cache", {})
+
+
+def crt_sh(monkeypatch, respond):
+    server = StandInServer(respond)
+    monkeypatch.setattr(api, "CT_URL", server.url + "/")
+    return server
+
+
+def test_certificates_are_streamed_and_cached(monkeypatch):
+    body = json.dumps(CERTIFICATES, indent=1)
+
+    with crt_sh(monkeypatch, lambda handler: send_body(handler, body)) as server:
+        certificates = api.check_security("box.tunnel.test")
+        assert api.check_security("box.tunnel.test") == certificates
+
+    assert [cert["serial_number"] for cert in certificates] == ["01", "02"]
+    assert set(certificates[0]) == set(api.CT_FIELDS)
+    # второй вызов отдан из кэша
+    assert len(server.requests) == 1
+
+
+def test_small_chunks_are_reassembled(monkeypatch):
+    body = json.dumps(CERTIFICATES)
+
+    def respond(handler):
+        with crt_sh_chunked(handler) as write:
+            for pos in range(0, len(body), 7):
+                write(body[pos:pos + 7])
+
+    with crt_sh(monkeypatch, respond):
+        certificates = api.check_security("box.tunnel.test")
+
+    assert [cert["id"] for cert in certificates] == [1, 2]
+
+
+@pytest.mark.parametrize("body", [
+    json.dumps(CERTIFICATES)[:-1],                 # нет закрывающей скобки
+    json.dumps(CERTIFICATES)[:-40],                # оборван посреди объекта
+    json.dumps(CERTIFICATES) + '{"id": 3}',        # мусор после массива
+    '{"error": "rate limited"}',                   # не массив
+])
+def test_incomplete_response_is_an_error(monkeypatch, body):
+    with crt_sh(monkeypatch, lambda handler: send_body(handler, body)):
+        with pytest.raises(ValueError):
+            api.check_security("box.tunnel.test")
+
+    assert api._ct_cache == {}
+
+
+def test_empty_list_is_not_cached(monkeypatch):
+    with crt_sh(monkeypatch, lambda handler: send_body(handler, "[]")) as server:
+        assert api.check_security("box.tunnel.test") == []
+        assert api.check_security("box.tunnel.test") == []
+
+    assert len(server.requests) == 2
+
+
+def test_deadline_covers_slow_body(monkeypatch):
+    monkeypatch.setattr(api, "CT_CHECK_TIMEOUT", 1)
+    item = json.dumps(CERTIFICATES[0])
+
+    def respond(handler):
+        # сервер отдает по объекту раз в 0.3 с и не заканчивает ответ
+        try:
+            with crt_sh_chunked(handler) as write:
+                write("[" + item)
+                for _ in range(100):
+                    time.sleep(0.3)
+                    write("," + item)
+        except OSError:
+            pass
+
+    with crt_sh(monkeypatch, respond) as server:
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            api.check_security("box.tunnel.test")
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 2.5
+    assert len(server.requests) == 1
+
+
+def test_server_errors_are_not_retried(monkeypatch):
+    with crt_sh(monkeypatch, lambda handler: send_body(handler, "busy", status=503)) as server:
+        with pytest.raises(api.requests.HTTPError):
+            api.check_security("box.tunnel.test")
+
+    assert len(server.requests) == 1
+
+
+class crt_sh_chunked:
+    # ответ с Transfer-Encoding: chunked, как у crt.sh
+    def __init__(self, handler):
+        self.handler = handler
+
+    def __enter__(self):
+        self.handler.send_response(200)
+        self.handler.send_header("Content-Type", "application/json")
+        self.handler.send_header("Transfer-Encoding", "chunked")
+        self.handler.end_headers()
+        return self.write
+
+    def write(self, text):
+        data = text.encode()
+        self.handler.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.handler.wfile.flush()
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.handler.wfile.write(b"0\r\n\r\n")
@@ -0,0 +1,108 @@
+import pytest
+
+from app.utils.email_renderer import (TIER_COMPLEX, TIER_SIMPLE, TIER_TEXT, build_document, classify,
+                                      prepare, resolve_cids, sanitize, sanitize_style)
+
+
+DIGEST = "ab" * 32
+
+
+@pytest.mark.parametrize("content", [None, ""])
+def test_missing_html_is_text(content):
+    assert classify(content) == TIER_TEXT
+
+
+@pytest.mark.parametrize("content", [
+    "<p>Ваш код: <b>123456</b></p>",
+    '<table><tr><td style="color:#333">Код <span style="font-weight:bold">4821</span></td></tr></table>',
+    '<div><img src="https://cdn.example.com/logo.png" alt="Logo"><a href="https://example.com">Войти</a></div>',
+    "<style>p { color: #333 }</style><p>код</p>",
+])
+def test_simple_html(content):
+    assert classify(content) == TIER_SIMPLE
+
+
+@pytest.mark.parametrize("content", [
+    "<style>@media (max-width:600px){td{display:block}}</style><p>код</p>",
+    '<div style="display: flex">код</div>',
+    '<div style="position:absolute">код</div>',
+    '<td style="background-image: url(https://cdn.example.com/bg.png)">код</td>',
+    "<iframe src='https://example.com'></iframe>",
+    "<form><input></form>",
+    "<svg><circle r='4'/></svg>",
+    "".join(f'<img src="https://cdn.example.com/{i}.png">' for i in range(3)),
+    "<table><tr><td>" * 4 + "код" + "</td></tr></table>" * 4,
+    "<style>" + "p { color: #333 }\n" * 200 + "</style><p>код</p>",
+])
+def test_complex_html(content):
+    assert classify(content) == TIER_COMPLEX
+
+
+def test_sanitize_drops_scripts_styles_and_handlers():
+    result = sanitize('<head><title>t</title><style>p{}</style></head>'
+                      '<p onclick="steal()" class="x">Код<script>alert(1)</script> 123</p>')
+
+    assert result == "<p>Код 123</p>"
+
+
+def test_sanitize_unwraps_unknown_tags_and_escapes_text():
+    result = sanitize("<custom>a &lt; b</custom><marquee>&amp;</marquee>")
+
+    assert result == "a &lt; b&amp;"
+
+
+def test_sanitize_filters_links():
+    result = sanitize('<a href="javascript:alert(1)">x</a><a href=" https://example.com/?a=1&b=2" title="t">y</a>'
+                      '<a href="mailto:help@example.com">z</a>')
+
+    assert result == ('<a>x</a><a href=" https://example.com/?a=1&amp;b=2" title="t">y</a>'
+                      '<a href="mailto:help@example.com">z</a>')
+
+
+def test_sanitize_replaces_remote_images_with_alt():
+    result = sanitize('<img src="https://tracker.example.com/open.gif" width="1">'
+                      '<img src="https://cdn.example.com/logo.png" alt="Logo">')
+
+    assert result == "[Logo]"
+
+
+def test_sanitize_keeps_inline_images_from_the_blob_store():
+    src = f"tunnel-blob:{DIGEST}?type=image/png"
+    result = sanitize(f'<img src="{src}" alt="схема" onerror="x()" width="10" />')
+
+    assert result == f'<img src="{src}" alt="схема" width="10">'
+    assert sanitize('<img src="tunnel-blob:../../etc/passwd">') == ""
+
+
+def test_sanitize_style():
+    assert sanitize_style("color: red; position: fixed; FONT-WEIGHT:bold; background-color: url(x)") == \
+        "color: red; font-weight: bold"
+    assert sanitize_style("color: expression(alert(1))") == ""
+    assert sanitize('<p style="position:fixed">a</p>') == "<p>a</p>"
+
+
+def test_resolve_cids():
+    attachments = [{"content_id": "Logo@Example", "digest": DIGEST, "content_type": "image/png"}]
+
+    result = resolve_cids('<img src="cid:logo@example"><img src="cid:other">', attachments)
+
+    assert result == f'<img src="tunnel-blob:{DIGEST}?type=image/png"><img src="cid:other">'
+    assert resolve_cids("<p>cid:x</p>", []) == "<p>cid:x</p>"
+
+
+def test_prepare_chooses_tier():
+    text = {"html_content": None, "body": "Код: 1 < 2\nконец"}
+    simple = {"html_content": "<p>Код <b>1</b><script>x</script></p>"}
+    complex_ = {"html_content": '<div style="display:grid">Код</div>'}
+
+    assert prepare(text) == (TIER_TEXT, "Код: 1 &lt; 2<br>конец")
+    assert prepare(simple) == (TIER_SIMPLE, "<p>Код <b>1</b></p>")
+    assert prepare(complex_) == (TIER_COMPLEX, complex_["html_content"])
+    # кнопка "Полная версия"
+    assert prepare(simple, force_full=True) == (TIER_COMPLEX, simple["html_content"])
+    assert prepare(text, force_full=True)[0] == TIER_TEXT
+
+
+def test_build_document():
+    assert build_document(TIER_SIMPLE, "<p>код</p>").startswith("<div")
+    assert "<!DOCTYPE html>" in build_document(TIER_COMPLEX, "<p>код</p>")
@@ -0,0 +1,49 @@
+import threading
+
+from Qt import QtCore
+
+from app.utils.mail_server_tls import EmailSignals
+
+
+def run_event_loop(ms):
+    # события Qt обрабатываются, пока тест ждет сигналов из других потоков
+    loop = QtCore.QEventLoop()
+    QtCore.QTimer.singleShot(ms, loop.quit)
+    loop.exec()
+
+
+def test_burst_from_threads_arrives_as_one_batch(qapp):
+    signals = EmailSignals(interval=30)
+    batches = []
+    signals.new_emails_received.connect(lambda batch: batches.append(batch))
+
+    def burst(first):
+        for number in range(first, first + 200):
+            signals.push({"number": number})
+
+    threads = [threading.Thread(target=burst, args=(first,)) for first in (0, 200, 400)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    run_event_loop(150)
+
+    assert len(batches) == 1
+    numbers = [email["number"] for email in batches[0]]
+    assert sorted(numbers) == list(range(600))
+    # письма одного отправителя сохраняют порядок
+    assert [n for n in numbers if n < 200] == list(range(200))
+
+
+def test_next_email_after_flush_starts_new_batch(qapp):
+    signals = EmailSignals(interval=10)
+    batches = []
+    signals.new_emails_received.connect(lambda batch: batches.append(batch))
+
+    signals.push({"number": 1})
+    run_event_loop(60)
+    signals.push({"number": 2})
+    run_event_loop(60)
+
+    assert batches == [[{"number": 1}], [{"number": 2}]]
@@ -0,0 +1,63 @@
+import time
+
+import app.utils.key_pool as key_pool_module
+from app.utils.key_pool import KeyPool, generate_private_key
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_pool_is_filled_and_refilled():
+    pool = KeyPool(size=2)
+    pool.start(["rsa"])
+    wait_until(lambda: len(pool._keys["rsa"]) == 2)
+
+    privkey, saved = pool.get("rsa")
+    assert privkey.key_size == key_pool_module.RSA_KEY_BITS
+    assert saved > 0
+
+    wait_until(lambda: len(pool._keys["rsa"]) == 2)
+
+
+def test_ecdsa_keys_are_not_pooled():
+    pool = KeyPool(size=2)
+    pool.start(["ec-p256", "ec-p384"])
+
+    assert pool._thread is None
+    assert pool._keys == {}
+
+    privkey, saved = pool.get("ec-p256")
+    assert privkey.curve.name == "secp256r1"
+    assert saved == 0.0
+
+
+def test_refill_survives_generation_errors(monkeypatch):
+    monkeypatch.setattr(key_pool_module, "KEY_POOL_RETRY_DELAY", 0.01)
+    failures = [RuntimeError("entropy"), RuntimeError("entropy")]
+
+    def flaky(key_type):
+        if failures:
+            raise failures.pop()
+        return generate_private_key(key_type)
+
+    monkeypatch.setattr(key_pool_module, "generate_private_key", flaky)
+
+    pool = KeyPool(size=1, pooled_types=("ec-p256",))
+    pool.start(["ec-p256"])
+
+    # после двух ошибок поток продолжает пополнять пул
+    wait_until(lambda: len(pool._keys["ec-p256"]) == 1)
+    assert pool._thread.is_alive()
+    assert failures == []
+
+
+def test_empty_pool_generates_synchronously():
+    pool = KeyPool(size=1)
+
+    privkey, saved = pool.get("ec-p384")
+    assert privkey.curve.name == "secp384r1"
+    assert saved == 0.0
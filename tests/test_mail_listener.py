@@ -0,0 +1,34 @@
+import smtplib
+import ssl
+
+import app.utils.mail_server_tls as mail_server_tls
+from tests.certs import write_certificate
+
+
+DOMAIN = "box.tunnel.test"
+
+
+def test_listener_starts_without_certificate_and_speaks_plain_smtp(listener):
+    # неявный TLS на порту сломал бы STARTTLS от пересылающего MTA
+    with smtplib.SMTP("127.0.0.1", listener.port, timeout=10) as client:
+        code, _ = client.ehlo("mx.example.com")
+        assert code == 250
+        assert client.has_extn("starttls")
+
+
+def test_starttls_uses_certificate_loaded_after_start(listener, tmp_path):
+    certs_path = tmp_path / "certs" / DOMAIN
+    fullchain = write_certificate(certs_path, DOMAIN)
+    mail_server_tls.load_certificate(listener, str(certs_path))
+
+    client_context = ssl.create_default_context(cadata=fullchain.decode())
+
+    with smtplib.SMTP("127.0.0.1", listener.port, timeout=10) as client:
+        client.ehlo("mx.example.com")
+        # имя для SNI и проверки сертификата
+        client._host = DOMAIN
+        code, _ = client.starttls(context=client_context)
+        assert code == 220
+
+        client.ehlo("mx.example.com")
+        client.sendmail("sender@example.com", [f"user@{DOMAIN}"], b"Subject: tls\r\n\r\nbody\r\n")
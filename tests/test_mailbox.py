@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from app.utils.blob_store import BlobStore
+from app.utils.mailbox import Mailbox
+
+
+def email(subject, attachments=()):
+    return {"sender": "noreply@example.com", "sender_name": None, "subject": subject, "timestamp": "",
+            "body": "код 123456", "html_content": None, "plain_content": "код 123456",
+            "attachments": list(attachments)}
+
+
+def attachment(store, content):
+    digest, size = store.put([content])
+    return {"digest": digest, "size": size, "filename": "logo.png", "content_type": "image/png"}
+
+
+@pytest.fixture
+def mailbox(tmp_path):
+    mailbox = Mailbox(str(tmp_path / "mailbox.db"))
+    yield mailbox
+    mailbox.close()
+
+
+def test_purge_removes_old_emails_and_their_attachments(mailbox, tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path / "blobs"))
+    shared = attachment(store, b"shared")
+    old_only = attachment(store, b"old")
+
+    # письма двухмесячной давности
+    monkeypatch.setattr(time, "time", lambda: 1_000_000.0)
+    old_ids = mailbox.add_many("expired", [email("Старое", [shared, old_only])])
+    old_ids += mailbox.add_many("box", [email("Тоже старое")])
+    monkeypatch.undo()
+    new_ids = mailbox.add_many("box", [email("Новое", [shared])])
+
+    assert mailbox.purge(time.time() - 30 * 24 * 3600) == 2
+
+    assert mailbox.count("expired") == 0
+    assert mailbox.count("box") == 1
+    assert all(mailbox.get_email(email_id) is None for email_id in old_ids)
+    assert mailbox.get_email(new_ids[0])["subject"] == "Новое"
+    # письма удалены и из индекса поиска
+    assert [h["subject"] for h in mailbox.search("box", "код")] == ["Новое"]
+
+    assert mailbox.blob_digests() == {shared["digest"]}
+    assert store.collect(mailbox.blob_digests(), grace=0) == 1
+    assert store.exists(shared["digest"])
+    assert not store.exists(old_only["digest"])
+
+
+def test_purge_keeps_recent_emails(mailbox):
+    mailbox.add_many("box", [email("Новое")])
+
+    assert mailbox.purge(time.time() - 30 * 24 * 3600) == 0
+    assert mailbox.count("box") == 1
@@ -0,0 +1,181 @@
+import sqlite3
+
+import pytest
+
+from app.utils import mailbox as mailbox_module
+from app.utils.mailbox import Mailbox
+
+
+def email(subject, sender="noreply@example.com", plain=None, html=None):
+    return {"sender": sender, "sender_name": None, "subject": subject, "timestamp": "",
+            "body": html or plain, "html_content": html, "plain_content": plain, "attachments": []}
+
+
+def subjects(headers):
+    return [h["subject"] for h in headers]
+
+
+def wait_indexed(mailbox):
+    if mailbox._backfill is not None:
+        mailbox._backfill.join(10)
+    assert not mailbox.fts_indexing
+
+
+@pytest.fixture
+def mailbox(tmp_path):
+    mailbox = Mailbox(str(tmp_path / "mailbox.db"))
+    yield mailbox
+    mailbox.close()
+
+
+def test_search_matches_every_term_as_prefix(mailbox):
+    mailbox.add_many("box", [
+        email("Код подтверждения", sender="noreply@github.com", plain="Ваш код 123456"),
+        email("Weekly newsletter", sender="news@twitch.tv", html="<p>Стримы &amp; <b>новости</b></p>"),
+        email("Verification code", sender="noreply@steam.com", plain="code 654321"),
+    ])
+
+    assert subjects(mailbox.search("box", "github")) == ["Код подтверждения"]
+    assert subjects(mailbox.search("box", "news twi")) == ["Weekly newsletter"]
+    # текст html ищется без разметки и с раскрытыми сущностями
+    assert subjects(mailbox.search("box", "новост")) == ["Weekly newsletter"]
+    assert subjects(mailbox.search("box", "654")) == ["Verification code"]
+    assert subjects(mailbox.search("box", "code")) == ["Verification code"]
+    assert mailbox.search("box", "  ") == []
+
+
+def test_search_is_limited_to_mailbox_and_paged_in_id_order(mailbox):
+    mailbox.add_many("box", [email(f"Письмо {i}", plain="заказ") for i in range(5)])
+    mailbox.add("other", email("Чужое", plain="заказ"))
+
+    assert subjects(mailbox.search("box", "заказ", offset=1, limit=2)) == ["Письмо 1", "Письмо 2"]
+    assert len(mailbox.search("box", "заказ")) == 5
+    assert subjects(mailbox.search("other", "заказ")) == ["Чужое"]
+
+
+def test_search_only_given_ids(mailbox):
+    ids = mailbox.add_many("box", [email("Код 1"), email("Новости"), email("Код 2")])
+
+    assert subjects(mailbox.search("box", "код", email_ids=ids[1:])) == ["Код 2"]
+    assert mailbox.search("box", "код", email_ids=[]) == []
+
+
+def test_deleted_emails_leave_the_index(mailbox):
+    mailbox.add_many("box", [email("Код"), email("Код")])
+    mailbox.clear("box")
+
+    assert mailbox.search("box", "код") == []
+    assert mailbox._conn.execute("SELECT COUNT(*) FROM emails_fts").fetchone()[0] == 0
+
+
+def drop_index(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("DROP TRIGGER emails_fts_delete; DROP TABLE emails_fts; DROP TABLE fts_backfill;")
+    conn.close()
+
+
+def test_existing_emails_are_indexed_in_background(tmp_path, monkeypatch):
+    path = str(tmp_path / "mailbox.db")
+    mailbox = Mailbox(path)
+    mailbox.add_many("box", [email(f"Письмо {i}", plain=f"текст{i % 3}") for i in range(25)])
+    mailbox.close()
+    # хранилище из версии без поиска
+    drop_index(path)
+
+    monkeypatch.setattr(mailbox_module, "FTS_BACKFILL_BATCH", 4)
+    mailbox = Mailbox(path)
+    wait_indexed(mailbox)
+
+    assert len(mailbox.search("box", "текст1")) == 8
+    assert mailbox._conn.execute("SELECT COUNT(*) FROM fts_backfill").fetchone()[0] == 0
+    mailbox.close()
+
+
+def test_search_falls_back_to_headers_while_indexing(mailbox):
+    mailbox.add_many("box", [email("Код подтверждения", plain="текст письма")])
+    mailbox.fts_indexing = True
+
+    assert subjects(mailbox.search("box", "подтвер")) == ["Код подтверждения"]
+    # текст писем до конца индексации не ищется
+    assert mailbox.search("box", "текст") == []
+
+
+def test_interrupted_backfill_resumes(tmp_path, monkeypatch):
+    path = str(tmp_path / "mailbox.db")
+    mailbox = Mailbox(path)
+    ids = mailbox.add_many("box", [email(f"Письмо {i}", plain="заказ") for i in range(10)])
+    mailbox.close()
+    drop_index(path)
+
+    # первый запуск обрывается на второй пачке
+    search_fields = Mailbox._search_fields
+    calls = []
+
+    def interrupt(self, email):
+        calls.append(email["id"])
+        if len(calls) > 4:
+            raise RuntimeError("выход из приложения")
+        return search_fields(self, email)
+
+    monkeypatch.setattr(mailbox_module, "FTS_BACKFILL_BATCH", 4)
+    monkeypatch.setattr(Mailbox, "_search_fields", interrupt)
+    interrupted = Mailbox(path)
+    interrupted._backfill.join(10)
+    interrupted.close()
+    monkeypatch.undo()
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT last_id, upto FROM fts_backfill").fetchone() == (ids[3], ids[-1])
+    conn.close()
+
+    mailbox = Mailbox(path)
+    # письмо, пришедшее во время индексации, индексируется сразу и не дублируется
+    mailbox.add("box", email("Новое", plain="заказ"))
+    wait_indexed(mailbox)
+
+    assert len(mailbox.search("box", "заказ")) == 11
+    assert mailbox._conn.execute("SELECT COUNT(*) FROM emails_fts").fetchone()[0] == 11
+    mailbox.close()
+
+
+def test_index_with_old_prefix_settings_is_rebuilt(tmp_path):
+    path = str(tmp_path / "mailbox.db")
+    mailbox = Mailbox(path)
+    mailbox.add_many("box", [email("Код подтверждения", plain="заказ")])
+    mailbox.close()
+
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "DROP TABLE emails_fts;"
+        "CREATE VIRTUAL TABLE emails_fts USING fts5(sender, subject, body, prefix = '2 3');"
+    )
+    conn.close()
+
+    mailbox = Mailbox(path)
+    wait_indexed(mailbox)
+    sql = mailbox._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'emails_fts'").fetchone()[0]
+
+    assert mailbox_module.FTS_PREFIX in sql
+    assert subjects(mailbox.search("box", "зака")) == ["Код подтверждения"]
+    mailbox.close()
+
+
+def test_new_search_hits_are_appended_without_reset(mailbox):
+    from app.screens.email_list_model import EmailListModel
+
+    mailbox.add_many("box", [email("Код 1"), email("Новости")])
+    model = EmailListModel(mailbox)
+    model.set_mailbox("box")
+    model.set_filter("код")
+
+    resets = []
+    model.modelReset.connect(lambda: resets.append(True))
+    inserted = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+
+    new = [email("Код 2"), email("Реклама"), email("Код 3")]
+    model.append_emails(list(zip(mailbox.add_many("box", new), new)))
+
+    assert resets == []
+    assert inserted == [(1, 2)]
+    assert [model.data(model.index(row)) for row in range(model.rowCount())] == ["Код 1", "Код 2", "Код 3"]
@@ -0,0 +1,170 @@
+import base64
+import email
+import os
+import quopri
+import random
+from email import policy
+from email.message import EmailMessage
+
+import pytest
+
+import app.utils.mime_parser as mime_parser
+from app.utils.blob_store import BlobStore
+from app.utils.mime_parser import _iter_decoded, parse_envelope, parse_message
+
+
+@pytest.fixture
+def blobs(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path / "blobs"))
+    monkeypatch.setattr(mime_parser, "get_blob_store", lambda: store)
+    return store
+
+
+def read_blob(store, digest):
+    with open(store.path(digest), "rb") as blob:
+        return blob.read()
+
+
+def headers_for(cte):
+    return email.message_from_bytes(f"Content-Transfer-Encoding: {cte}\r\n\r\n".encode())
+
+
+def text_message():
+    message = EmailMessage()
+    message["From"] = "Сервис <noreply@example.com>"
+    message["Subject"] = "Код подтверждения"
+    message.set_content("Ваш код: 123456\n")
+    return message
+
+
+def alternative_message():
+    message = text_message()
+    message.add_alternative("<p>Ваш код: <b>123456</b></p>" + "<p>" + "x" * 2000 + "</p>", subtype="html")
+    return message
+
+
+def mixed_message():
+    message = alternative_message()
+    message.add_attachment(os.urandom(200_000), maintype="application", subtype="pdf", filename="счет.pdf")
+    message.add_attachment("строки\n" * 1000, filename="log.txt")
+    return message
+
+
+def related_message():
+    message = text_message()
+    message.add_alternative('<p>Логотип: <img src="cid:logo@example.com"></p>', subtype="html")
+    html_part = message.get_payload()[1]
+    html_part.add_related(os.urandom(5000), maintype="image", subtype="png", cid="<logo@example.com>")
+    return message
+
+
+def cp1251_message():
+    message = EmailMessage()
+    message["From"] = "bank@example.com"
+    message["Subject"] = "Выписка"
+    message.set_content("Остаток: 100 руб.\n", charset="cp1251", cte="quoted-printable")
+    return message
+
+
+def base64_body_message():
+    message = EmailMessage()
+    message["From"] = "a@example.com"
+    message["Subject"] = "base64"
+    message.set_content("<h1>Привет</h1>" * 200, subtype="html", cte="base64")
+    return message
+
+
+MESSAGES = [text_message, alternative_message, mixed_message, related_message,
+            cp1251_message, base64_body_message]
+
+
+@pytest.mark.parametrize("make", MESSAGES, ids=lambda make: make.__name__)
+def test_matches_stdlib_parser(make, blobs):
+    raw = make().as_bytes(policy=policy.SMTP)
+    reference = email.message_from_bytes(raw, policy=policy.default)
+
+    headers, html_body, plain_body, attachments = parse_message(raw)
+
+    for subtype, body in (("html", html_body), ("plain", plain_body)):
+        part = next((part for part in reference.walk()
+                     if part.get_content_type() == f"text/{subtype}"
+                     and part.get_content_disposition() != "attachment"), None)
+        expected = part.get_content() if part is not None else None
+        assert (body or None) == expected
+
+    expected_attachments = [part for part in reference.walk()
+                            if not part.is_multipart()
+                            and (part.get_content_disposition() == "attachment"
+                                 or part.get_content_maintype() not in ("text",))]
+    assert len(attachments) == len(expected_attachments)
+
+    for stored, part in zip(attachments, expected_attachments):
+        payload = part.get_payload(decode=True)
+        assert read_blob(blobs, stored["digest"]) == payload
+        assert stored["size"] == len(payload)
+        assert stored["filename"] == part.get_filename()
+        assert stored["content_type"] == part.get_content_type()
+
+    assert str(headers["Subject"]) == str(reference["Subject"])
+
+
+def test_inline_image_is_referenced_by_cid(blobs):
+    raw = related_message().as_bytes(policy=policy.SMTP)
+    email_data = parse_envelope(raw, "a@example.com", ["user@box.test"])
+
+    image, = email_data["attachments"]
+    assert (image["content_id"], image["inline"]) == ("logo@example.com", True)
+    assert email_data["sender"] == "noreply@example.com"
+    assert email_data["recipients"] == ["user@box.test"]
+
+
+@pytest.mark.parametrize("chunk_size", [5, 64, 1000, 64 * 1024])
+@pytest.mark.parametrize("cte", ["base64", "quoted-printable", "7bit"])
+def test_iter_decoded_matches_stdlib_for_any_chunk_size(cte, chunk_size):
+    rng = random.Random(chunk_size)
+    if cte == "base64":
+        payload = rng.randbytes(20_000)
+        encoded = base64.encodebytes(payload)
+    elif cte == "quoted-printable":
+        payload = ("Привет =, мир " * 2000).encode()
+        encoded = quopri.encodestring(payload)
+    else:
+        payload = encoded = b"plain text\r\n" * 2000
+
+    decoded = b"".join(_iter_decoded(headers_for(cte), encoded, 0, len(encoded), chunk_size))
+    assert decoded == payload
+
+
+def test_base64_tail_without_padding_is_decoded():
+    payload = os.urandom(200_000)
+    encoded = base64.b64encode(payload).rstrip(b"=")
+    assert len(encoded) % 4 != 0
+
+    decoded = b"".join(_iter_decoded(headers_for("base64"), encoded, 0, len(encoded), 1000))
+    assert decoded == payload
+
+
+def test_corrupt_base64_raises():
+    encoded = bytearray(base64.b64encode(os.urandom(200_000)))
+    encoded[1000] = ord("=")
+
+    with pytest.raises(ValueError):
+        b"".join(_iter_decoded(headers_for("base64"), bytes(encoded), 0, len(encoded)))
+
+
+def test_corrupt_attachment_is_skipped_and_not_stored(blobs):
+    message = text_message()
+    message.add_attachment(os.urandom(200_000), maintype="application", subtype="zip", filename="a.zip")
+    raw = message.as_bytes(policy=policy.SMTP)
+
+    # портим base64 вложения в середине
+    body_start = raw.index(b"filename=\"a.zip\"")
+    corrupt_at = raw.index(b"\r\n\r\n", body_start) + 4 + 1000
+    raw = raw[:corrupt_at] + b"=" + raw[corrupt_at + 1:]
+
+    _, _, plain_body, attachments = parse_message(raw)
+
+    assert plain_body.strip() == "Ваш код: 123456"
+    assert attachments == []
+    # во временных файлах хранилища ничего не осталось
+    assert [name for _, _, files in os.walk(blobs.root) for name in files] == []
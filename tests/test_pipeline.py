@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from app.utils.pipeline import Pipeline, Stage, StageError
+
+
+def test_independent_stages_run_concurrently():
+    def slow(value):
+        def run(results):
+            time.sleep(0.2)
+            return value
+        return run
+
+    pipeline = Pipeline([
+        Stage("tunnel", slow("sub")),
+        Stage("acme", slow("client")),
+        Stage("certificate", lambda results: f"{results['tunnel']}+{results['acme']}",
+              deps=["tunnel", "acme"]),
+    ])
+
+    start = time.monotonic()
+    results = pipeline.run()
+
+    assert results["certificate"] == "sub+client"
+    assert time.monotonic() - start < 0.35
+    assert set(pipeline.timings) == {"tunnel", "acme", "certificate"}
+
+
+def test_failed_stage_stops_dependents_and_waits_for_running():
+    finished = threading.Event()
+    started = []
+
+    def failing(results):
+        raise RuntimeError("409")
+
+    def running(results):
+        time.sleep(0.1)
+        finished.set()
+
+    pipeline = Pipeline([
+        Stage("tunnel", failing),
+        Stage("acme", running),
+        Stage("certificate", lambda results: started.append("certificate"), deps=["tunnel", "acme"]),
+    ])
+
+    with pytest.raises(StageError) as error:
+        pipeline.run()
+
+    assert error.value.stage == "tunnel"
+    assert str(error.value.error) == "409"
+    assert finished.is_set()
+    assert started == []
+
+
+def test_progress_lists_active_stage_titles():
+    reports = []
+    pipeline = Pipeline([Stage("tunnel", lambda results: None, title="Создание туннеля")],
+                        on_progress=reports.append)
+    pipeline.run()
+
+    assert reports == [["Создание туннеля"]]
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError):
+        Pipeline([Stage("certificate", lambda results: None, deps=["tunnel"])])
+
+    pipeline = Pipeline([
+        Stage("a", lambda results: None, deps=["b"]),
+        Stage("b", lambda results: None, deps=["a"]),
+    ])
+    with pytest.raises(ValueError):
+        pipeline.run()
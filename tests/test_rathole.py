@@ -0,0 +1,166 @@
+import os
+import stat
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import app.utils.rathole as rathole_module
+from app.utils.rathole import Rathole, parse_line
+
+
+CONNECTED = "2026-01-01T00:00:00.000Z  INFO handshake{addr=tunnel.email:2333}: rathole::client: Control channel established"
+
+FAKE_RATHOLE = f"""#!{sys.executable}
+import os, sys, time
+
+with open(os.environ["FAKE_RATHOLE_PIDS"], "a") as pids:
+    pids.write(f"{{os.getpid()}}\\n")
+
+print({CONNECTED!r}, flush=True)
+if os.environ["FAKE_RATHOLE_MODE"] == "crash":
+    time.sleep(0.2)
+    sys.exit(1)
+time.sleep(600)
+"""
+
+
+class Signal:
+    def __init__(self):
+        self.values = []
+
+    def emit(self, value):
+        self.values.append(value)
+
+
+class Signals:
+    def __init__(self):
+        self.state_changed = Signal()
+        self.reconnected = Signal()
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def fake_rathole(tmp_path, monkeypatch):
+    binary = tmp_path / "rathole"
+    binary.write_text(FAKE_RATHOLE)
+    binary.chmod(binary.stat().st_mode | stat.S_IEXEC)
+
+    pids = tmp_path / "pids"
+    pids.touch()
+
+    monkeypatch.setattr(rathole_module, "rathole_binary", lambda: str(binary))
+    monkeypatch.setattr(rathole_module, "script_path", lambda name: str(tmp_path / name))
+    monkeypatch.setattr(rathole_module, "RATHOLE_RESTART_MIN", 0.05)
+    monkeypatch.setenv("FAKE_RATHOLE_PIDS", str(pids))
+
+    def spawned():
+        return [int(pid) for pid in pids.read_text().split()]
+
+    return spawned
+
+
+def start(rathole):
+    thread = threading.Thread(target=rathole.run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_output_lines_are_classified():
+    assert parse_line("\x1b[32m" + CONNECTED + "\x1b[0m").kind == "connected"
+    event = parse_line("2026-01-01T00:00:00Z ERROR rathole::client: Failed to run the control channel")
+    assert (event.level, event.target, event.kind) == ("ERROR", "rathole::client", "disconnected")
+    event = parse_line("2026-01-01T00:00:00Z  WARN rathole::client: Failed to connect to tunnel.email:2333: "
+                       "Connection refused (os error 111). Retry in 1.2s...")
+    assert event.kind == "disconnected"
+
+
+@pytest.mark.parametrize("line", [
+    "2026-01-01T00:00:00Z  INFO rathole::client: Retry-After header ignored",
+    "2026-01-01T00:00:00Z DEBUG rathole::protocol: RetryPolicy { max_elapsed_time: None }",
+    "2026-01-01T00:00:00Z  INFO handshake: rathole::client: service tunnel-1: no Retry needed",
+])
+def test_unrelated_retry_lines_do_not_change_state(line):
+    assert parse_line(line).kind == "log"
+
+
+def test_crashed_process_is_restarted(fake_rathole, monkeypatch):
+    monkeypatch.setenv("FAKE_RATHOLE_MODE", "crash")
+    signals = Signals()
+    rathole = Rathole(signals=signals)
+    thread = start(rathole)
+
+    wait_until(lambda: rathole.restarts >= 2 and len(signals.reconnected.values) >= 2)
+    rathole.stop()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert signals.state_changed.values[:2] == [True, False]
+    assert not any(alive(pid) for pid in fake_rathole())
+
+
+def test_stop_terminates_running_process(fake_rathole, monkeypatch):
+    monkeypatch.setenv("FAKE_RATHOLE_MODE", "hang")
+    rathole = Rathole(signals=Signals())
+    thread = start(rathole)
+
+    wait_until(lambda: rathole.connected)
+    rathole.stop()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert rathole.restarts == 0
+    assert not any(alive(pid) for pid in fake_rathole())
+
+
+def test_stop_during_spawn_does_not_leak_process(fake_rathole, monkeypatch):
+    monkeypatch.setenv("FAKE_RATHOLE_MODE", "hang")
+    rathole = Rathole(signals=Signals())
+    real_popen = subprocess.Popen
+    started = []
+
+    def popen_then_stop(*args, **kwargs):
+        # stop() приходит, когда процесс уже запущен, но еще не опубликован
+        process = real_popen(*args, **kwargs)
+        started.append(process)
+        rathole.stop()
+        return process
+
+    monkeypatch.setattr(rathole_module.subprocess, "Popen", popen_then_stop)
+    thread = start(rathole)
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert rathole.rh_process is None
+    assert len(started) == 1
+    assert started[0].poll() is not None
+
+
+def test_watch_terminates_process_on_stop_event(fake_rathole, monkeypatch):
+    monkeypatch.setenv("FAKE_RATHOLE_MODE", "hang")
+    rathole = Rathole(signals=Signals())
+    thread = start(rathole)
+    wait_until(lambda: rathole.connected)
+
+    # только событие, без stop(): надзор сам гасит процесс
+    rathole._stop_event.set()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert not any(alive(pid) for pid in fake_rathole())
@@ -0,0 +1,169 @@
+import smtplib
+import ssl
+import struct
+import threading
+import time
+
+import pytest
+
+import app.utils.mail_server_tls as mail_server_tls
+import app.utils.rathole_client as rathole_client
+from app.utils.rathole_client import InProcessTunnel, digest, pack_hello, HELLO_LEN
+from tests.certs import write_certificate
+from tests.fake_rathole import FakeRatholeServer
+
+
+DOMAIN = "tunnel-1.tunnel.test"
+SERVICES = {"tunnel-1": "secret-1"}
+
+
+class Signal:
+    def __init__(self):
+        self.values = []
+
+    def emit(self, value):
+        self.values.append(value)
+
+
+class Signals:
+    def __init__(self):
+        self.state_changed = Signal()
+        self.reconnected = Signal()
+
+
+@pytest.fixture(autouse=True)
+def fast_reconnect(monkeypatch):
+    monkeypatch.setattr(rathole_client, "RATHOLE_RESTART_MIN", 0.05)
+    monkeypatch.setattr(rathole_client, "RATHOLE_RESTART_MAX", 0.1)
+
+
+@pytest.fixture
+def tunnel(listener):
+    tunnels = []
+
+    def start(server, services=SERVICES):
+        client = InProcessTunnel(listener, services, remote_addr=("127.0.0.1", server.tunnel_port),
+                                 signals=Signals())
+        thread = threading.Thread(target=client.run, daemon=True)
+        thread.start()
+        tunnels.append((client, thread))
+        return client, thread
+
+    yield start
+
+    for client, thread in tunnels:
+        client.stop()
+        thread.join(timeout=5)
+
+
+def wait(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def messages(client, kind):
+    return [event.message for event in client.recent_events() if event.kind == kind]
+
+
+def test_hello_framing():
+    hello = pack_hello(1, digest(b"tunnel-1"))
+
+    assert len(hello) == HELLO_LEN
+    assert struct.unpack("<IB", hello[:5]) == (1, 0)
+    assert hello[5:] == digest(b"tunnel-1")
+
+
+def test_smtp_session_goes_through_tunnel(monkeypatch, tmp_path, listener, tunnel):
+    received = []
+    monkeypatch.setattr(mail_server_tls.email_signals, "push", received.append)
+    fullchain = write_certificate(tmp_path / "certs" / DOMAIN, DOMAIN)
+    mail_server_tls.load_certificate(listener, str(tmp_path / "certs" / DOMAIN))
+
+    with FakeRatholeServer(SERVICES) as server:
+        client, _ = tunnel(server)
+        wait(lambda: client.connected)
+
+        with smtplib.SMTP("127.0.0.1", server.visitor_port, timeout=10) as smtp:
+            # STARTTLS идет поверх data channel до aiosmtpd, как от пересылающего MTA
+            smtp._host = DOMAIN
+            smtp.starttls(context=ssl.create_default_context(cadata=fullchain.decode()))
+            smtp.sendmail("sender@example.com", [f"user@{DOMAIN}"],
+                          "Subject: code\r\n\r\n123456\r\n")
+
+        wait(lambda: received)
+
+    assert received[0]["subject"] == "code"
+    assert client.signals.state_changed.values == [True]
+    assert len(client.signals.reconnected.values) == 1
+
+
+def test_tunnel_is_up_only_when_all_services_connect(tunnel):
+    services = {"tunnel-1": "secret-1", "tunnel-2": "secret-2"}
+
+    with FakeRatholeServer({"tunnel-1": "secret-1"}) as server:
+        client, _ = tunnel(server, services)
+        wait(lambda: "service" in server.rejected)
+        assert not client.connected
+
+        server.services["tunnel-2"] = "secret-2"
+        wait(lambda: client.connected)
+
+
+def test_wrong_token_is_reported(tunnel):
+    with FakeRatholeServer({"tunnel-1": "other"}) as server:
+        client, _ = tunnel(server)
+        wait(lambda: messages(client, "disconnected"))
+
+    assert "неверный токен сервиса" in messages(client, "disconnected")[0]
+    assert not client.connected
+
+
+def test_unknown_protocol_version_is_rejected(tunnel):
+    with FakeRatholeServer(SERVICES, version=1) as server:
+        client, _ = tunnel(server)
+        wait(lambda: messages(client, "disconnected"))
+
+    assert "неожиданный ответ сервера" in messages(client, "disconnected")[0]
+    assert not server.controls
+
+
+def test_missing_heartbeat_reconnects(monkeypatch, tunnel):
+    monkeypatch.setattr(rathole_client, "RATHOLE_HEARTBEAT_TIMEOUT", 0.2)
+
+    with FakeRatholeServer(SERVICES, heartbeat=None) as server:
+        client, _ = tunnel(server)
+        wait(lambda: client.restarts >= 2)
+
+    assert "нет heartbeat от сервера" in messages(client, "disconnected")[0]
+
+
+def test_reconnects_after_server_drop(tunnel):
+    with FakeRatholeServer(SERVICES) as server:
+        client, _ = tunnel(server)
+        wait(lambda: client.connected)
+
+        server.drop_controls()
+        wait(lambda: len(client.signals.reconnected.values) == 2)
+
+    assert client.signals.state_changed.values == [True, False, True]
+    assert client.restarts == 1
+
+
+def test_stop_ends_run(tunnel):
+    with FakeRatholeServer(SERVICES) as server:
+        client, thread = tunnel(server)
+        wait(lambda: client.connected)
+
+        client.stop()
+        thread.join(timeout=2)
+
+        assert not thread.is_alive()
+        # подписчики узнают, что туннель больше не поднят
+        assert client.signals.state_changed.values == [True, False]
+        assert not client.connected
+        # сокеты закрыты: сервер видит обрыв control channel
+        control, _ = server.controls["tunnel-1"]
+        control.settimeout(2)
+        assert control.recv(4) == b""
@@ -0,0 +1,112 @@
+import threading
+import time
+
+from app.utils.email_renderer import TIER_SIMPLE, TIER_TEXT
+from app.utils.mailbox import Mailbox
+from app.utils.render_cache import RenderCache
+
+
+def email(email_id, subject="Код", html=None):
+    return {"id": email_id, "sender": "a@example.com", "sender_name": None, "subject": subject,
+            "timestamp": "", "body": f"текст {subject}", "html_content": html,
+            "plain_content": f"текст {subject}", "attachments": []}
+
+
+class Loader:
+    def __init__(self, emails):
+        self.emails = emails
+        self.calls = []
+
+    def __call__(self, email_id):
+        self.calls.append(email_id)
+        return self.emails.get(email_id)
+
+
+def wait_idle(cache, timeout=5):
+    deadline = time.monotonic() + timeout
+    while cache._pending:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_prepared_email_is_cached():
+    loader = Loader({1: email(1, html="<p>Код <b>123456</b></p>")})
+    cache = RenderCache(loader)
+
+    first = cache.get(1)
+    assert cache.get(1) is first
+    assert loader.calls == [1]
+    assert first.tier == TIER_SIMPLE
+    assert "123456" in first.document
+
+    assert cache.get(2) is None
+    cache.close()
+
+
+def test_least_recently_used_entry_is_evicted():
+    loader = Loader({i: email(i) for i in range(1, 4)})
+    cache = RenderCache(loader, max_size=2)
+
+    cache.get(1)
+    cache.get(2)
+    cache.get(1)
+    cache.get(3)
+
+    assert list(cache._entries) == [1, 3]
+    cache.close()
+
+
+def test_neighbours_are_prefetched():
+    loader = Loader({i: email(i) for i in range(1, 6)})
+    cache = RenderCache(loader)
+
+    cache.prefetch([2, 3])
+    wait_idle(cache)
+    cache.prefetch([2, 3])
+    wait_idle(cache)
+
+    assert sorted(loader.calls) == [2, 3]
+    assert cache.get(3).tier == TIER_TEXT
+    assert sorted(loader.calls) == [2, 3]
+    cache.close()
+
+
+def test_prefetch_in_flight_during_clear_is_discarded():
+    entered, release = threading.Event(), threading.Event()
+    emails = {1: email(1, subject="старое")}
+
+    def slow_loader(email_id):
+        entered.set()
+        release.wait(5)
+        return emails.get(email_id)
+
+    cache = RenderCache(slow_loader)
+    cache.prefetch([1])
+    assert entered.wait(5)
+
+    # ящик очищен и id 1 выдан новому письму, пока старое еще готовилось
+    emails[1] = email(1, subject="новое")
+    cache.clear()
+    release.set()
+    wait_idle(cache)
+
+    assert 1 not in cache._entries
+    assert cache.get(1).email["subject"] == "новое"
+    cache.close()
+
+
+def test_reused_id_after_mailbox_clear_shows_new_email(tmp_path):
+    mailbox = Mailbox(str(tmp_path / "mailbox.db"))
+    cache = RenderCache(mailbox.get_email)
+
+    old_id, = mailbox.add_many("box", [email(None, subject="из удаленного ящика")])
+    assert cache.get(old_id).email["subject"] == "из удаленного ящика"
+
+    mailbox.clear("box")
+    cache.clear()
+
+    new_id, = mailbox.add_many("box", [email(None, subject="новое письмо")])
+    assert cache.get(new_id).email["subject"] == "новое письмо"
+
+    cache.close()
+    mailbox.close()
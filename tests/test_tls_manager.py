@@ -0,0 +1,257 @@
+import smtplib
+import ssl
+import threading
+import time
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives.serialization import Encoding
+
+import app.utils.mail_server_tls as mail_server_tls
+from app.utils.metrics import metrics
+from app.utils.tls_manager import TLSContextManager
+from tests.certs import key_pem, make_certificate, make_key, write_certificate
+
+
+HOSTS = ("a.tunnel.test", "b.tunnel.test")
+
+
+def der(fullchain):
+    return x509.load_pem_x509_certificate(fullchain).public_bytes(Encoding.DER)
+
+
+def client_context():
+    # сертификаты самоподписанные и меняются на ходу - сверяем их побайтно
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def served_certificate(port, hostname):
+    # сертификат, который сервер отдал на STARTTLS с этим SNI
+    with smtplib.SMTP("127.0.0.1", port, timeout=10) as client:
+        client.ehlo("mx.example.com")
+        # для IP-адреса ssl не отправляет SNI
+        client._host = hostname
+        client.starttls(context=client_context())
+        return client.sock.getpeercert(binary_form=True)
+
+
+def resume(port, hostname, context, session=None):
+    # (возобновлена ли сессия, сертификат, сессия для следующего подключения)
+    with smtplib.SMTP("127.0.0.1", port, timeout=10) as client:
+        client.ehlo("mx.example.com")
+        assert client.docmd("STARTTLS")[0] == 220
+        client.sock = context.wrap_socket(client.sock, server_hostname=hostname, session=session)
+        return client.sock.session_reused, client.sock.getpeercert(binary_form=True), client.sock.session
+
+
+def rewrite(path, domain, between=None):
+    # certbot пишет fullchain и privkey по очереди
+    key = make_key()
+    fullchain = make_certificate(key, domain)
+    (path / "fullchain.pem").write_bytes(fullchain)
+    if between:
+        between()
+    (path / "privkey.pem").write_bytes(key_pem(key))
+    return fullchain
+
+
+def wait(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def hosts(listener, tmp_path):
+    fullchains = {}
+    for hostname in HOSTS:
+        fullchains[hostname] = write_certificate(tmp_path / "certs" / hostname, hostname)
+        mail_server_tls.load_certificate(listener, str(tmp_path / "certs" / hostname))
+    return fullchains
+
+
+def test_certificate_is_selected_by_sni(listener, hosts):
+    for hostname in HOSTS:
+        assert served_certificate(listener.port, hostname) == der(hosts[hostname])
+
+    # без SNI и с чужим именем - первый загруженный сертификат
+    assert served_certificate(listener.port, "127.0.0.1") == der(hosts[HOSTS[0]])
+    assert served_certificate(listener.port, "other.test") == der(hosts[HOSTS[0]])
+
+
+def test_reload_picks_up_changed_files(listener, hosts, tmp_path):
+    renewed = rewrite(tmp_path / "certs" / HOSTS[1], HOSTS[1])
+    listener.tls.reload()
+
+    assert served_certificate(listener.port, HOSTS[1]) == der(renewed)
+    assert served_certificate(listener.port, HOSTS[0]) == der(hosts[HOSTS[0]])
+
+
+def test_half_written_pair_keeps_old_context(listener, hosts, tmp_path):
+    path = tmp_path / "certs" / HOSTS[0]
+
+    def check_old_context():
+        # новый fullchain со старым ключом не загружается
+        listener.tls.reload()
+        assert served_certificate(listener.port, HOSTS[0]) == der(hosts[HOSTS[0]])
+        assert served_certificate(listener.port, "127.0.0.1") == der(hosts[HOSTS[0]])
+
+    renewed = rewrite(path, HOSTS[0], between=check_old_context)
+    listener.tls.reload()
+
+    assert served_certificate(listener.port, HOSTS[0]) == der(renewed)
+    # первый хост отдается и клиентам без SNI
+    assert served_certificate(listener.port, "127.0.0.1") == der(renewed)
+
+
+def test_rotation_under_concurrent_starttls(listener, hosts, tmp_path):
+    stop = threading.Event()
+    errors = []
+    served = {hostname: set() for hostname in HOSTS}
+
+    def client(hostname):
+        while not stop.is_set():
+            try:
+                served[hostname].add(served_certificate(listener.port, hostname))
+            except Exception as e:
+                errors.append(e)
+
+    def reloader():
+        while not stop.is_set():
+            listener.tls.reload()
+
+    threads = [threading.Thread(target=client, args=(HOSTS[i % 2],)) for i in range(8)]
+    threads.append(threading.Thread(target=reloader))
+    for thread in threads:
+        thread.start()
+
+    path = tmp_path / "certs" / HOSTS[0]
+    renewed = []
+    for _ in range(5):
+        renewed.append(rewrite(path, HOSTS[0], between=lambda: stop.wait(0.05)))
+        # целую пару подхватывает поток перезагрузки
+        stop.wait(0.2)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert errors == []
+    assert served[HOSTS[1]] == {der(hosts[HOSTS[1]])}
+    # клиенты видели только целые пары: исходную или одну из новых
+    assert served[HOSTS[0]] <= {der(fullchain) for fullchain in [hosts[HOSTS[0]], *renewed]}
+    assert len(served[HOSTS[0]]) > 3
+    assert served_certificate(listener.port, HOSTS[0]) == der(renewed[-1])
+
+
+def test_default_reload_under_concurrent_handshakes_without_sni(listener, hosts, tmp_path):
+    stop = threading.Event()
+    errors = []
+    served = set()
+
+    def client():
+        while not stop.is_set():
+            try:
+                # для IP-адреса SNI не отправляется - отвечает контекст по умолчанию
+                served.add(served_certificate(listener.port, "127.0.0.1"))
+            except Exception as e:
+                errors.append(e)
+
+    def reloader():
+        while not stop.is_set():
+            try:
+                listener.tls.reload()
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=client) for _ in range(8)]
+    threads.append(threading.Thread(target=reloader))
+    for thread in threads:
+        thread.start()
+
+    path = tmp_path / "certs" / HOSTS[0]
+    renewed = []
+    for _ in range(5):
+        renewed.append(rewrite(path, HOSTS[0], between=lambda: stop.wait(0.05)))
+        stop.wait(0.2)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert errors == []
+    assert served <= {der(fullchain) for fullchain in [hosts[HOSTS[0]], *renewed]}
+    assert len(served) > 3
+    assert listener.tls.default is listener.tls.get(HOSTS[0])
+    assert served_certificate(listener.port, "127.0.0.1") == der(renewed[-1])
+
+
+def test_rotate_replaces_contexts_and_drops_tickets(listener, hosts):
+    tls = listener.tls
+    old_default, old_context = tls.default, tls.get(HOSTS[0])
+
+    # в TLS 1.2 сессия доступна сразу после рукопожатия
+    context = client_context()
+    context.maximum_version = ssl.TLSVersion.TLSv1_2
+
+    _, _, session = resume(listener.port, HOSTS[0], context)
+    reused, _, session = resume(listener.port, HOSTS[0], context, session)
+    assert reused
+
+    tls.rotate()
+
+    assert tls.default is not old_default
+    assert tls.get(HOSTS[0]) is not old_context
+
+    # тикет выписан ключом старого контекста
+    reused, certificate, _ = resume(listener.port, HOSTS[0], context, session)
+    assert not reused
+    assert certificate == der(hosts[HOSTS[0]])
+    assert served_certificate(listener.port, HOSTS[1]) == der(hosts[HOSTS[1]])
+
+
+def test_remove_falls_back_to_default(listener, hosts):
+    listener.tls.remove(HOSTS[1])
+
+    assert listener.tls.get(HOSTS[1]) is None
+    assert served_certificate(listener.port, HOSTS[1]) == der(hosts[HOSTS[0]])
+
+
+def test_watcher_reloads_and_rotates(tmp_path):
+    write_certificate(tmp_path / HOSTS[0], HOSTS[0])
+    tls = TLSContextManager(certs_root=str(tmp_path), poll_interval=0.02, rotate_interval=3600)
+    tls.add(HOSTS[0])
+    tls.start()
+
+    try:
+        old_context = tls.get(HOSTS[0])
+        rewrite(tmp_path / HOSTS[0], HOSTS[0])
+        wait(lambda: tls.get(HOSTS[0]) is not old_context)
+
+        old_default = tls.default
+        tls.rotate_interval = 0
+        wait(lambda: tls.default is not old_default)
+    finally:
+        tls.stop()
+
+
+def test_handshakes_are_counted_in_metrics(listener, hosts):
+    def counters():
+        counters = metrics.snapshot()["counters"]
+        return counters.get("tls.handshake.full", 0), counters.get("tls.handshake.resumed", 0)
+
+    before = counters()
+    context = client_context()
+    context.maximum_version = ssl.TLSVersion.TLSv1_2
+
+    _, _, session = resume(listener.port, HOSTS[0], context)
+    reused, _, _ = resume(listener.port, HOSTS[0], context, session)
+
+    assert reused
+    # хук STARTTLS срабатывает в цикле сервера после ответа клиенту
+    wait(lambda: counters() == (before[0] + 1, before[1] + 1))
+    timings = metrics.snapshot()["timings"]
+    assert timings["tls.handshake.full"]["last"] > 0
+    assert timings["tls.handshake.resumed"]["last"] > 0
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from app.utils.tracing import Tracer
+
+
+def read_spans(path):
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            request = json.loads(line)
+            for resource_spans in request["resourceSpans"]:
+                for scope_spans in resource_spans["scopeSpans"]:
+                    spans.extend(scope_spans["spans"])
+    return spans
+
+
+def test_spans_are_written_as_otlp_json(tmp_path):
+    tracer = Tracer(path=str(tmp_path / "trace.jsonl"))
+
+    with tracer.span("tunnel.setup", subdomain="box") as root:
+        with tracer.span("acme.order", attempt=1, reused=False, ratio=0.5):
+            pass
+        with pytest.raises(RuntimeError):
+            with tracer.span("create_tunnel"):
+                raise RuntimeError("409")
+
+    spans = {span["name"]: span for span in read_spans(tracer.path)}
+    order, failed, setup = spans["acme.order"], spans["create_tunnel"], spans["tunnel.setup"]
+
+    assert len(setup["traceId"]) == 32 and len(setup["spanId"]) == 16
+    assert "parentSpanId" not in setup
+    assert order["parentSpanId"] == setup["spanId"] == root.span_id
+    assert order["traceId"] == setup["traceId"]
+
+    assert int(setup["endTimeUnixNano"]) >= int(setup["startTimeUnixNano"])
+    assert isinstance(setup["startTimeUnixNano"], str)
+
+    assert order["attributes"] == [
+        {"key": "attempt", "value": {"intValue": "1"}},
+        {"key": "reused", "value": {"boolValue": False}},
+        {"key": "ratio", "value": {"doubleValue": 0.5}},
+    ]
+    assert order["status"] == {"code": 1}
+    assert failed["status"] == {"code": 2, "message": "409"}
+
+
+def test_trace_file_is_rotated(tmp_path):
+    tracer = Tracer(path=str(tmp_path / "trace.jsonl"), max_bytes=2000, backups=2)
+
+    for _ in range(100):
+        tracer.event("rathole.connected")
+
+    files = sorted(path.name for path in tmp_path.iterdir())
+    assert files == ["trace.jsonl", "trace.jsonl.1", "trace.jsonl.2"]
+    assert all(path.stat().st_size <= 2000 for path in tmp_path.iterdir())
+
+
+def test_summary_lists_child_stages(tmp_path):
+    tracer = Tracer(path=str(tmp_path / "trace.jsonl"), enabled=True)
+
+    with tracer.span("tunnel.setup") as root:
+        with tracer.span("create_tunnel"):
+            pass
+
+    assert tracer.last_trace_summary("tunnel.setup").startswith("tunnel.setup ")
+    assert "create_tunnel=" in tracer.summary(root)
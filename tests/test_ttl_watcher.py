@@ -0,0 +1,184 @@
+import json
+import threading
+import time
+
+import pytest
+from Qt import QtCore
+
+import app.utils.api as api
+import app.utils.ttl_watcher as ttl_watcher
+from app.utils.ttl_watcher import TTLWatcher
+from tests.stand_in import StandInServer, send_body
+
+
+@pytest.fixture(autouse=True)
+def fast_watcher(monkeypatch, qapp):
+    monkeypatch.setattr(api, "_session", None)
+    monkeypatch.setattr(api, "API_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(ttl_watcher, "TTL_POLL_MIN", 0.05)
+    monkeypatch.setattr(ttl_watcher, "TTL_POLL_MAX", 0.05)
+    monkeypatch.setattr(ttl_watcher, "TTL_ERROR_BACKOFF_MAX", 0.1)
+
+
+def status_server(monkeypatch, respond):
+    server = StandInServer(respond)
+    monkeypatch.setattr(api, "BASE_URL", server.url)
+    monkeypatch.setattr(ttl_watcher, "BASE_URL", server.url)
+    return server
+
+
+def start_stream(handler):
+    handler.send_response(200)
+    handler.send_header("Content-Type", "text/event-stream")
+    handler.send_header("Connection", "close")
+    handler.end_headers()
+    handler.close_connection = True
+
+
+def send_event(handler, ttl):
+    handler.wfile.write(f"data: {json.dumps({'ttl': ttl})}\n\n".encode())
+    handler.wfile.flush()
+
+
+class Recorder:
+    def __init__(self, watcher):
+        self.ttls = []
+        self.errors = []
+        # сигналы приходят из потока наблюдателя, цикл событий тесту не нужен
+        watcher.ttl_updated.connect(self.ttls.append, QtCore.Qt.DirectConnection)
+        watcher.ttl_error.connect(self.errors.append, QtCore.Qt.DirectConnection)
+
+    def wait(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, (self.ttls, self.errors)
+            time.sleep(0.01)
+
+
+@pytest.fixture
+def watch():
+    watchers = []
+
+    def start():
+        watcher = TTLWatcher("tunnel")
+        recorder = Recorder(watcher)
+        watcher.start()
+        watchers.append(watcher)
+        return watcher, recorder
+
+    yield start
+
+    for watcher in watchers:
+        watcher.stop()
+
+
+def test_stream_events_are_delivered(monkeypatch, watch):
+    def respond(handler):
+        start_stream(handler)
+        for ttl in (300, 299, 298):
+            send_event(handler, ttl)
+        time.sleep(5)
+
+    with status_server(monkeypatch, respond) as server:
+        watcher, recorder = watch()
+        recorder.wait(lambda: len(recorder.ttls) == 3)
+
+    assert recorder.ttls == [300, 299, 298]
+    assert len(server.requests) == 1
+
+
+def test_plain_json_falls_back_to_polling(monkeypatch, watch):
+    ttls = iter(range(100, 0, -1))
+
+    def respond(handler):
+        send_body(handler, json.dumps({"ttl": next(ttls)}))
+
+    with status_server(monkeypatch, respond) as server:
+        watcher, recorder = watch()
+        recorder.wait(lambda: len(recorder.ttls) >= 4)
+
+    assert recorder.ttls[:4] == [100, 99, 98, 97]
+    assert recorder.errors == []
+    # подписка запрошена один раз, дальше - обычные запросы
+    assert len(server.requests) >= 4
+
+
+def test_unsupported_stream_falls_back_to_polling(monkeypatch, watch):
+    def respond(handler):
+        if "text/event-stream" in handler.headers.get("Accept", ""):
+            send_body(handler, "", status=406)
+        else:
+            send_body(handler, json.dumps({"ttl": 42}))
+
+    with status_server(monkeypatch, respond):
+        watcher, recorder = watch()
+        recorder.wait(lambda: len(recorder.ttls) >= 2)
+
+    assert set(recorder.ttls) == {42}
+
+
+def test_resubscribes_after_disconnect(monkeypatch, watch):
+    connections = []
+
+    def respond(handler):
+        connections.append(handler)
+        start_stream(handler)
+        send_event(handler, 500 - len(connections))
+        if len(connections) > 1:
+            time.sleep(5)
+        # первое соединение обрывается сразу после события
+
+    with status_server(monkeypatch, respond):
+        watcher, recorder = watch()
+        recorder.wait(lambda: len(recorder.ttls) == 2)
+
+    assert recorder.ttls == [499, 498]
+    assert recorder.errors == []
+
+
+def test_slow_status_reports_error_and_recovers(monkeypatch, watch):
+    monkeypatch.setattr(ttl_watcher, "TTL_STREAM_READ_TIMEOUT", 0.1)
+    slow = threading.Event()
+    slow.set()
+
+    def respond(handler):
+        if slow.is_set():
+            time.sleep(0.3)
+        start_stream(handler)
+        send_event(handler, 77)
+        time.sleep(5)
+
+    with status_server(monkeypatch, respond):
+        watcher, recorder = watch()
+        recorder.wait(lambda: recorder.errors)
+        slow.clear()
+        recorder.wait(lambda: recorder.ttls)
+
+    assert recorder.ttls[0] == 77
+
+
+def test_unreachable_server_reports_error(monkeypatch, watch, free_port):
+    monkeypatch.setattr(api, "BASE_URL", f"http://127.0.0.1:{free_port}")
+    monkeypatch.setattr(ttl_watcher, "BASE_URL", f"http://127.0.0.1:{free_port}")
+
+    watcher, recorder = watch()
+    recorder.wait(lambda: len(recorder.errors) >= 2)
+
+    assert set(recorder.errors) == {"сервер временно недоступен"}
+
+
+def test_stop_interrupts_blocked_stream(monkeypatch, watch):
+    def respond(handler):
+        start_stream(handler)
+        send_event(handler, 10)
+        time.sleep(10)
+
+    with status_server(monkeypatch, respond):
+        watcher, recorder = watch()
+        recorder.wait(lambda: recorder.ttls)
+
+        start = time.monotonic()
+        watcher.stop()
+
+        assert watcher.isFinished()
+        assert time.monotonic() - start < 1